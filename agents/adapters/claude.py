@@ -1,17 +1,30 @@
+import asyncio
 import os
 import json
-import requests
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from .retry import APIError, classify_exception, classify_response
+from .streaming import iter_sse_data
+from .transport import HTTPTransport, get_transport
 
 class ClaudeWorker:
-    def __init__(self, debug: bool = False):
+    can_continue = True  # a trailing assistant message is continued (prefill)
+
+    def __init__(self, debug: bool = False, transport: Optional[HTTPTransport] = None,
+                 model: Optional[str] = None, max_tokens: int = 4000):
         self.debug = debug
+        self.transport = transport or get_transport()
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable is required")
         
-        self.model = "claude-sonnet-4-20250514"
+        self.model = model or "claude-sonnet-4-20250514"
+        self.max_tokens = max_tokens
         self.base_url = "https://api.anthropic.com/v1/messages"
         self.system_prompt = self._get_system_prompt()
+        self.last_usage: Dict[str, int] = {}
+        self.last_stop_reason: Optional[str] = None  # "max_tokens" when the reply was cut off
+        self.last_error: Optional[APIError] = None  # set when the last call failed (after transport retries)
     
     def _get_system_prompt(self) -> str:
         return """You are a Senior Full-Stack Engineer working in a Supabase + Next.js monorepo inside GitHub Codespaces. You are an autonomous coding agent that must:
@@ -48,69 +61,177 @@ You MUST end every response with a valid Control Protocol JSON object.
 3. Run tests after code changes
 4. Create migrations for all schema changes
 5. Use conventional commit format (feat/fix/refactor/chore/test/docs)
+6. Make one focused change per turn
+
+**Each Turn:**
+Every user message is the current context for one turn: task, plan, execution
+results and hints. Based on it, determine your next action and give a short
+rationale followed by the required Control Protocol JSON.
 
 Remember: You must provide valid JSON at the end of EVERY response for the orchestrator to function properly."""
 
-    def generate(self, context: str, turn: int) -> str:
-        prompt = self._build_prompt(context, turn)
+    def generate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        """
+        Run one turn. `context` is either a plain string or a Conversation, whose
+        earlier user/assistant messages are sent natively. `prefix` is the part of
+        the context that is identical on every turn (protocol preamble, repo
+        summary); it is sent ahead of the history behind a prompt-cache breakpoint.
+        """
+        messages = self._build_messages(context, turn)
+        self.last_error = None
         
         if self.debug:
-            print(f"🔮 Calling Claude API (turn {turn})...")
+            print(f"🔮 Calling Claude API ({self.model}, turn {turn})...")
         
         try:
-            response = self._call_api(prompt)
+            response = self._call_api(messages, prefix)
             if self.debug:
-                print(f"✅ Claude API response received")
+                stats = self.transport.stats()
+                print(f"✅ Claude API response received (connections reused: {stats['reused']}/{stats['requests']})")
             return response
         except Exception as e:
-            error_msg = f"API call failed: {str(e)}"
+            return self._error_response(e)
+
+    async def agenerate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        """
+        Async generate(). The request runs on a worker thread over the shared
+        connection pool, so many orchestrator runs can share one event loop.
+        """
+        return await asyncio.to_thread(self.generate, context, turn, prefix)
+
+    def continue_response(self, context: Union[str, Any], turn: int, partial: str, prefix: str = "",
+                          max_tokens: int = 1024) -> str:
+        """
+        Continue a reply that stopped at max_tokens: the same request with the
+        partial reply as a prefilled assistant turn. Returns only the new text
+        ("" on failure), which follows `partial.rstrip()`.
+        """
+        messages = self._continuation_messages(context, turn, partial)
+        self.last_error = None
+        if self.debug:
+            print(f"🧩 Continuing truncated reply (turn {turn}, max_tokens {max_tokens})...")
+        try:
+            return self._call_api(messages, prefix, max_tokens=max_tokens)
+        except Exception as e:
+            self.last_error = classify_exception(e)
             if self.debug:
-                print(f"❌ {error_msg}")
-            
-            return f"""I encountered an error calling the API: {error_msg}
+                print(f"❌ Continuation failed: {e}")
+            return ""
 
-I'll stop here to avoid further issues.
+    def stream(self, context: Union[str, Any], turn: int, prefix: str = "") -> Iterator[str]:
+        """Like generate(), but yields text deltas as they arrive over SSE."""
+        messages = self._build_messages(context, turn)
+        self.last_error = None
 
-{{"decision": "STOP", "reason": "API error - {error_msg}", "commands": [], "next_hint": "Check API credentials and network"}}"""
-    
-    def _build_prompt(self, context: str, turn: int) -> str:
-        return f"""# Turn {turn}
+        if self.debug:
+            print(f"🔮 Streaming Claude API ({self.model}, turn {turn})...")
 
-## Current Context
-{context}
+        try:
+            yield from self._stream_api(messages, prefix)
+        except Exception as e:
+            yield self._error_response(e)
 
-## Instructions
-Based on the context above, determine your next action and provide a detailed response followed by the required Control Protocol JSON.
+    def _error_response(self, e: Exception) -> str:
+        """Reply standing in for a failed call; records the classified error in last_error."""
+        self.last_error = classify_exception(e)
+        error_msg = f"API call failed: {str(e)}"
+        if self.debug:
+            print(f"❌ {error_msg} ({self.last_error.kind}, {'retryable' if self.last_error.retryable else 'fatal'})")
+
+        decision = "RETRY" if self.last_error.retryable else "STOP"
+        return f"""I encountered an error calling the API: {error_msg}
 
-Remember:
-- Make one focused change per turn
-- Run tests after code changes
-- Create migrations for schema changes
-- Keep commits small and atomic
-- End with valid Control Protocol JSON
+I'll stop here to avoid further issues.
 
-Analyze the situation and proceed with your next action:"""
+{json.dumps({"decision": decision, "reason": f"API error - {error_msg}", "commands": [], "next_hint": "Check API credentials and network"})}"""
+    
+    def _build_messages(self, context: Union[str, Any], turn: int) -> List[Dict[str, str]]:
+        if isinstance(context, str):
+            return [{"role": "user", "content": self._build_prompt(context, turn)}]
+        return context.outgoing(self._build_prompt(context.pending_text(), turn))
+
+    def _continuation_messages(self, context: Union[str, Any], turn: int, partial: str) -> List[Dict[str, str]]:
+        # The API rejects a final assistant turn that ends in whitespace
+        return self._build_messages(context, turn) + [{"role": "assistant", "content": partial.rstrip()}]
+
+    def _build_prompt(self, context: str, turn: int) -> str:
+        # Only the context goes into the (re-sent) history; the standing
+        # instructions live in the cached system prompt.
+        return f"# Turn {turn}\n\n## Current Context\n{context}"
     
-    def _call_api(self, prompt: str) -> str:
-        headers = {
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01"
         }
-        
-        payload = {
+
+    def _payload(self, messages: List[Dict[str, str]], prefix: str = "", max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        # Stable blocks first, each ending in a cache breakpoint; the new user turn
+        # goes last so everything before it is byte-identical to the previous request.
+        api_messages = [
+            {"role": m["role"], "content": [{"type": "text", "text": m["content"]}]}
+            for m in messages
+        ]
+        if prefix:
+            api_messages[0]["content"].insert(0, {
+                "type": "text",
+                "text": f"## Stable Context\n{prefix}",
+                "cache_control": {"type": "ephemeral"},
+            })
+        if len(api_messages) > 1:
+            # Rolling breakpoint on the previous assistant reply caches the whole history
+            api_messages[-2]["content"][-1]["cache_control"] = {"type": "ephemeral"}
+        return {
             "model": self.model,
-            "max_tokens": 4000,
-            "system": self.system_prompt,
-            "messages": [{"role": "user", "content": prompt}]
+            "max_tokens": max_tokens or self.max_tokens,
+            "system": [{"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}}],
+            "messages": api_messages
         }
+
+    def _record_usage(self, usage: Dict[str, Any]):
+        for key in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+            if usage.get(key) is not None:
+                self.last_usage[key] = usage[key]
+
+    def _stream_api(self, messages: List[Dict[str, str]], prefix: str = "") -> Iterator[str]:
+        payload = {**self._payload(messages, prefix), "stream": True}
+        self.last_usage = {}
+        self.last_stop_reason = None
+        lines = self.transport.stream_lines(self.base_url, headers=self._headers(), json=payload, timeout=120)
+        try:
+            for event in iter_sse_data(lines):
+                if event.get("type") == "error":
+                    error = event.get("error") or {}
+                    kind = str(error.get("type", "stream_error"))
+                    raise APIError(f"API stream error: {error}", kind=kind.replace("_error", ""),
+                                   retryable=kind in ("overloaded_error", "rate_limit_error", "api_error"))
+                if event.get("type") == "message_start":
+                    self._record_usage(event.get("message", {}).get("usage", {}))
+                if event.get("type") == "message_delta":
+                    self._record_usage(event.get("usage", {}))
+                    self.last_stop_reason = event.get("delta", {}).get("stop_reason") or self.last_stop_reason
+                if event.get("type") == "content_block_delta":
+                    delta = event.get("delta", {})
+                    if delta.get("type") == "text_delta" and delta.get("text"):
+                        yield delta["text"]
+        finally:
+            lines.close()
+
+    def _call_api(self, messages: List[Dict[str, str]], prefix: str = "", max_tokens: Optional[int] = None) -> str:
+        headers = self._headers()
+        payload = self._payload(messages, prefix, max_tokens=max_tokens)
+        self.last_usage = {}
+        self.last_stop_reason = None
         
-        response = requests.post(self.base_url, headers=headers, json=payload, timeout=120)
+        response = self.transport.post(self.base_url, headers=headers, json=payload, timeout=120)
         
         if response.status_code != 200:
-            raise Exception(f"API returned {response.status_code}: {response.text}")
+            raise classify_response(response.status_code, response.text, response.headers)
         
         response_data = response.json()
+        self._record_usage(response_data.get("usage", {}))
+        self.last_stop_reason = response_data.get("stop_reason")
         
         if "content" not in response_data or not response_data["content"]:
             raise Exception("No content in API response")
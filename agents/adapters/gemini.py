@@ -1,16 +1,27 @@
+import asyncio
 import os
 import json
-import requests
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from .retry import APIError, classify_exception, classify_response
+from .streaming import iter_sse_data
+from .transport import HTTPTransport, get_transport
 
 class GeminiWorker:
-    def __init__(self, debug: bool = False):
+    # Gemini has no assistant prefill: a trailing "model" turn gets a fresh reply,
+    # not a continuation, so truncated replies go straight to repair
+    can_continue = False
+
+    def __init__(self, debug: bool = False, transport: Optional[HTTPTransport] = None):
         self.debug = debug
+        self.transport = transport or get_transport()
         self.api_key = os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
         
         self.model = "gemini-1.5-flash"
         self.base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
+        self.stream_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:streamGenerateContent"
         self.system_prompt = """You are a Senior Full-Stack Engineer working in a Supabase + Next.js monorepo inside GitHub Codespaces. You are an autonomous coding agent.
 
 You MUST end every response with valid JSON:
@@ -26,55 +37,137 @@ Safety Rules:
 - Never edit .env, .git/, package-lock files
 - Keep changes small (< 500 lines)
 - Run tests after changes
-- Use conventional commits"""
-
-    def generate(self, context: str, turn: int) -> str:
-        prompt = f"""# Turn {turn}
-
-## Context
-{context}
+- Use conventional commits
 
-## Instructions  
-{self.system_prompt}
+Each user message is the context for one turn. Analyze it and provide your next action with the required JSON at the end."""
+        self.last_usage: Dict[str, int] = {}
+        self.last_stop_reason: Optional[str] = None  # "max_tokens" when the reply was cut off
+        self.last_error: Optional[APIError] = None  # set when the last call failed (after transport retries)
 
-Analyze and provide your next action with required JSON at the end:"""
+    def generate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        messages = self._build_messages(context, turn)
+        self.last_error = None
         
         if self.debug:
             print(f"🔮 Calling Gemini API (turn {turn})...")
         
         try:
-            response = self._call_api(prompt)
+            response = self._call_api(messages, prefix)
             if self.debug:
-                print(f"✅ Gemini API response received")
+                stats = self.transport.stats()
+                print(f"✅ Gemini API response received (connections reused: {stats['reused']}/{stats['requests']})")
             return response
         except Exception as e:
-            return f"""Error calling Gemini API: {str(e)}
+            return self._error_response(e)
 
-{{"decision": "STOP", "reason": "API error - {str(e)}", "commands": [], "next_hint": "Check API key and network"}}"""
-    
-    def _call_api(self, prompt: str) -> str:
-        url = f"{self.base_url}?key={self.api_key}"
-        
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
+    async def agenerate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        """Async generate(); the blocking request runs on a worker thread."""
+        return await asyncio.to_thread(self.generate, context, turn, prefix)
+
+    def continue_response(self, context: Union[str, Any], turn: int, partial: str, prefix: str = "",
+                          max_tokens: int = 1024) -> str:
+        """Not supported (see can_continue); returns "" without calling the API."""
+        self.last_error = None
+        return ""
+
+    def stream(self, context: Union[str, Any], turn: int, prefix: str = "") -> Iterator[str]:
+        """Like generate(), but yields text chunks from streamGenerateContent (SSE)."""
+        messages = self._build_messages(context, turn)
+        self.last_error = None
+
+        if self.debug:
+            print(f"🔮 Streaming Gemini API (turn {turn})...")
+
+        try:
+            yield from self._stream_api(messages, prefix)
+        except Exception as e:
+            yield self._error_response(e)
+
+    def _build_messages(self, context: Union[str, Any], turn: int) -> List[Dict[str, str]]:
+        if isinstance(context, str):
+            return [{"role": "user", "content": self._build_prompt(context, turn)}]
+        return context.outgoing(self._build_prompt(context.pending_text(), turn))
+
+    def _build_prompt(self, context: str, turn: int) -> str:
+        return f"# Turn {turn}\n\n## Context\n{context}"
+
+    def _error_response(self, e: Exception) -> str:
+        self.last_error = classify_exception(e)
+        decision = "RETRY" if self.last_error.retryable else "STOP"
+        return f"""Error calling Gemini API: {str(e)}
+
+{json.dumps({"decision": decision, "reason": f"API error - {e}", "commands": [], "next_hint": "Check API key and network"})}"""
+
+    def _payload(self, messages: List[Dict[str, str]], prefix: str = "", max_tokens: int = 4096) -> Dict[str, Any]:
+        # System instruction and stable prefix lead the request so that providers
+        # with implicit prefix caching can reuse them; the new user turn goes last.
+        contents = [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+            for m in messages
+        ]
+        if prefix:
+            contents[0]["parts"].insert(0, {"text": f"## Stable Context\n{prefix}"})
+        return {
+            "systemInstruction": {"parts": [{"text": self.system_prompt}]},
+            "contents": contents,
             "generationConfig": {
                 "temperature": 0.7,
-                "maxOutputTokens": 4096
+                "maxOutputTokens": max_tokens
             }
         }
+
+    def _record_stop(self, candidate: Dict[str, Any]):
+        if candidate.get("finishReason"):
+            self.last_stop_reason = "max_tokens" if candidate["finishReason"] == "MAX_TOKENS" else candidate["finishReason"]
+
+    def _record_usage(self, usage: Dict[str, Any]):
+        mapping = {
+            "promptTokenCount": "input_tokens",
+            "candidatesTokenCount": "output_tokens",
+            "cachedContentTokenCount": "cache_read_input_tokens",
+        }
+        for src, dst in mapping.items():
+            if usage.get(src) is not None:
+                self.last_usage[dst] = usage[src]
+
+    def _stream_api(self, messages: List[Dict[str, str]], prefix: str = "") -> Iterator[str]:
+        url = f"{self.stream_url}?alt=sse&key={self.api_key}"
+        headers = {"Content-Type": "application/json"}
+        self.last_usage = {}
+        self.last_stop_reason = None
+        lines = self.transport.stream_lines(url, headers=headers, json=self._payload(messages, prefix), timeout=120)
+        try:
+            for chunk in iter_sse_data(lines):
+                self._record_usage(chunk.get("usageMetadata", {}))
+                for candidate in chunk.get("candidates", []):
+                    self._record_stop(candidate)
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+        finally:
+            lines.close()
+
+    def _call_api(self, messages: List[Dict[str, str]], prefix: str = "", max_tokens: int = 4096) -> str:
+        url = f"{self.base_url}?key={self.api_key}"
+        
+        payload = self._payload(messages, prefix, max_tokens=max_tokens)
+        self.last_usage = {}
+        self.last_stop_reason = None
         
         headers = {"Content-Type": "application/json"}
-        response = requests.post(url, json=payload, headers=headers, timeout=120)
+        response = self.transport.post(url, json=payload, headers=headers, timeout=120)
         
         if response.status_code != 200:
-            raise Exception(f"API returned {response.status_code}: {response.text}")
+            raise classify_response(response.status_code, response.text, response.headers)
         
         data = response.json()
+        self._record_usage(data.get("usageMetadata", {}))
         
         if "candidates" not in data or not data["candidates"]:
             raise Exception("No candidates in API response")
             
         candidate = data["candidates"][0]
+        self._record_stop(candidate)
         if "content" not in candidate or "parts" not in candidate["content"]:
             raise Exception("Invalid response format from Gemini")
         
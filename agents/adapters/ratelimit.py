@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every run in the process.
+
+    `rate` tokens are added per second up to `burst`; acquire() blocks the
+    calling (worker) thread until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, burst: int = 1) -> "RateLimiter":
+        return cls(rate=requests_per_minute / 60.0, burst=burst)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens`, sleeping as needed; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from .retry import APIError, classify_exception
+
+MODES = ("record", "replay", "passthrough")
+
+
+class ReplayMiss(APIError):
+    def __init__(self, message: str):
+        super().__init__(message, kind="replay_miss", retryable=False)
+
+
+class ResponseStore:
+    """
+    Content-addressed on-disk store of model responses.
+
+    Each response is `<root>/<key[:2]>/<key>.json`. A file's mtime is its
+    last use, so least-recently-used entries are evicted first once the store
+    holds more than `max_entries` responses or `max_bytes` bytes, across
+    processes sharing the directory.
+    """
+
+    def __init__(self, root: str, max_entries: int = 5000, max_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lru: Optional["OrderedDict[str, int]"] = None  # key -> size, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._load()
+            if key in self._lru:
+                self._lru.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._load()
+            self._bytes += len(data) - self._lru.pop(key, 0)
+            self._lru[key] = len(data)
+            self._evict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._lru)
+
+    # -------------------- Internals --------------------
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load(self):
+        if self._lru is not None:
+            return
+        found = []
+        if self.root.exists():
+            for path in self.root.glob("??/*.json"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                found.append((st.st_mtime_ns, path.stem, st.st_size))
+        found.sort()
+        self._lru = OrderedDict((key, size) for _, key, size in found)
+        self._bytes = sum(self._lru.values())
+
+    def _evict(self):
+        while self._lru and (len(self._lru) > self.max_entries or self._bytes > self.max_bytes):
+            key, size = self._lru.popitem(last=False)
+            self._bytes -= size
+            self._path(key).unlink(missing_ok=True)
+
+
+class ReplayWorker:
+    """
+    Response cache in front of a ClaudeWorker or GeminiWorker.
+
+    Requests are keyed by a hash of the model and the exact request payload
+    (system prompt, stable prefix and conversation), so a rerun that sends the
+    same prompt gets the same answer without calling the provider.
+
+    - "record": serve cached responses, call the model on a miss and store it.
+    - "replay": serve cached responses only; a miss ends the run with a STOP
+      (offline, deterministic regression runs against recorded responses).
+    - "passthrough": no caching; behaves exactly like the wrapped worker.
+
+    API failures are never stored. In streaming mode a stream the orchestrator
+    closes early (control object already complete) is stored as far as it was
+    read, which is exactly what that run acted on.
+    """
+
+    def __init__(self, worker, store: ResponseStore, mode: str = "record"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown replay mode {mode!r} (expected one of {', '.join(MODES)})")
+        self.worker = worker
+        self.store = store
+        self.mode = mode
+        self.last_usage: Dict[str, int] = {}
+        self.last_stop_reason: Optional[str] = None
+        self.last_error: Optional[APIError] = None
+        self.last_key: Optional[str] = None
+        self.hits = self.misses = self.stored = 0
+
+    def __getattr__(self, name):
+        return getattr(self.worker, name)
+
+    def generate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        if self.mode == "passthrough":
+            return self._passthrough(self.worker.generate(context, turn, prefix))
+
+        messages = self.worker._build_messages(context, turn)
+        try:
+            return self._call(messages, prefix, turn)
+        except Exception as e:  # ReplayMiss or the API error
+            text = self.worker._error_response(e)
+            self.last_error = classify_exception(e)
+            return text
+
+    def continue_response(self, context: Union[str, Any], turn: int, partial: str, prefix: str = "",
+                          max_tokens: int = 1024) -> str:
+        """Cached like generate(); the partial reply is part of the request, and so of the key."""
+        if not self.worker.can_continue:
+            return ""
+        if self.mode == "passthrough":
+            text = self.worker.continue_response(context, turn, partial, prefix, max_tokens=max_tokens)
+            return self._passthrough(text)
+        messages = self.worker._continuation_messages(context, turn, partial)
+        try:
+            return self._call(messages, prefix, turn, max_tokens=max_tokens)
+        except Exception as e:
+            self.last_error = classify_exception(e)
+            if self.worker.debug:
+                print(f"❌ Continuation failed: {e}")
+            return ""
+
+    async def agenerate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        return await asyncio.to_thread(self.generate, context, turn, prefix)
+
+    def stream(self, context: Union[str, Any], turn: int, prefix: str = "") -> Iterator[str]:
+        if self.mode == "passthrough":
+            try:
+                yield from self.worker.stream(context, turn, prefix)
+            finally:
+                self._passthrough("")
+            return
+
+        messages = self.worker._build_messages(context, turn)
+        key = self._key(messages, prefix)
+        cached = self._lookup(key, turn)
+        if cached is not None:
+            yield cached["text"]
+            return
+        if self.mode == "replay":
+            self.last_error = ReplayMiss(f"no recorded response for turn {turn} ({key[:12]})")
+            yield self.worker._error_response(self.last_error)
+            return
+
+        chunks = []
+        complete = False
+        upstream = self.worker._stream_api(messages, prefix)
+        try:
+            for chunk in upstream:
+                chunks.append(chunk)
+                yield chunk
+            complete = True
+        except GeneratorExit:
+            pass  # consumer stopped reading; keep what it saw
+        except Exception as e:
+            self._passthrough("")
+            self.last_error = classify_exception(e)
+            yield self.worker._error_response(e)
+            return
+        finally:
+            upstream.close()
+        self._passthrough("")
+        if chunks:
+            self._save(key, "".join(chunks), complete=complete)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "stored": self.stored}
+
+    # -------------------- Internals --------------------
+
+    def _call(self, messages, prefix: str, turn: int, **kwargs) -> str:
+        """Serve from the store or call the provider and record; raises ReplayMiss or the API error."""
+        key = self._key(messages, prefix, **kwargs)
+        cached = self._lookup(key, turn)
+        if cached is not None:
+            return cached["text"]
+        if self.mode == "replay":
+            raise ReplayMiss(f"no recorded response for turn {turn} ({key[:12]})")
+        try:
+            text = self.worker._call_api(messages, prefix, **kwargs)
+        finally:
+            self._passthrough("")
+        self._save(key, text, complete=True)
+        return text
+
+    def _passthrough(self, text: str) -> str:
+        self.last_usage = dict(self.worker.last_usage)
+        self.last_stop_reason = self.worker.last_stop_reason
+        self.last_error = getattr(self.worker, "last_error", None) if self.mode == "passthrough" else None
+        return text
+
+    def _key(self, messages, prefix: str, **kwargs) -> str:
+        request = {"model": self.worker.model, "payload": self.worker._payload(messages, prefix, **kwargs)}
+        blob = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str, turn: int) -> Optional[Dict[str, Any]]:
+        self.last_key = key
+        cached = self.store.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.last_usage = {}  # nothing was spent on this turn
+        self.last_stop_reason = cached.get("stop_reason")
+        self.last_error = None
+        if self.worker.debug:
+            print(f"📼 Replayed cached response (turn {turn}, {key[:12]})")
+        return cached
+
+    def _save(self, key: str, text: str, complete: bool):
+        try:
+            self.store.put(key, {
+                "model": self.worker.model,
+                "text": text,
+                "complete": complete,
+                "usage": self.last_usage,
+                "stop_reason": self.last_stop_reason,
+                "recorded": round(time.time(), 3),
+            })
+            self.stored += 1
+        except OSError as e:
+            if self.worker.debug:
+                print(f"⚠️  Could not store response {key[:12]}: {e}")
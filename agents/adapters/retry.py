@@ -0,0 +1,137 @@
+import json
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Mapping, Optional
+
+# HTTP statuses worth retrying: timeouts, rate limits, overload and transient server errors
+_RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+_KIND_BY_STATUS = {
+    400: "invalid_request", 401: "auth", 403: "permission", 404: "not_found", 408: "timeout",
+    413: "too_large", 429: "rate_limit", 500: "server", 502: "server", 503: "overloaded",
+    504: "timeout", 529: "overloaded",
+}
+
+
+class APIError(Exception):
+    """
+    A provider call that failed, classified for the retry policy.
+
+    `retryable` errors (rate limits, overload, 5xx, network) may succeed if
+    repeated later; everything else (bad request, auth, billing) is fatal and
+    should end the run. `retry_after` is the provider's requested wait in
+    seconds, when it sent one. `attempts` is how many calls RetryPolicy.run
+    made before giving up (1 when the error was not retried).
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, kind: str = "unknown",
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.kind = kind
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.attempts = 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"status": self.status, "kind": self.kind, "retryable": self.retryable,
+                "retry_after": self.retry_after, "attempts": self.attempts, "message": str(self)[:300]}
+
+
+def classify_response(status: int, body: str, headers: Optional[Mapping[str, str]] = None) -> APIError:
+    """APIError for a non-200 Anthropic or Gemini response."""
+    kind = _KIND_BY_STATUS.get(status, "server" if status >= 500 else "http")
+    message = body
+    try:
+        error = json.loads(body).get("error", {})
+    except (ValueError, AttributeError):
+        error = {}
+    if isinstance(error, dict):
+        message = error.get("message") or body
+        provider_kind = str(error.get("type") or error.get("status") or "").lower()
+        if provider_kind in ("overloaded_error", "unavailable"):
+            kind = "overloaded"
+        elif provider_kind in ("rate_limit_error", "resource_exhausted"):
+            kind = "rate_limit"
+    if "credit balance" in message.lower() or "billing" in message.lower():
+        kind = "billing"
+
+    retryable = status in _RETRYABLE_STATUS and kind != "billing"
+    return APIError(f"API returned {status}: {message}", status=status, kind=kind, retryable=retryable,
+                    retry_after=parse_retry_after(headers or {}, body))
+
+
+def classify_exception(e: Exception) -> APIError:
+    """APIError for anything raised while calling a provider (network errors are retryable)."""
+    if isinstance(e, APIError):
+        return e
+    name = type(e).__name__.lower()
+    if "timeout" in name:
+        return APIError(f"Request timed out: {e}", kind="timeout", retryable=True)
+    if any(s in name for s in ("connection", "remoteprotocol", "readerror", "chunkedencoding", "network")):
+        return APIError(f"Connection error: {e}", kind="connection", retryable=True)
+    return APIError(str(e), kind="client")
+
+
+def parse_retry_after(headers: Mapping[str, str], body: str = "") -> Optional[float]:
+    """Seconds to wait from retry-after(-ms) headers or a Gemini RetryInfo body."""
+    lowered = {k.lower(): v for k, v in dict(headers).items()}
+    if lowered.get("retry-after-ms"):
+        try:
+            return float(lowered["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = lowered.get("retry-after")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    m = re.search(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"', body or "")
+    return float(m.group(1)) if m else None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: before attempt n+1 wait a random
+    time in [0, min(max_delay, base_delay * 2**n)], or exactly what the
+    provider asked for in retry-after. Gives up after `max_attempts` calls or
+    once `max_elapsed` seconds would be exceeded.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 max_elapsed: float = 300.0):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+
+    def delay(self, attempt: int, error: Optional[APIError] = None) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based)."""
+        if error is not None and error.retry_after is not None:
+            return min(error.retry_after, self.max_elapsed)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def run(self, call: Callable[[], Any], on_retry: Optional[Callable[[APIError, float], None]] = None) -> Any:
+        """Call until it returns or raises a fatal error; retryable APIErrors are retried."""
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return call()
+            except Exception as e:
+                error = classify_exception(e)
+                error.attempts = attempt
+                if not error.retryable or attempt >= self.max_attempts:
+                    raise error from (None if error is e else e)
+                wait = self.delay(attempt, error)
+                if time.monotonic() - start + wait > self.max_elapsed:
+                    raise error from (None if error is e else e)
+                if on_retry is not None:
+                    on_retry(error, wait)
+                time.sleep(wait)
@@ -0,0 +1,322 @@
+import asyncio
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .retry import APIError
+
+# After a failure a provider is skipped for this long (fatal errors: for the rest of the run)
+_COOLDOWN_S = 60.0
+_FATAL_COOLDOWN_S = 24 * 3600.0
+
+
+class ProviderHealth:
+    """Rolling latency and error rate of one provider/model over its last `window` calls."""
+
+    def __init__(self, name: str, window: int = 50):
+        self.name = name
+        self.latencies: deque = deque(maxlen=window)  # seconds, successful calls only
+        self.outcomes: deque = deque(maxlen=window)  # True = success
+        self.cooldown_until = 0.0
+        self.inflight = 0
+        self.last_error: Optional[str] = None
+
+    def record(self, latency: float, error: Optional[APIError]):
+        self.outcomes.append(error is None)
+        if error is None:
+            self.latencies.append(latency)
+            self.cooldown_until = 0.0
+            return
+        self.last_error = f"{error.kind}: {str(error)[:120]}"
+        hold = _COOLDOWN_S if error.retryable else _FATAL_COOLDOWN_S
+        self.cooldown_until = time.monotonic() + (error.retry_after or 0) + hold
+
+    @property
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate, 3),
+            "p50_s": round(p50, 3) if p50 is not None else None,
+            "p95_s": round(p95, 3) if p95 is not None else None,
+            "cooling_down": not self.available(),
+            "last_error": self.last_error,
+        }
+
+
+class _TurnContext:
+    """
+    One provider call's view of a Conversation. The history and pending text
+    are read once per turn and shared by every call of that turn; the prompt a
+    worker builds from them stays here, so racing calls never overwrite each
+    other's outgoing message and only the answering provider's is committed.
+    """
+
+    def __init__(self, messages: List[Dict[str, Any]], pending: str):
+        self.messages = messages
+        self.pending = pending
+        self.user_text: Optional[str] = None
+
+    def pending_text(self) -> str:
+        return self.pending
+
+    def outgoing(self, user_text: str) -> List[Dict[str, Any]]:
+        self.user_text = user_text
+        return self.messages + [{"role": "user", "content": user_text}]
+
+
+class RouterWorker:
+    """
+    Worker that sends each turn to the healthiest of several workers.
+
+    Providers are ranked by availability (a provider that just failed is skipped
+    for a cooldown; after a fatal error such as auth or billing, for the rest of
+    the run), then by recent error rate, then by rolling p50 latency; ties keep
+    the configured order, so the first worker is the primary. When the chosen
+    worker fails (5xx, overload, rate limit after the transport's retries, or a
+    fatal error) the same turn goes to the next one.
+
+    With `hedge_after` (seconds), a request still unanswered after that long is
+    also sent to the second-ranked provider and the first successful answer is
+    used; the slower call finishes in the background and only updates stats.
+    Each worker runs one call at a time, and a call's usage, stop reason and
+    error are captured as it returns, so a straggler cannot overwrite them.
+
+    Continuations of a truncated reply always go to the worker that wrote it.
+    """
+
+    def __init__(self, workers: List[Any], hedge_after: Optional[float] = None, debug: bool = False,
+                 window: int = 50):
+        if not workers:
+            raise ValueError("RouterWorker needs at least one worker")
+        self.workers = workers
+        self.hedge_after = hedge_after
+        self.debug = debug
+        self.health = [ProviderHealth(self._name(w), window) for w in workers]
+        self.transport = workers[0].transport
+        self.last_usage: Dict[str, int] = {}
+        self.last_stop_reason: Optional[str] = None
+        self.last_error: Optional[APIError] = None
+        self.last_route: Dict[str, Any] = {}
+        self._last_index = 0
+        self._lock = threading.Lock()
+        self._busy = [threading.Lock() for _ in workers]  # one call per worker at a time
+        self._pool = ThreadPoolExecutor(max_workers=2 * len(workers), thread_name_prefix="router")
+        atexit.register(self.close)
+
+    @property
+    def model(self) -> str:
+        return getattr(self.workers[self._last_index], "model", "unknown")
+
+    @property
+    def can_continue(self) -> bool:
+        return getattr(self.workers[self._last_index], "can_continue", True)
+
+    def generate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        if isinstance(context, str):
+            return self._route(lambda w: w.generate(context, turn, prefix))
+        messages, pending = list(context.messages), context.pending_text()
+        views: Dict[int, _TurnContext] = {}
+
+        def call(w):
+            view = views[id(w)] = _TurnContext(messages, pending)
+            return w.generate(view, turn, prefix)
+
+        text = self._route(call)
+        view = views.get(id(self.workers[self._last_index]))
+        if view is not None and view.user_text is not None:
+            context.outgoing(view.user_text)
+        return text
+
+    async def agenerate(self, context: Union[str, Any], turn: int, prefix: str = "") -> str:
+        return await asyncio.to_thread(self.generate, context, turn, prefix)
+
+    def continue_response(self, context: Union[str, Any], turn: int, partial: str, prefix: str = "",
+                          max_tokens: int = 1024) -> str:
+        i = self._last_index
+        text, error, _, state = self._timed(i, lambda w: w.continue_response(context, turn, partial, prefix,
+                                                                            max_tokens=max_tokens))
+        self._adopt(i, error, state)
+        return text
+
+    def stream(self, context: Union[str, Any], turn: int, prefix: str = "") -> Iterator[str]:
+        """
+        Stream from the best provider. A provider that fails before its first
+        chunk (its error reply is the only thing it yields) is skipped for the
+        next; once text has been passed on, the stream stays with that provider.
+        """
+        failovers: List[str] = []
+        text = ""
+        for i in self._ranked():
+            worker = self.workers[i]
+            self._busy[i].acquire()
+            self._begin(i)
+            start = time.monotonic()
+            chunks = worker.stream(context, turn, prefix)
+            error: Optional[APIError] = None
+            try:
+                first = next(chunks, "")
+                error = getattr(worker, "last_error", None)
+                if error is not None:
+                    failovers.append(self.health[i].name)
+                    text = first
+                    continue
+                self._set_route(i, failovers, hedged=False)
+                yield first
+                yield from chunks
+                error = getattr(worker, "last_error", None)
+                return
+            finally:
+                chunks.close()
+                self._end(i, time.monotonic() - start, error)
+                self._adopt(i, error, self._state(worker))
+                self._busy[i].release()
+        self._set_route(self._last_index, failovers, hedged=False)
+        yield text
+
+    def stats(self) -> Dict[str, Any]:
+        return {h.name: h.stats() for h in self.health}
+
+    def close(self):
+        """Stop the hedging pool; a call still running is left to finish on its own."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        atexit.unregister(self.close)
+
+    # -------------------- Internals --------------------
+
+    def _route(self, call: Callable[[Any], str]) -> str:
+        failovers: List[str] = []
+        ranked = self._ranked()
+        text = ""
+        while ranked:
+            if self.hedge_after is not None and len(ranked) > 1:
+                i, text, error, state, tried = self._hedged(ranked[0], ranked[1], call)
+            else:
+                text, error, _, state = self._timed(ranked[0], call)
+                i, tried = ranked[0], [ranked[0]]
+            ranked = [j for j in ranked if j not in tried]
+            self._adopt(i, error, state)
+            if error is None:
+                self._set_route(i, failovers, hedged=len(tried) > 1)
+                return text
+            failovers.extend(self.health[j].name for j in tried)
+            if self.debug and ranked:
+                print(f"🔀 {self.health[i].name} failed ({error.kind}); failing over to "
+                      f"{self.health[ranked[0]].name}")
+        self._set_route(self._last_index, failovers, hedged=False)
+        return text
+
+    def _hedged(self, first: int, second: int, call) -> Tuple[int, str, Optional[APIError], Dict[str, Any], List[int]]:
+        """
+        Run `first`; if it has not answered after hedge_after seconds, race
+        `second` against it. Returns the winner (or the last failure) and the
+        providers that were tried.
+        """
+        futures = {self._pool.submit(self._timed, first, call): first}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            if self.debug:
+                print(f"🏁 {self.health[first].name} slower than {self.hedge_after}s; hedging to "
+                      f"{self.health[second].name}")
+            futures[self._pool.submit(self._timed, second, call)] = second
+        pending = set(futures)
+        result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                text, error, _, state = future.result()
+                result = (futures[future], text, error, state, list(futures.values()))
+                if error is None:
+                    return result
+        return result
+
+    def _timed(self, i: int, call) -> Tuple[str, Optional[APIError], float, Dict[str, Any]]:
+        """Run `call` on worker `i`; returns its text, error, latency and result state."""
+        worker = self.workers[i]
+        with self._busy[i]:
+            self._begin(i)
+            start = time.monotonic()
+            error: Optional[APIError] = None
+            try:
+                text = call(worker)
+                error = getattr(worker, "last_error", None)
+            except Exception as e:  # workers report failures in last_error; this is a bug guard
+                text, error = worker._error_response(e), getattr(worker, "last_error", None)
+            state = self._state(worker)
+        latency = time.monotonic() - start
+        self._end(i, latency, error)
+        return text, error, latency, state
+
+    def _ranked(self) -> List[int]:
+        """Provider indexes, best first; providers cooling down go last rather than disappearing."""
+        with self._lock:
+            def key(i: int):
+                h = self.health[i]
+                p50 = h.percentile(50)
+                return (not h.available(), h.inflight > 0, round(h.error_rate, 1),
+                        p50 if p50 is not None else 0.0, i)
+            return sorted(range(len(self.workers)), key=key)
+
+    def _begin(self, i: int):
+        with self._lock:
+            self.health[i].inflight += 1
+
+    def _end(self, i: int, latency: float, error: Optional[APIError]):
+        with self._lock:
+            self.health[i].inflight -= 1
+            self.health[i].record(latency, error)
+
+    @staticmethod
+    def _state(worker: Any) -> Dict[str, Any]:
+        return {"usage": dict(getattr(worker, "last_usage", None) or {}),
+                "stop_reason": getattr(worker, "last_stop_reason", None)}
+
+    def _adopt(self, i: int, error: Optional[APIError], state: Dict[str, Any]):
+        self._last_index = i
+        self.last_usage = state["usage"]
+        self.last_stop_reason = state["stop_reason"]
+        self.last_error = error
+
+    def _set_route(self, i: int, failovers: List[str], hedged: bool):
+        self.last_route = {"provider": self.health[i].name, "failovers": failovers, "hedged": hedged}
+
+    @staticmethod
+    def _name(worker: Any) -> str:
+        inner = getattr(worker, "worker", worker)  # see through a ReplayWorker
+        return f"{type(inner).__name__.replace('Worker', '').lower()}:{getattr(inner, 'model', '?')}"
+
+
+def build_workers(providers: List[str], debug: bool = False) -> List[Any]:
+    """Workers for provider names ("claude", "gemini"); providers without credentials are skipped."""
+    from .claude import ClaudeWorker
+    from .gemini import GeminiWorker
+
+    classes = {"claude": ClaudeWorker, "anthropic": ClaudeWorker, "gemini": GeminiWorker, "google": GeminiWorker}
+    workers = []
+    for name in providers:
+        cls = classes.get(name.strip().lower())
+        if cls is None:
+            raise ValueError(f"Unknown provider {name!r} (expected one of: claude, gemini)")
+        try:
+            workers.append(cls(debug=debug))
+        except ValueError as e:  # missing API key
+            if debug:
+                print(f"⚠️  Skipping provider {name}: {e}")
+    if not workers:
+        raise ValueError(f"No usable provider among {', '.join(providers)} (check API keys)")
+    return workers
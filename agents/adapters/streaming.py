@@ -0,0 +1,16 @@
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+
+def iter_sse_data(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield the JSON payload of each `data:` line in a server-sent event stream."""
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
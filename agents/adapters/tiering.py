@@ -0,0 +1,49 @@
+from typing import Any, Dict, Optional
+
+# Decisions whose writes produce code; only these need the large model
+CODE_DECISIONS = {"EDIT", "MIGRATE"}
+
+FAST_MODEL = "claude-3-5-haiku-20241022"
+FAST_MAX_TOKENS = 1500
+
+
+class ModelPolicy:
+    """
+    Picks the worker for each turn: a large model ("strong") or a small, fast
+    one ("fast").
+
+    What a reply will decide is not known before the call, so the tier is
+    predicted from the previous turn. The first turn (planning), turns after a
+    successful EXECUTE/TEST/DOCS or search, and RETRY follow-ups of a fast turn
+    go to the fast model. The turn after a PLAN, or after anything failed, is
+    expected to write code and goes to the strong model. A fast reply that
+    decides EDIT/MIGRATE is regenerated on the strong model (see `escalate`)
+    before it is continued or repaired, so code is only ever written by the
+    strong model.
+
+    Without a fast worker every turn uses the strong one.
+    """
+
+    def __init__(self, strong: Any, fast: Optional[Any] = None):
+        self.strong = strong
+        self.fast = fast
+        self.tier = "fast" if fast is not None else "strong"  # the first turn plans
+
+    @property
+    def enabled(self) -> bool:
+        return self.fast is not None
+
+    def worker(self, tier: Optional[str] = None) -> Any:
+        return self.fast if (tier or self.tier) == "fast" and self.fast is not None else self.strong
+
+    def escalate(self, tier: str, decision: Optional[str]) -> bool:
+        """True when a fast-tier reply decided to write code and must be redone by the strong model."""
+        return tier == "fast" and self.enabled and decision in CODE_DECISIONS
+
+    def advance(self, control: Dict[str, Any], failed: bool = False) -> str:
+        """Set and return the tier for the next turn, given this turn's decision and outcome."""
+        decision = control.get("decision")
+        if not self.enabled or decision == "RETRY":
+            return self.tier
+        self.tier = "strong" if decision == "PLAN" or failed else "fast"
+        return self.tier
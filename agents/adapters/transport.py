@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import RateLimiter
+from .retry import APIError, RetryPolicy, classify_response
+
+try:
+    import httpx  # optional; only used when HTTP/2 support (h2) is installed too
+    import h2  # noqa: F401
+except ImportError:
+    httpx = None
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that records requests vs. new connections per host."""
+
+    def __init__(self, stats: Dict[str, Dict[str, int]], lock: threading.Lock, **kwargs):
+        self._stats = stats
+        self._lock = lock
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        try:
+            pool = self.poolmanager.connection_from_url(request.url)
+            host = urlsplit(request.url).netloc
+            with self._lock:
+                self._stats[host] = {
+                    "requests": pool.num_requests,
+                    "connections": pool.num_connections,
+                }
+        except Exception:
+            pass
+        return response
+
+
+class HTTPTransport:
+    """
+    Shared keep-alive HTTP client for the model adapters.
+
+    Uses an httpx client with HTTP/2 when httpx and h2 are installed, otherwise a
+    pooled requests.Session. Either way connections are reused across turns, and
+    stats() reports how many requests were served over an existing connection.
+    When `rate_limiter` is set, every request first takes a token from it.
+
+    Rate-limit, overload, 5xx and network failures are retried here with
+    `retry_policy` (exponential backoff with jitter, honouring retry-after).
+    A 429 also pauses every other request to that host for the requested
+    time, so concurrent runs back off together. Fatal statuses are
+    returned (post) or raised as APIError (stream_lines) at once.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 8,
+                 http2: Optional[bool] = None, timeout: float = 120,
+                 rate_limiter: Optional[RateLimiter] = None, retry_policy: Optional[RetryPolicy] = None):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.http2 = (httpx is not None) if http2 is None else (http2 and httpx is not None)
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._throttled_seconds = 0.0
+        self._cooldown_until: Dict[str, float] = {}  # host -> monotonic time; set by 429s
+        self._retries: Dict[str, int] = {}
+        self._retry_seconds = 0.0
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=pool_connections * pool_maxsize,
+                    max_keepalive_connections=pool_maxsize,
+                ),
+            )
+            self._session = None
+        else:
+            self._client = None
+            self._session = requests.Session()
+            adapter = _CountingAdapter(
+                self._stats, self._lock,
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+            )
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+
+    def post(self, url: str, headers: Optional[Dict[str, str]] = None,
+             json: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        """
+        POST and return a response exposing status_code, headers, text and
+        json(). Retryable failures are retried; if they persist, the last one
+        is raised as APIError.
+        """
+        timeout = timeout or self.timeout
+        host = urlsplit(url).netloc
+
+        def attempt():
+            self._throttle(host)
+            if self._client is not None:
+                self._count(host, n_requests=1)
+                response = self._client.post(
+                    url, headers=headers, json=json, timeout=timeout,
+                    extensions={"trace": self._trace(host)},
+                )
+            else:
+                response = self._session.post(url, headers=headers, json=json, timeout=timeout)
+            if response.status_code != 200:
+                error = classify_response(response.status_code, response.text, response.headers)
+                if error.retryable:
+                    raise error
+            return response
+
+        return self.retry_policy.run(attempt, on_retry=lambda error, wait: self._on_retry(host, error, wait))
+
+    def stream_lines(self, url: str, headers: Optional[Dict[str, str]] = None,
+                     json: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        POST with a streamed response body and yield it line by line (for SSE).
+        Opening the stream is retried like post(); a non-200 status raises APIError.
+        """
+        timeout = timeout or self.timeout
+        host = urlsplit(url).netloc
+        response = self.retry_policy.run(lambda: self._open_stream(url, headers, json, timeout),
+                                         on_retry=lambda error, wait: self._on_retry(host, error, wait))
+        try:
+            if self._client is not None:
+                yield from response.iter_lines()
+            else:
+                response.encoding = response.encoding or "utf-8"
+                yield from response.iter_lines(decode_unicode=True)
+        finally:
+            response.close()
+
+    def _open_stream(self, url: str, headers: Optional[Dict[str, str]], json: Optional[Dict[str, Any]],
+                     timeout: float):
+        host = urlsplit(url).netloc
+        self._throttle(host)
+        if self._client is not None:
+            self._count(host, n_requests=1)
+            request = self._client.build_request("POST", url, headers=headers, json=json, timeout=timeout,
+                                                 extensions={"trace": self._trace(host)})
+            response = self._client.send(request, stream=True)
+            if response.status_code != 200:
+                response.read()
+                response.close()
+                raise classify_response(response.status_code, response.text, response.headers)
+            return response
+
+        response = self._session.post(url, headers=headers, json=json, timeout=timeout, stream=True)
+        if response.status_code != 200:
+            text = response.text
+            response.close()
+            raise classify_response(response.status_code, text, response.headers)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = {h: dict(s) for h, s in self._stats.items()}
+            throttled = self._throttled_seconds
+            retries = dict(self._retries)
+            retry_seconds = self._retry_seconds
+        total_requests = sum(s.get("requests", 0) for s in hosts.values())
+        total_connections = sum(s.get("connections", 0) for s in hosts.values())
+        reused = max(total_requests - total_connections, 0)
+        return {
+            "backend": "httpx/h2" if self._client is not None else "requests",
+            "requests": total_requests,
+            "connections": total_connections,
+            "reused": reused,
+            "reuse_ratio": round(reused / total_requests, 3) if total_requests else 0.0,
+            "throttled_seconds": round(throttled, 3),
+            "retries": sum(retries.values()),
+            "retries_by_kind": retries,
+            "retry_wait_seconds": round(retry_seconds, 3),
+            "hosts": hosts,
+        }
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+        if self._session is not None:
+            self._session.close()
+
+    def _throttle(self, host: str):
+        with self._lock:
+            pause = self._cooldown_until.get(host, 0.0) - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            with self._lock:
+                self._throttled_seconds += pause
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire()
+            if waited:
+                with self._lock:
+                    self._throttled_seconds += waited
+
+    def _on_retry(self, host: str, error: APIError, wait: float):
+        with self._lock:
+            self._retries[error.kind] = self._retries.get(error.kind, 0) + 1
+            self._retry_seconds += wait
+            if error.kind == "rate_limit":
+                self._cooldown_until[host] = max(self._cooldown_until.get(host, 0.0), time.monotonic() + wait)
+
+    def _count(self, host: str, n_requests: int = 0, n_connections: int = 0):
+        with self._lock:
+            s = self._stats.setdefault(host, {"requests": 0, "connections": 0})
+            s["requests"] += n_requests
+            s["connections"] += n_connections
+
+    def _trace(self, host: str):
+        def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                self._count(host, n_connections=1)
+        return trace
+
+
+_shared_transport: Optional[HTTPTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_transport() -> HTTPTransport:
+    """Process-wide transport, configured from AGENT_HTTP_* environment variables."""
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            http2_env = os.getenv("AGENT_HTTP2")
+            rpm = os.getenv("AGENT_REQUESTS_PER_MINUTE")
+            _shared_transport = HTTPTransport(
+                pool_connections=int(os.getenv("AGENT_HTTP_POOL_CONNECTIONS", "4")),
+                pool_maxsize=int(os.getenv("AGENT_HTTP_POOL_MAXSIZE", "8")),
+                http2=None if http2_env is None else http2_env.lower() in ("1", "true", "yes"),
+                timeout=float(os.getenv("AGENT_HTTP_TIMEOUT", "120")),
+                rate_limiter=RateLimiter.per_minute(float(rpm)) if rpm else None,
+                retry_policy=RetryPolicy(
+                    max_attempts=int(os.getenv("AGENT_HTTP_MAX_ATTEMPTS", "5")),
+                    max_delay=float(os.getenv("AGENT_HTTP_MAX_BACKOFF", "60")),
+                ),
+            )
+        return _shared_transport
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .adapters.ratelimit import RateLimiter
+from .adapters.transport import get_transport
+from .orchestrator import AgentOrchestrator
+from .skills.workspace import WorkspaceManager
+
+
+class BatchRunner:
+    """
+    Drives many AgentOrchestrator runs from a JSONL task queue on one event loop.
+
+    Each queue line is either a JSON string (the task) or an object with a
+    "task" key and optional "id", "max_turns" and "max_minutes". Up to
+    `concurrency` runs are in flight at once; each gets its own run_id and git
+    worktree, and all of them share the process-wide HTTP transport, whose rate
+    limiter caps provider requests across the whole batch.
+    """
+
+    def __init__(self, concurrency: int = 4, requests_per_minute: Optional[float] = None,
+                 isolate: bool = True, keep_worktrees: bool = False, debug: bool = False,
+                 **orchestrator_kwargs):
+        self.concurrency = concurrency
+        self.isolate = isolate
+        self.keep_worktrees = keep_worktrees
+        self.debug = debug
+        self.orchestrator_kwargs = orchestrator_kwargs
+        self.batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.runs_dir = Path("runs").resolve()
+        self.workspaces = WorkspaceManager(".")
+        if self.isolate:
+            self.workspaces.prune()
+
+        if requests_per_minute:
+            get_transport().rate_limiter = RateLimiter.per_minute(requests_per_minute, burst=self.concurrency)
+
+    @staticmethod
+    def load_tasks(queue_file: str) -> List[Dict[str, Any]]:
+        tasks = []
+        with open(queue_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                spec = json.loads(line)
+                if isinstance(spec, str):
+                    spec = {"task": spec}
+                if not spec.get("task"):
+                    raise ValueError(f"Queue entry without a task: {line}")
+                tasks.append(spec)
+        return tasks
+
+    def run(self, queue_file: str) -> List[Dict[str, Any]]:
+        return asyncio.run(self.run_async(self.load_tasks(queue_file)))
+
+    async def run_async(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(
+            self._run_task(i, spec, semaphore) for i, spec in enumerate(tasks, start=1)
+        ))
+        self._log({"type": "batch_done", "tasks": len(tasks),
+                   "succeeded": sum(1 for r in results if r.get("success"))})
+        return list(results)
+
+    async def _run_task(self, index: int, spec: Dict[str, Any], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        run_id = f"{self.batch_id}_{spec.get('id') or f'{index:03d}'}"
+        async with semaphore:
+            root, workspace, env = ".", None, None
+            if self.isolate:
+                workspace = await asyncio.to_thread(self.workspaces.create, run_id)
+                if not workspace.get("success"):
+                    result = {"run_id": run_id, "success": False,
+                              "reason": f"Worktree setup failed: {workspace.get('error')}"}
+                    self._log({"type": "task_done", **result})
+                    return result
+                root, env = workspace["path"], workspace["env"]
+
+            print(f"🚀 [{run_id}] {spec['task'][:60]}")
+            try:
+                kwargs = {**self.orchestrator_kwargs}
+                for key in ("max_turns", "max_minutes"):
+                    if key in spec:
+                        kwargs[key] = spec[key]
+                orchestrator = AgentOrchestrator(
+                    run_id=run_id, debug=self.debug, root=root, runs_dir=str(self.runs_dir), env=env, **kwargs
+                )
+                outcome = await orchestrator.execute_task_async(spec["task"])
+            except Exception as e:
+                outcome = {"success": False, "reason": f"Exception: {e}"}
+            finally:
+                if workspace and self.keep_worktrees:
+                    self.workspaces.keep(workspace["path"])
+                elif workspace:
+                    await asyncio.to_thread(self.workspaces.remove, workspace["path"])
+
+            result = {"run_id": run_id, "task": spec["task"], **outcome}
+            if workspace:
+                result["branch"] = workspace["branch"]
+            print(f"{'✅' if result.get('success') else '❌'} [{run_id}] {result.get('reason', '')}")
+            self._log({"type": "task_done", **result})
+            return result
+
+    def _log(self, data: Dict[str, Any]):
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.runs_dir / f"batch_{self.batch_id}.jsonl", "a") as f:
+            f.write(json.dumps(data) + "\n")
@@ -0,0 +1,3 @@
+from .conversation import Conversation
+from .budget import ContextBudget, estimate_tokens
+from .retrieval import ContextRetriever
@@ -0,0 +1,130 @@
+import re
+from typing import Any, Dict, Optional, Set
+
+from .conversation import Conversation
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or its encoding files unavailable offline
+    _ENCODING = None
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token count. Uses tiktoken when installed; otherwise counts words and
+    punctuation and scales for sub-word splits, which tracks Claude's tokenizer
+    closely enough for budgeting.
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(_TOKEN_RE.findall(text)) * 4 // 3 + 1
+
+
+def summarize_result(text: str) -> str:
+    """Collapse an execution-result note to its header and status line."""
+    lines = text.splitlines()
+    return "\n".join(lines[:2] + ["[output trimmed to fit the context budget]"])
+
+
+class ContextBudget:
+    """
+    Keeps a Conversation plus the stable prefix under a token budget.
+
+    Nothing happens while the total fits. Once it doesn't, the history is
+    compacted down to `low_watermark * max_tokens` so that compaction (which
+    invalidates the provider's cached history) happens rarely. In priority order:
+
+    1. older execution results are cut to their header/status line,
+    2. older assistant replies are replaced by their decision summary,
+    3. the oldest whole exchanges are evicted.
+
+    The stable prefix (preamble + task) is never touched, and the latest PLAN
+    exchange and the `keep_recent` newest exchanges are pinned.
+    """
+
+    def __init__(self, max_tokens: int = 30000, low_watermark: float = 0.75, keep_recent: int = 2):
+        self.max_tokens = max_tokens
+        self.low_watermark = low_watermark
+        self.keep_recent = keep_recent
+
+    def usage(self, conversation: Conversation, prefix: str = "") -> int:
+        total = estimate_tokens(prefix) + estimate_tokens(conversation.pending_text())
+        for m in conversation.messages:
+            total += estimate_tokens(m["content"])
+        return total
+
+    def fit(self, conversation: Conversation, prefix: str = "") -> Optional[Dict[str, Any]]:
+        """Compact `conversation` in place if over budget; returns stats when it did."""
+        before = self.usage(conversation, prefix)
+        if before <= self.max_tokens:
+            return None
+
+        target = int(self.max_tokens * self.low_watermark)
+        stats = {"before": before, "summarized": 0, "evicted": 0}
+        used = before
+
+        protected = self._protected(conversation)
+        for i, m in enumerate(conversation.messages):
+            if used <= target:
+                break
+            if i in protected or m["role"] != "user":
+                continue
+            saved = self._summarize_user(m)
+            if saved:
+                used -= saved
+                stats["summarized"] += 1
+
+        for i, m in enumerate(conversation.messages):
+            if used <= target:
+                break
+            if i in protected or m["role"] != "assistant" or not m.get("summary"):
+                continue
+            if m["content"] != m["summary"]:
+                used -= estimate_tokens(m["content"]) - estimate_tokens(m["summary"])
+                m["content"] = m["summary"]
+                stats["summarized"] += 1
+
+        while used > target:
+            protected = self._protected(conversation)
+            oldest = next(
+                (i for i in range(0, len(conversation.messages) - 1, 2)
+                 if i not in protected and i + 1 not in protected),
+                None,
+            )
+            if oldest is None:
+                break
+            user, assistant = conversation.messages[oldest:oldest + 2]
+            used -= estimate_tokens(user["content"]) + estimate_tokens(assistant["content"])
+            del conversation.messages[oldest:oldest + 2]
+            stats["evicted"] += 1
+
+        stats["after"] = self.usage(conversation, prefix)
+        return stats
+
+    def _protected(self, conversation: Conversation) -> Set[int]:
+        n = len(conversation.messages)
+        protected = set(range(max(n - 2 * self.keep_recent, 0), n))
+        for i in range(n - 1, -1, -1):
+            m = conversation.messages[i]
+            if m["role"] == "assistant" and m.get("kind") == "plan":
+                protected.update({i - 1, i})
+                break
+        return protected
+
+    @staticmethod
+    def _summarize_user(message: Dict[str, Any]) -> int:
+        """Trim execution-result parts of a committed user message; returns tokens saved."""
+        saved = 0
+        for kind, text in message.get("parts", []):
+            if kind != "result" or text not in message["content"]:
+                continue
+            short = summarize_result(text)
+            if len(short) < len(text):
+                message["content"] = message["content"].replace(text, short)
+                saved += estimate_tokens(text) - estimate_tokens(short)
+        return saved
@@ -0,0 +1,49 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Conversation:
+    """
+    Append-only user/assistant message history for the native messages APIs.
+
+    Orchestrator notes (results, hints, plans) accumulate as pending user text.
+    When a request is built, the pending text becomes the outgoing user message;
+    it is committed together with the assistant reply, so every message that has
+    been sent once is sent byte-identically on later turns (which is what lets
+    provider prompt caching reuse the whole history prefix).
+
+    Messages carry bookkeeping keys next to role/content ("kind", "turn",
+    "parts", "summary") that adapters ignore and ContextBudget uses to decide
+    what to compact.
+    """
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self._pending: List[Tuple[str, str]] = []
+        self._outgoing: Optional[str] = None
+
+    def add_user(self, text: str, kind: str = "note"):
+        if text:
+            self._pending.append((kind, text))
+
+    def pending_text(self) -> str:
+        return "\n\n".join(text for _, text in self._pending)
+
+    def outgoing(self, user_text: str) -> List[Dict[str, Any]]:
+        """Messages for the next request, ending with `user_text` as the new user turn."""
+        self._outgoing = user_text
+        return self.messages + [{"role": "user", "content": user_text}]
+
+    def add_assistant(self, text: str, kind: str = "reply", turn: int = 0, summary: str = ""):
+        """Commit the last outgoing user message and the model's reply to it."""
+        user_text = self._outgoing if self._outgoing is not None else (self.pending_text() or "Continue.")
+        self.messages.append({"role": "user", "content": user_text, "turn": turn, "parts": list(self._pending)})
+        self.messages.append({"role": "assistant", "content": text, "turn": turn, "kind": kind, "summary": summary})
+        self._pending = []
+        self._outgoing = None
+
+    def recent_text(self, n: int = 2) -> str:
+        items = [m["content"] for m in self.messages] + [text for _, text in self._pending]
+        return "\n".join(items[-n:])
+
+    def __len__(self) -> int:
+        return len(self.messages) + (1 if self._pending else 0)
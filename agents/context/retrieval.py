@@ -0,0 +1,112 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from ..skills.search import SearchIndex, tokenize
+
+from .budget import estimate_tokens
+
+# Task-prose words that say nothing about *where* the code is.
+_STOPWORDS = {
+    "a", "an", "and", "the", "to", "of", "in", "on", "for", "with", "from", "by", "as", "at", "is", "are",
+    "be", "it", "its", "this", "that", "these", "those", "or", "not", "no", "so", "if", "when", "then",
+    "we", "i", "you", "our", "my", "should", "must", "can", "could", "would", "will", "make", "add", "use",
+    "using", "new", "fix", "update", "change", "create", "implement", "please", "also", "all", "any",
+    "some", "into", "out", "up", "there", "which", "what", "how", "more", "less", "do", "does",
+}
+
+
+class ContextRetriever:
+    """
+    Picks the repo files most relevant to a task and packs excerpts of them
+    into a token budget for the initial context.
+
+    Files are ranked with BM25 over the SearchIndex (plus a bonus when a task
+    word appears in the path). Small files go in whole; larger ones contribute
+    windows around their best-matching lines. Each file is capped at
+    `file_tokens` and the whole section at `max_tokens`. Everything is local.
+    """
+
+    def __init__(self, search_index: SearchIndex, read_file: Callable[[str], Optional[str]],
+                 max_tokens: int = 6000, max_files: int = 8, file_tokens: int = 1500,
+                 window: int = 6, path_boost: float = 0.5):
+        self.search_index = search_index
+        self.read_file = read_file
+        self.max_tokens = max_tokens
+        self.max_files = max_files
+        self.file_tokens = file_tokens
+        self.window = window
+        self.path_boost = path_boost
+
+    def select(self, task: str) -> List[Dict[str, Any]]:
+        terms = [t for t in dict.fromkeys(tokenize(task)) if t not in _STOPWORDS and len(t) > 1]
+        if not terms:
+            return []
+        self.search_index.refresh()
+        ranked = self.search_index.rank(terms, limit=self.max_files * 2, path_boost=self.path_boost)
+
+        picked, remaining = [], self.max_tokens
+        for path, score in ranked:
+            if len(picked) >= self.max_files or remaining < 200:
+                break
+            try:
+                text = self.read_file(path)
+            except Exception:
+                continue
+            if not text or text == "[Binary file]":
+                continue
+            cap = min(self.file_tokens, remaining)
+            excerpt, whole = self._excerpt(path, text, terms, cap)
+            if not excerpt:
+                continue
+            tokens = estimate_tokens(excerpt)
+            remaining -= tokens
+            picked.append({"path": path, "score": round(score, 3), "excerpt": excerpt,
+                           "whole": whole, "tokens": tokens})
+        return picked
+
+    @staticmethod
+    def render(files: List[Dict[str, Any]]) -> str:
+        parts = []
+        for f in files:
+            label = f["path"] if f["whole"] else f"{f['path']} (excerpts)"
+            parts.extend([f"### {label}", "```", f["excerpt"], "```", ""])
+        return "\n".join(parts)
+
+    def _excerpt(self, path: str, text: str, terms: List[str], cap: int):
+        if estimate_tokens(text) <= cap:
+            return text, True
+
+        lines = text.splitlines()
+        matches = self.search_index.matching_lines(path, terms)
+        # Best lines first: most distinct task terms, then earliest.
+        order = sorted(matches, key=lambda n: (-len(matches[n]), n))
+
+        spans: List[List[int]] = []
+        used = 0
+        for lineno in order:
+            lo, hi = max(lineno - self.window, 1), min(lineno + self.window, len(lines))
+            if any(s[0] <= lineno <= s[1] for s in spans):
+                continue
+            cost = estimate_tokens("\n".join(lines[lo - 1:hi]))
+            if used + cost > cap:
+                continue
+            spans.append([lo, hi])
+            used += cost
+
+        if not spans:
+            head = []
+            for line in lines:
+                used += estimate_tokens(line) + 1
+                if used > cap:
+                    break
+                head.append(line)
+            return "\n".join(head), False
+
+        spans.sort()
+        merged = [spans[0]]
+        for lo, hi in spans[1:]:
+            if lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        chunks = [f"// lines {lo}-{hi}\n" + "\n".join(lines[lo - 1:hi]) for lo, hi in merged]
+        return "\n…\n".join(chunks), False
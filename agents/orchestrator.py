@@ -1,14 +1,29 @@
+import asyncio
 import json
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import re
 
-from adapters.claude import ClaudeWorker
-from skills.repo_io import RepoInterface
-from skills.executor import Executor
-from skills.supabase import SupabaseHelper
-from skills.gitops import GitOps
+from .adapters.claude import ClaudeWorker
+from .adapters.replay import ReplayWorker, ResponseStore
+from .adapters.router import RouterWorker, build_workers
+from .adapters.tiering import FAST_MAX_TOKENS, FAST_MODEL, ModelPolicy
+from .adapters.retry import RetryPolicy
+from .skills.repo_io import RepoInterface
+from .skills.executor import Executor
+from .skills.supabase import SupabaseHelper
+from .skills.gitops import GitOps
+from .skills.search import SearchIndex
+from .skills.transaction import WriteBatch
+from .runlog.sink import RunLogSink
+from .runlog.timing import Tracer
+from .protocol.extract import DECISIONS, JSONObjectScanner, extract_control
+from .protocol.decision import ControlDecision
+from .protocol.repair import is_truncated, repair_control
+from .context.conversation import Conversation
+from .context.budget import ContextBudget
+from .context.retrieval import ContextRetriever
 
 
 class AgentOrchestrator:
@@ -18,7 +33,8 @@ class AgentOrchestrator:
     Key behaviors:
     - Injects a universal control-protocol preamble so the model replies with JSON decisions.
     - Supports PLAN → EDIT/EXECUTE/TEST → COMMIT/PR → STOP loops.
-    - Retries transient 503/UNAVAILABLE provider errors.
+    - Retries classified transient provider errors within the turn, without using up turns.
+    - Sends planning turns to a fast model and code-writing turns to the strong one.
     - Synthesizes trivial "Create <file> with content '...'" if the model forgets.
     - Normalizes paths and prevents git pathspec failures.
     """
@@ -30,8 +46,12 @@ class AgentOrchestrator:
   "decision": "PLAN | EDIT | EXECUTE | TEST | MIGRATE | DOCS | PR | STOP | RETRY",
   "plan": ["optional, short step bullets for PLAN"],
   "commands": [
-    { "write": { "path": "<repo-relative path>", "content": "<new file text OR full replacement>", "patch": "<optional instead of content>" } },
-    { "run": "<npm|yarn|pnpm|supabase|eslint|tsc|pytest|vitest|jest command>" }
+    { "write": { "path": "<repo-relative path>", "content": "<full text, for new files or rewrites>" } },
+    { "write": { "path": "<existing file>", "patch": "<unified diff with @@ hunks, or <<<<<<< SEARCH / ======= / >>>>>>> REPLACE blocks>" } },
+    { "write": { "path": "<existing file>", "edits": [{ "search": "<exact existing lines>", "replace": "<new lines>" }] } },
+    { "run": "<npm|yarn|pnpm|supabase|eslint|tsc|pytest|vitest|jest command>", "independent": true },
+    { "search": "<words or identifiers>", "path": "<optional dir prefix>" },
+    { "symbols": "<declaration name or prefix>", "kind": "<optional: function|class|interface|type|table|...>" }
   ],
   "commit": {"message":"<concise>", "files":["<paths you modified>"]},
   "pr": {"title":"<title>", "body":"<markdown body>"}
@@ -43,46 +63,144 @@ Rules:
 3) Always fill commit.files with exact repo-relative paths you changed (no leading './' or repo name).
 4) If upstream service is overloaded, reply {"decision":"RETRY"}.
 5) Keep JSON minimal; do not include logs/output text inside JSON.
+6) Mark "run" commands that do not depend on each other (lint, typecheck, tests) with "independent": true so they run in parallel.
+7) To change part of an existing file, send "patch" or "edits" with a few lines of context, not the whole file.
+8) To find code, use "search"/"symbols" commands (allowed with any decision, including PLAN) instead of grep/find/cat runs; ranked snippets come back next turn.
 """
 
-    def __init__(self, run_id: str, max_turns: int = 30, max_minutes: int = 45, debug: bool = False):
+    _DECISIONS = DECISIONS
+
+    def __init__(self, run_id: str, max_turns: int = 30, max_minutes: int = 45, debug: bool = False,
+                 stream: bool = False, context_tokens: int = 30000, retrieval_tokens: int = 6000,
+                 max_parallel_commands: int = 4,
+                 root: str = ".", runs_dir: str = "runs", env: Optional[Dict[str, str]] = None,
+                 worker: Optional[ClaudeWorker] = None, repo: Optional[RepoInterface] = None,
+                 log_options: Optional[Dict[str, Any]] = None, otlp_endpoint: Optional[str] = None,
+                 replay: str = "passthrough", continuation_tokens: int = 1024, max_continuations: int = 2,
+                 model_retry: Optional[RetryPolicy] = None, providers: Optional[List[str]] = None,
+                 hedge_after: Optional[float] = None, fast_model: Optional[str] = FAST_MODEL,
+                 fast_max_tokens: int = FAST_MAX_TOKENS, fast_worker: Optional[ClaudeWorker] = None):
         self.run_id = run_id
         self.max_turns = max_turns
         self.max_minutes = max_minutes
         self.debug = debug
+        self.stream = stream
+        self.max_parallel_commands = max_parallel_commands
+        # A reply cut off at max_tokens is finished with small continuation calls, not a new turn
+        self.continuation_tokens = continuation_tokens
+        self.max_continuations = max_continuations
+        # On top of the transport's own retries: a model call that still fails
+        # with a retryable error is repeated within the same turn after a backoff
+        self.model_retry = model_retry or RetryPolicy(max_attempts=3, base_delay=10.0, max_delay=120.0)
         self.start_time = datetime.now()
 
-        self.claude_worker = ClaudeWorker(debug=debug)
-        self.repo = RepoInterface()
-        self.executor = Executor()
-        self.supabase = SupabaseHelper()
-        self.git = GitOps()
+        # Every file, command and git operation is confined to `root` (a git
+        # worktree when several runs share one process). A long-lived caller such
+        # as the autopilot passes in its worker and repo so they are reused.
+        self.root = Path(root).resolve()
+        self.repo = repo or RepoInterface(str(self.root))
+        self.executor = Executor(working_dir=str(self.root), extra_env=env)
+        self.supabase = SupabaseHelper(str(self.root))
+        self.git = GitOps(str(self.root))
+        self._search: Optional[SearchIndex] = None  # built on first search/symbols command
+        workers = [worker] if worker is not None else build_workers(providers or ["claude"], debug=debug)
+        if fast_worker is None and worker is None and fast_model:
+            try:
+                fast_worker = ClaudeWorker(debug=debug, model=fast_model, max_tokens=fast_max_tokens)
+            except ValueError:  # no Anthropic key (e.g. gemini only): every turn uses the main workers
+                fast_worker = None
+        if replay != "passthrough":
+            # Recorded responses are keyed by the exact request, so reruns of the same prompts are local
+            # (a worker reused from an earlier run, as the autopilot does, is already wrapped)
+            store = ResponseStore(str(Path(runs_dir) / "responses"))
+            workers = [w if isinstance(w, (ReplayWorker, RouterWorker)) else ReplayWorker(w, store, mode=replay)
+                       for w in workers]
+            if fast_worker is not None and not isinstance(fast_worker, ReplayWorker):
+                fast_worker = ReplayWorker(fast_worker, store, mode=replay)
+        # Several providers: each turn goes to the healthiest, failing over on 5xx/overload
+        self.claude_worker = (RouterWorker(workers, hedge_after=hedge_after, debug=debug)
+                              if len(workers) > 1 else workers[0])
+        # Planning turns go to the fast model, code-writing turns to claude_worker
+        self.model_policy = ModelPolicy(self.claude_worker, fast_worker)
+        self.turn_worker = self.claude_worker  # the worker answering the current turn
 
         self.turn_count = 0
-        self.context_history: List[str] = []
+        self.stable_context = ""  # preamble + task + repo summary; sent as the cached prompt prefix
+        self.conversation = Conversation()
+        self.context_budget = ContextBudget(max_tokens=context_tokens)
+        self.retrieval_tokens = retrieval_tokens
         self.last_diffs: List[str] = []
         self.stuck_count = 0
         self.progress_made = False  # flips True when any edit/commit/exec succeeds
+        self.files_changed: List[str] = []
+        self.commits: List[str] = []
 
         # Ensure runs directory exists
-        runs_dir = Path("runs")
+        runs_dir = Path(runs_dir)
         runs_dir.mkdir(parents=True, exist_ok=True)
-        self.log_file = runs_dir / f"{run_id}.jsonl"
+        # Buffered, compressed event log; large values go to runs/blobs/ (see RunLogSink)
+        self.log_sink = RunLogSink(str(runs_dir), run_id, **(log_options or {}))
+        # Spans around model calls, parsing, edits, commands and git; per-turn split in `turn_timing`
+        self.tracer = Tracer(self.log, run_id, otlp_endpoint=otlp_endpoint)
         self.log({"type": "start", "run_id": run_id, "timestamp": self.start_time.isoformat()})
 
+        # Write-ahead journal for each turn's file writes; roll back any turn a
+        # previous process died in the middle of (its run_id differs from ours).
+        self.journal_dir = runs_dir / f"{run_id}.journal"
+        for recovered in WriteBatch.recover_all(runs_dir):
+            self.log({"type": "journal_recovered", **recovered})
+            if self.debug:
+                print(f"↩️  Rolled back an interrupted write batch: {recovered['paths']}")
+
         # Cache repo name for path normalization
-        self._repo_name = Path(".").resolve().name
+        self._repo_name = self.root.name
+
+    @property
+    def log_file(self) -> Path:
+        """The run's event log; the compressed archive once the run has ended."""
+        return self.log_sink.current_path
 
     def log(self, data: Dict[str, Any]):
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(data) + "\n")
+        self.log_sink.write(data)
 
     # -------------------- Main loop --------------------
 
     def execute_task(self, task_description: str) -> Dict[str, Any]:
-        # Seed context with repository summary + protocol preamble + explicit task
-        initial_context = self._build_initial_context(task_description)
-        self.context_history.append(initial_context)
+        """Synchronous entry point; runs execute_task_async() on a private event loop."""
+        return asyncio.run(self.execute_task_async(task_description))
+
+    async def execute_task_async(self, task_description: str) -> Dict[str, Any]:
+        """
+        Run the agent loop and return a structured outcome: success/reason (and
+        pr_url) plus run_id, turns used, whether progress was made, and the
+        files changed and commits made during the run.
+        """
+        try:
+            result = await self._run_loop(task_description)
+        except BaseException:
+            self.log_sink.close()
+            raise
+        result.update({
+            "run_id": self.run_id,
+            "turns": self.turn_count,
+            "progress_made": self.progress_made,
+            "files_changed": sorted(set(self.files_changed)),
+            "commits": list(self.commits),
+        })
+        self.log({"type": "end", **result})
+        self.log_sink.close()
+        return result
+
+    async def _run_loop(self, task_description: str) -> Dict[str, Any]:
+        """
+        The agent loop. Model calls, command execution and file/git I/O are all
+        awaited, so one process can drive many runs concurrently on one loop.
+        """
+        # Seed context with repository summary + protocol preamble + explicit task.
+        # It never changes during the run, so it is kept out of the conversation and
+        # sent as a stable prefix the provider can cache.
+        with self.tracer.span("context.build"):
+            self.stable_context = await asyncio.to_thread(self._build_initial_context, task_description)
 
         try:
             for turn in range(self.max_turns):
@@ -91,38 +209,115 @@ Rules:
                 if self._check_time_budget():
                     return {"success": False, "reason": "Time budget exceeded"}
 
+                self.tracer.begin_turn(self.turn_count)  # closes the previous turn's timing
+                self.log_sink.flush()  # previous turn is on disk before the next model call
+                await asyncio.to_thread(self.tracer.flush)
                 self.log({"type": "turn_start", "turn": self.turn_count})
                 if self.debug:
                     print(f"🔄 Turn {self.turn_count}/{self.max_turns}")
 
-                worker_output = self.claude_worker.generate(
-                    context="\n\n".join(self.context_history),
-                    turn=self.turn_count
-                )
-                self.log({"type": "worker_output", "turn": self.turn_count, "output": worker_output})
+                compacted = self.context_budget.fit(self.conversation, prefix=self.stable_context)
+                if compacted:
+                    self.log({"type": "context_compacted", "turn": self.turn_count, **compacted})
+                    if self.debug:
+                        print(f"🗜️  Context compacted: {compacted}")
+
+                tier = self.model_policy.tier
+                retries = 0  # RETRY replies in this turn; they are asked again, not given a turn
+                while True:
+                    self.turn_worker = self.model_policy.worker(tier)
+                    model = getattr(self.turn_worker, "model", None)
+                    with self.tracer.span("model.generate", model=model, tier=tier, stream=self.stream) as model_span:
+                        worker_output, control_data = await self._generate_turn(self.conversation, prefix=self.stable_context)
+                        model_span.set(output_chars=len(worker_output), early_control=control_data is not None)
+                    self.log({"type": "worker_output", "turn": self.turn_count, "output": worker_output})
+                    # A router picks the model per call, so read it back afterwards
+                    self.log({"type": "model_turn", "turn": self.turn_count, "tier": tier,
+                              "model": getattr(self.turn_worker, "model", model),
+                              "latency_s": round(model_span.duration_s, 3)})
+                    self._log_usage(model_span)
+                    route = getattr(self.turn_worker, "last_route", None)
+                    if route:
+                        self.log({"type": "route", "turn": self.turn_count, **route})
+
+                    # A failed model call is fatal (auth, billing, bad request) or still
+                    # failing after every retry; either way more turns cannot help
+                    api_error = getattr(self.turn_worker, "last_error", None)
+                    if api_error is not None:
+                        self.log({"type": "model_error", "turn": self.turn_count, **api_error.to_dict()})
+                        if self.debug:
+                            print(f"🛑 Model API error ({api_error.kind}); stopping the run")
+                        return {"success": False, "reason": f"Model API error ({api_error.kind}): {str(api_error)[:200]}"}
+
+                    if control_data is None:
+                        with self.tracer.span("protocol.parse"):
+                            control_data = self._parse_control_protocol(worker_output)
+
+                    # Code is only written by the strong model: a fast reply that decided
+                    # EDIT/MIGRATE is redone there before anything is continued or repaired
+                    decision = control_data.get("decision") if control_data else self._peek_decision(worker_output)
+                    if self.model_policy.escalate(tier, decision):
+                        self.log({"type": "model_escalation", "turn": self.turn_count,
+                                  "decision": decision, "from": model})
+                        if self.debug:
+                            print(f"⬆️  Fast model chose {decision}; regenerating with the strong model")
+                        tier = "strong"
+                        continue
 
-                control_data = self._parse_control_protocol(worker_output)
+                    if control_data is None:
+                        with self.tracer.span("protocol.repair"):
+                            worker_output, control_data = await self._recover_control(worker_output)
+                    if control_data is None:
+                        control_data = self._fallback_control(worker_output)
+
+                    if control_data.get("decision") == "RETRY":
+                        retries += 1
+                        if retries >= self.model_retry.max_attempts or self._check_time_budget():
+                            self.log({"type": "control_decision", "turn": self.turn_count, "control": control_data})
+                            return {"success": False, "reason": f"Model replied RETRY {retries} times"}
+                        wait = self.model_retry.delay(retries)
+                        self.log({"type": "model_retry", "turn": self.turn_count, "attempt": retries,
+                                  "wait_s": round(wait, 2), "kind": "model_requested",
+                                  "message": str(control_data.get("reason", ""))[:300]})
+                        if self.debug:
+                            print(f"⏳ Model replied RETRY; asking again in {wait:.1f}s (turn {self.turn_count})")
+                        await asyncio.sleep(wait)
+                        continue
+                    break
                 self.log({"type": "control_decision", "turn": self.turn_count, "control": control_data})
 
-                # Transient upstream errors -> retry this loop turn
-                if control_data.get("decision") == "RETRY":
-                    if self.debug:
-                        print("⏳ Upstream model unavailable; retrying this turn.")
-                    continue
+                self.model_policy.advance(control_data)
+
+                # The model's own reply becomes part of the history it sees next turn
+                self.conversation.add_assistant(
+                    worker_output,
+                    kind=str(control_data.get("decision", "reply")).lower(),
+                    turn=self.turn_count,
+                    summary=self._summarize_decision(control_data),
+                )
 
-                # Handle PLAN explicitly: record plan into context and continue loop
+                if any("dropped" in note for note in control_data.get("repaired", [])):
+                    self.conversation.add_user(
+                        "## System Hint\nYour last reply was cut off or malformed; parts of its control JSON were "
+                        f"dropped ({'; '.join(control_data['repaired'])}). Resend them, using \"patch\"/\"edits\" "
+                        "or several smaller writes instead of one long file."
+                    )
+
+                # Handle PLAN explicitly: the plan is already in the assistant message; nudge and continue
                 if control_data.get("decision") == "PLAN":
-                    plan = control_data.get("plan") or []
-                    plan_text = "\n".join(f"- {p}" for p in plan) if isinstance(plan, list) else str(plan)
-                    self.context_history.append(f"## Agent PLAN (turn {self.turn_count})\n{plan_text}")
-                    # Encourage next step:
-                    self.context_history.append(
+                    with self.tracer.span("search"):
+                        search_res = await self._handle_search_commands(control_data.get("commands") or [])
+                    if search_res:
+                        self.conversation.add_user(self._format_result_context(search_res), kind="result")
+                    self.conversation.add_user(
                         "## System Hint\nProceed to EDIT/EXECUTE/TEST decisions with concrete file paths and commands."
                     )
                     continue  # move to next iteration to request actionable steps
 
                 # Execute other decisions
-                result = self._execute_decision(control_data)
+                result = await self._execute_decision(control_data)
+                if result.get("success") is False or any(not r.get("success") for r in result.get("results", [])):
+                    self.model_policy.advance(control_data, failed=True)  # a fix is due: strong model
 
                 # If no progress this turn and the task matches a simple "Create <file> with content '...'",
                 # synthesize the write+commit immediately (not just on STOP).
@@ -131,17 +326,17 @@ Rules:
                     if synth:
                         if self.debug:
                             print(f"🧩 Synthesizing simple create now: {synth}")
-                        edit_res = self._handle_edit_commands(synth["commands"])
+                        edit_res = await self._handle_edit_commands(synth["commands"])
                         if edit_res.get("files_created"):
                             self.progress_made = True
                         commit_res = {}
                         if synth.get("commit"):
-                            commit_res = self._handle_commit(synth["commit"])
+                            commit_res = await self._handle_commit(synth["commit"])
                             if commit_res.get("success"):
                                 self.progress_made = True
                         if self.progress_made:
                             return {"success": True, "reason": "Task completed via synthesized create"}
-                        self.context_history.append(self._format_result_context({**edit_res, **commit_res}))
+                        self.conversation.add_user(self._format_result_context({**edit_res, **commit_res}), kind="result")
 
                 # Normal end conditions
                 if control_data.get("decision") == "STOP":
@@ -154,7 +349,7 @@ Rules:
                     return {"success": True, "reason": "PR created", "pr_url": result.get("pr_url")}
 
                 if result:
-                    self.context_history.append(self._format_result_context(result))
+                    self.conversation.add_user(self._format_result_context(result), kind="result")
 
                 if self._is_stuck(control_data):
                     if self.stuck_count >= 2:
@@ -163,24 +358,21 @@ Rules:
                 else:
                     self.stuck_count = 0
 
-                if len(self.context_history) > 10:
-                    self.context_history = self.context_history[-8:]
-
             # Before giving up on max turns, try one last synthesis
             if not self.progress_made:
                 last_try = self._maybe_synthesize_simple_create(
-                    self.context_history[0] if self.context_history else "",
-                    "\n".join(self.context_history[-2:]) if self.context_history else ""
+                    task_description,
+                    self.conversation.recent_text(2)
                 )
                 if last_try:
                     if self.debug:
                         print("🧪 Final attempt: synthesizing create before exit.")
-                    edit_res = self._handle_edit_commands(last_try["commands"])
+                    edit_res = await self._handle_edit_commands(last_try["commands"])
                     if edit_res.get("files_created"):
                         self.progress_made = True
                     commit_res = {}
                     if last_try.get("commit"):
-                        commit_res = self._handle_commit(last_try["commit"])
+                        commit_res = await self._handle_commit(last_try["commit"])
                         if commit_res.get("success"):
                             self.progress_made = True
                     if self.progress_made:
@@ -194,6 +386,18 @@ Rules:
                 import traceback
                 traceback.print_exc()
             return {"success": False, "reason": f"Exception: {str(e)}"}
+        finally:
+            self.tracer.end_turn()
+            await asyncio.to_thread(self.tracer.flush)
+            # Connection reuse across turns (confirms the keep-alive pool is working)
+            self.log({"type": "transport_stats", **self.claude_worker.transport.stats()})
+            workers = [self.claude_worker]
+            if isinstance(self.claude_worker, RouterWorker):
+                self.log({"type": "router_stats", "providers": self.claude_worker.stats()})
+                workers = self.claude_worker.workers
+            for w in workers + ([self.model_policy.fast] if self.model_policy.enabled else []):
+                if isinstance(w, ReplayWorker):
+                    self.log({"type": "replay_stats", **w.stats()})
 
     # -------------------- Context & parsing --------------------
 
@@ -213,7 +417,8 @@ Rules:
         except Exception as e:
             parts.append(f"Error reading repo structure: {e}")
 
-        key_files = ["README.md", "package.json", "AGENTS.md", "supabase/config.toml"]
+        # Conventions and scripts always; everything else is picked for this task.
+        key_files = ["AGENTS.md", "package.json"]
         for fp in key_files:
             try:
                 content = self.repo.read_file(fp)
@@ -221,41 +426,162 @@ Rules:
                     parts.extend([f"## {fp}", "```", content[:2000] + ("..." if len(content) > 2000 else ""), "```", ""])
             except Exception:
                 continue
+
+        if self.retrieval_tokens > 0:
+            try:
+                retriever = ContextRetriever(self._search_index(), self.repo.read_file, max_tokens=self.retrieval_tokens)
+                relevant = retriever.select(task_description)
+                relevant = [f for f in relevant if f["path"] not in key_files]
+                if relevant:
+                    parts.extend(["## Relevant Files (ranked for this task)", retriever.render(relevant)])
+                    self.log({"type": "retrieval", "files": [
+                        {"path": f["path"], "score": f["score"], "tokens": f["tokens"]} for f in relevant
+                    ]})
+            except Exception as e:
+                parts.append(f"Error ranking relevant files: {e}")
         return "\n".join(parts)
 
-    def _parse_control_protocol(self, worker_output: str) -> Optional[Dict[str, Any]]:
-        """Parse and validate control protocol JSON with better error handling."""
+    def _search_index(self) -> SearchIndex:
+        if self._search is None:
+            self._search = SearchIndex(self.repo.index)
+        return self._search
+
+    async def _generate_turn(self, context: Conversation, prefix: str = "") -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Ask the worker for this turn's response.
+
+        In streaming mode the response is scanned as it arrives and the stream is
+        closed as soon as a complete control object has been received, so the
+        orchestrator can act without waiting for trailing prose. Returns the text
+        received and the control object if one was found early (else None).
+
+        Retryable API failures the transport did not already retry (a stream
+        that fails after it opened, an error event mid-stream) are retried here
+        with `model_retry` backoff; they never use up a turn. Errors the
+        transport gave up on after several attempts are not retried again.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.stream:
+                output = await self.turn_worker.agenerate(context=context, turn=self.turn_count, prefix=prefix)
+                control = None
+            else:
+                output, control = await asyncio.to_thread(self._consume_stream, context, prefix)
+            error = getattr(self.turn_worker, "last_error", None)
+            if (error is None or not error.retryable or error.attempts > 1
+                    or attempt >= self.model_retry.max_attempts or self._check_time_budget()):
+                return output, control
+            wait = self.model_retry.delay(attempt, error)
+            self.log({"type": "model_retry", "turn": self.turn_count, "attempt": attempt,
+                      "wait_s": round(wait, 2), **error.to_dict()})
+            if self.debug:
+                print(f"⏳ {error.kind} from the model API; retrying turn {self.turn_count} in {wait:.1f}s")
+            await asyncio.sleep(wait)
 
-        # Handle common transient provider error text as RETRY
-        if ("model is overloaded" in worker_output) or (" 503" in worker_output) or ("UNAVAILABLE" in worker_output):
-            return {"decision": "RETRY", "reason": "Upstream 503/overloaded"}
+    def _consume_stream(self, context: Conversation, prefix: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        scanner = JSONObjectScanner()
+        chunks: List[str] = []
+        stream = self.turn_worker.stream(context=context, turn=self.turn_count, prefix=prefix)
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                for raw in scanner.feed(chunk):
+                    control = self._load_control(raw)
+                    if control is not None:
+                        text = "".join(chunks)
+                        if self.debug:
+                            print(f"⚡ Control object received early ({len(text)} chars streamed)")
+                        return text, control
+        finally:
+            stream.close()
+        return "".join(chunks), None
+
+    def _log_usage(self, model_span=None, worker=None):
+        """Record provider token usage and whether the cached prefix was hit."""
+        usage = dict(getattr(worker or self.turn_worker, "last_usage", None) or {})
+        if not usage:
+            return
+        usage["cache"] = "hit" if usage.get("cache_read_input_tokens") else "miss"
+        self.log({"type": "usage", "turn": self.turn_count, **usage})
+        self.tracer.add_tokens(usage)
+        if model_span is not None:
+            model_span.set(**{k: v for k, v in usage.items() if isinstance(v, int)})
+        if self.debug:
+            print(f"📦 Prompt cache {usage['cache']}: {usage}")
 
-        json_patterns = [
-            r'\{[^{}]*"decision"[^{}]*\}',
-            r'\{.*?"decision".*?\}',
-            r'```json\s*(\{.*?\})\s*```',
-            r'```\s*(\{.*?\})\s*```'
-        ]
-        for pattern in json_patterns:
-            matches = re.findall(pattern, worker_output, re.DOTALL)
-            if matches:
-                for m in matches:
-                    try:
-                        s = m.strip()
-                        if s.startswith("```"):
-                            s = re.sub(r"```.*?\n", "", s)
-                            s = re.sub(r"```.*?$", "", s)
-                        data = json.loads(s)
-                        if "decision" in data and data["decision"] in {
-                            "PLAN", "EDIT", "EXECUTE", "TEST", "MIGRATE", "DOCS", "PR", "STOP", "RETRY"
-                        }:
-                            return data
-                    except json.JSONDecodeError:
-                        continue
+    def _load_control(self, raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(data, dict) and data.get("decision") in self._DECISIONS:
+            return self._normalize_control(data)
+        return None
+
+    def _normalize_control(self, data: Dict[str, Any], errors: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Defaults filled and malformed commands/commit/pr dropped (see ControlDecision)."""
+        decision, fixes = ControlDecision.from_dict(data)
+        problems = (errors or []) + [f for f in fixes if f not in (errors or [])]
+        if problems:
+            self.log({"type": "protocol_warning", "turn": self.turn_count, "errors": problems})
+            if self.debug:
+                print(f"⚠️  Control JSON has schema problems: {'; '.join(problems)}")
+        return decision.to_dict() if decision is not None else None
 
-        if self.debug:
-            print(f"⚠️  No valid JSON found. Response preview: {worker_output[:200]}...")
+    def _parse_control_protocol(self, worker_output: str) -> Optional[Dict[str, Any]]:
+        """The response's control object, normalized; None when it has no usable one."""
+        # One linear pass over the response; the last schema-valid object wins
+        data, errors = extract_control(worker_output)
+        if data is None:
+            return None
+        return self._normalize_control(data, errors)
+
+    @staticmethod
+    def _peek_decision(worker_output: str) -> Optional[str]:
+        """Decision of a reply whose control JSON is cut off or malformed, before any recovery."""
+        control, _ = repair_control(worker_output)
+        return control.get("decision") if control else None
+
+    async def _recover_control(self, worker_output: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Salvage a reply without a usable control object instead of spending a
+        turn on it: finish a truncated reply with small continuation requests,
+        then repair what is left (unterminated strings/brackets, escaped
+        structure). Returns the possibly extended reply and the control object.
+        """
+        text = worker_output
+        writer = self.turn_worker  # continuations go to the model that wrote the reply
+        attempts = self.max_continuations if getattr(writer, "can_continue", True) else 0
+        for attempt in range(1, attempts + 1):
+            cut_off = getattr(writer, "last_stop_reason", None) == "max_tokens"
+            if not (cut_off or is_truncated(text)):
+                break
+            continuation = await asyncio.to_thread(
+                writer.continue_response, self.conversation, self.turn_count, text,
+                self.stable_context, self.continuation_tokens,
+            )
+            self.log({"type": "continuation", "turn": self.turn_count, "attempt": attempt,
+                      "model": getattr(writer, "model", None), "chars": len(continuation), "output": continuation})
+            self._log_usage()
+            if not continuation:
+                break
+            text = text.rstrip() + continuation
+            control = self._parse_control_protocol(text)
+            if control is not None:
+                if self.debug:
+                    print(f"🧩 Control JSON completed by continuation {attempt}")
+                return text, control
+
+        control, notes = repair_control(text)
+        if control is not None:
+            control["repaired"] = notes
+            self.log({"type": "protocol_repair", "turn": self.turn_count, "notes": notes})
+            if self.debug:
+                print(f"🩹 Control JSON repaired: {'; '.join(notes)}")
+        return text, control
 
+    def _fallback_control(self, worker_output: str) -> Dict[str, Any]:
         # Last resort fallback - only if absolutely no JSON found
         if self.debug:
             print(f"⚠️  No valid JSON found. Using minimal fallback...")
@@ -273,7 +599,7 @@ Rules:
 
     # -------------------- Decision executor --------------------
 
-    def _execute_decision(self, control_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _execute_decision(self, control_data: Dict[str, Any]) -> Dict[str, Any]:
         decision = control_data.get("decision")
         commands = control_data.get("commands", [])
         if self.debug:
@@ -281,27 +607,36 @@ Rules:
         result: Dict[str, Any] = {"decision": decision, "outputs": []}
 
         try:
+            with self.tracer.span("search"):
+                search_res = await self._handle_search_commands(commands)
+            if search_res:
+                result.update(search_res)
+
             if decision in ["EDIT", "MIGRATE"]:
-                edit_res = self._handle_edit_commands(commands)
+                with self.tracer.span("edits.apply", commands=len(commands)):
+                    edit_res = await self._handle_edit_commands(commands)
                 result.update(edit_res)
                 if edit_res.get("files_created"):
                     self.progress_made = True
 
             if decision in ["EXECUTE", "TEST", "MIGRATE"]:
-                exec_res = self._handle_execute_commands(commands)
+                with self.tracer.span("commands.run", commands=len(commands)):
+                    exec_res = await self._handle_execute_commands(commands)
                 result.update(exec_res)
                 if any(r.get("success") for r in exec_res.get("results", [])):
                     self.progress_made = True
 
             if decision == "PR":
-                pr_res = self._handle_pr_creation(control_data)
+                with self.tracer.span("git.pr"):
+                    pr_res = await self._handle_pr_creation(control_data)
                 result.update(pr_res)
                 if pr_res.get("success"):
                     self.progress_made = True
 
             commit_data = control_data.get("commit")
             if commit_data:
-                commit_res = self._handle_commit(commit_data)
+                with self.tracer.span("git.commit"):
+                    commit_res = await self._handle_commit(commit_data)
                 result.update(commit_res)
                 if commit_res.get("success"):
                     self.progress_made = True
@@ -343,8 +678,34 @@ Rules:
 
     # -------------------- Handlers --------------------
 
-    def _handle_edit_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _handle_edit_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply the decision's `write` commands as one WriteBatch: every write is
+        staged first and the batch is renamed into place together, so a crash
+        mid-turn leaves either all of this turn's files or none of them.
+        """
         results = []
+        if not any("write" in cmd for cmd in commands):
+            return {"success": True, "results": results, "files_created": 0}
+        self.repo.begin_batch(str(self.journal_dir))
+        try:
+            await self._stage_writes(commands, results)
+            await asyncio.to_thread(self.repo.commit_batch)
+        except Exception as e:
+            await asyncio.to_thread(self.repo.rollback_batch)
+            for r in results:
+                if r.get("success"):
+                    r.update({"success": False, "error": f"Write batch rolled back: {e}"})
+        finally:
+            # A cancelled turn (CancelledError is not an Exception) must not leave
+            # the batch open on a repo the next run reuses; no-op once committed
+            self.repo.rollback_batch()
+        for r in results:
+            if r.get("success") and r["path"] not in self.files_changed:
+                self.files_changed.append(r["path"])
+        return {"success": True, "results": results, "files_created": len([r for r in results if r.get("success")])}
+
+    async def _stage_writes(self, commands: List[Dict[str, Any]], results: List[Dict[str, Any]]):
         for cmd in commands:
             if "write" in cmd:
                 write = cmd["write"]
@@ -359,73 +720,114 @@ Rules:
                     continue
 
                 try:
-                    Path(path).parent.mkdir(parents=True, exist_ok=True)
-                    content = write.get("patch") or write.get("content") or "// Auto-generated by agent"
-                    write_result = self.repo.write_file(path, content)
+                    if write.get("edits"):
+                        write_result = await asyncio.to_thread(self.repo.apply_edits, path, write["edits"])
+                    elif write.get("patch"):
+                        write_result = await asyncio.to_thread(self.repo.apply_patch, path, write["patch"])
+                    else:
+                        content = write.get("content") or "// Auto-generated by agent"
+                        write_result = await self.repo.awrite_file(path, content)
                     if self.debug:
-                        print(f"✅ File written: {write_result}")
+                        print(f"✅ File staged: {write_result}")
                     results.append({"command": cmd, "success": True, "result": write_result, "file_created": True, "path": path})
                 except Exception as e:
                     if self.debug:
                         print(f"❌ File write error: {e}")
                     results.append({"command": cmd, "success": False, "error": str(e), "path": path})
-        return {"success": True, "results": results, "files_created": len([r for r in results if r.get("success")])}
 
-    def _handle_execute_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _handle_execute_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run the decision's `run` commands. Consecutive commands flagged
+        `"independent": true` are run concurrently (bounded by
+        max_parallel_commands); any other command is a barrier and runs on its
+        own. Results are returned in the original command order.
+        """
         if self.debug:
             print(f"🐛 DEBUG: _handle_execute_commands called with {len(commands)} commands")
             for i, cmd in enumerate(commands):
                 print(f"🐛 DEBUG: Command {i}: {cmd}")
-        results = []
+        results: List[Dict[str, Any]] = []
+        batch: List[Tuple[int, str]] = []
         for cmd in commands:
-            if self.debug:
-                print(f"🐛 DEBUG: Processing command: {cmd}")
-            if "run" in cmd:
-                command = cmd["run"]
-                if self.debug:
-                    print(f"🐛 DEBUG: Extracted command string: '{command}'")
-                is_allowed = self._is_allowed_command(command)
-                if self.debug:
-                    print(f"🐛 DEBUG: _is_allowed_command('{command}') returned: {is_allowed}")
-                if is_allowed:
-                    if self.debug:
-                        print(f"🐛 DEBUG: About to call self.executor.run_command('{command}')")
-                    try:
-                        exec_result = self.executor.run_command(command)
-                        if self.debug:
-                            print(f"🐛 DEBUG: executor.run_command returned: {exec_result}")
-                        results.append({
-                            "command": command,
-                            "success": exec_result["returncode"] == 0,
-                            "stdout": exec_result["stdout"],
-                            "stderr": exec_result["stderr"],
-                            "returncode": exec_result["returncode"]
-                        })
-                    except Exception as e:
-                        if self.debug:
-                            print(f"🐛 DEBUG: Exception calling executor: {e}")
-                        results.append({"command": command, "success": False, "error": str(e)})
-                else:
-                    if self.debug:
-                        print(f"🐛 DEBUG: Command rejected by orchestrator validation")
-                    results.append({"command": command, "success": False, "error": f"Command not allowed: {command}"})
-            else:
+            if "run" not in cmd:
                 if self.debug:
                     print(f"🐛 DEBUG: Command missing 'run' key: {cmd}")
+                continue
+            command = cmd["run"]
+            is_allowed = self._is_allowed_command(command)
+            if self.debug:
+                print(f"🐛 DEBUG: _is_allowed_command('{command}') returned: {is_allowed}")
+            if not is_allowed:
+                results.append({"command": command, "success": False, "error": f"Command not allowed: {command}"})
+                continue
+
+            results.append({"command": command})  # placeholder, filled in when its batch runs
+            if not cmd.get("independent"):
+                await self._run_command_batch(batch, results)
+            batch.append((len(results) - 1, command))
+            if not cmd.get("independent"):
+                await self._run_command_batch(batch, results)
+        await self._run_command_batch(batch, results)
+
         if self.debug:
             print(f"🐛 DEBUG: _handle_execute_commands returning {len(results)} results")
         return {"success": True, "results": results}
 
-    def _handle_pr_creation(self, control_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _run_command_batch(self, batch: List[Tuple[int, str]], results: List[Dict[str, Any]]):
+        """Execute queued commands (concurrently when more than one) and fill their result slots."""
+        if not batch:
+            return
+        if self.debug and len(batch) > 1:
+            print(f"⚡ Running {len(batch)} independent commands in parallel")
+        try:
+            outputs = await self.executor.arun_commands([c for _, c in batch], max_workers=self.max_parallel_commands)
+        except Exception as e:
+            outputs = [e] * len(batch)
+        for (slot, command), exec_result in zip(batch, outputs):
+            if isinstance(exec_result, Exception):
+                results[slot] = {"command": command, "success": False, "error": str(exec_result)}
+            else:
+                results[slot] = {
+                    "command": command,
+                    "success": exec_result["returncode"] == 0,
+                    "stdout": exec_result["stdout"],
+                    "stderr": exec_result["stderr"],
+                    "returncode": exec_result["returncode"]
+                }
+        batch.clear()
+
+    async def _handle_search_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Answer `search`/`symbols` commands from the local index (no subprocess, no grep dump)."""
+        queries = [c for c in commands if isinstance(c, dict) and ("search" in c or "symbols" in c)]
+        if not queries:
+            return {}
+        return await asyncio.to_thread(self._run_searches, queries)
+
+    def _run_searches(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.repo.index.refresh()
+        search = self._search_index()
+        searches = []
+        for q in queries:
+            if "search" in q:
+                hits = search.search(str(q["search"]), path_prefix=q.get("path") or "")
+                searches.append({"search": q["search"], "hits": hits})
+            else:
+                hits = search.symbols(str(q["symbols"]), kind=q.get("kind"))
+                searches.append({"symbols": q["symbols"], "hits": hits})
+            if self.debug:
+                print(f"🔎 {searches[-1].get('search') or searches[-1].get('symbols')}: {len(hits)} hits")
+        return {"success": True, "searches": searches}
+
+    async def _handle_pr_creation(self, control_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             pr = control_data.get("pr", {})
             title = pr.get("title", "Automated changes by agent")
             body = pr.get("body", "Changes made by autonomous coding agent")
-            return self.git.create_pr(title, body)
+            return await self.git.acreate_pr(title, body)
         except Exception as e:
             return {"success": False, "error": f"PR creation failed: {str(e)}"}
 
-    def _handle_commit(self, commit_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_commit(self, commit_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             message = commit_data.get("message", "Automated commit")
             files = commit_data.get("files", [])
@@ -436,16 +838,20 @@ Rules:
                 if not f:
                     continue
                 p = self._normalize_path(f)
-                if Path(p).exists():
+                if (self.root / p).exists():
                     norm_existing.append(p)
 
             # If nothing exists yet but GitOps supports commit_all, use it only when progress was made
             if not norm_existing:
                 if hasattr(self.git, "commit_all") and self.progress_made:
-                    return self.git.commit_all(message)
-                return {"success": False, "error": "No valid files to commit"}
-
-            return self.git.commit_changes(message, norm_existing)
+                    res = await asyncio.to_thread(self.git.commit_all, message)
+                else:
+                    return {"success": False, "error": "No valid files to commit"}
+            else:
+                res = await self.git.acommit_changes(message, norm_existing)
+            if res.get("success"):
+                self.commits.append(message)
+            return res
         except Exception as e:
             return {"success": False, "error": f"Commit failed: {str(e)}"}
 
@@ -457,8 +863,8 @@ Rules:
             if re.search(pat, file_path):
                 return False
         try:
-            resolved = Path(file_path).resolve()
-            root = Path(".").resolve()
+            resolved = (self.root / file_path).resolve()
+            root = self.root
             return root in resolved.parents or resolved == root or resolved.parent == root
         except Exception:
             return False
@@ -489,6 +895,21 @@ Rules:
             self.last_diffs.pop(0)
         return False
 
+    def _summarize_decision(self, control_data: Dict[str, Any]) -> str:
+        """Compact stand-in for an old assistant reply when the context budget is tight."""
+        commands = control_data.get("commands") or []
+        summary = {
+            "decision": control_data.get("decision"),
+            "reason": control_data.get("reason"),
+            "plan": control_data.get("plan"),
+            "wrote": [c["write"].get("path") for c in commands if isinstance(c, dict) and isinstance(c.get("write"), dict)],
+            "ran": [c["run"] for c in commands if isinstance(c, dict) and "run" in c],
+            "searched": [c.get("search") or c.get("symbols") for c in commands
+                         if isinstance(c, dict) and ("search" in c or "symbols" in c)],
+        }
+        summary = {k: v for k, v in summary.items() if v}
+        return f"[Turn {self.turn_count} reply, summarized]\n{json.dumps(summary)}"
+
     def _format_result_context(self, result: Dict[str, Any]) -> str:
         parts = [f"## Execution Result - Turn {self.turn_count}"]
         parts.append("✅ Success" if result.get("success") else "❌ Failed")
@@ -496,8 +917,20 @@ Rules:
             parts.append(f"Error: {result['error']}")
         if result.get("results"):
             for r in result["results"]:
+                if r.get("error"):
+                    parts.append(f"ERROR ({r.get('path') or r.get('command')}): {r['error'][:500]}")
                 if r.get("stdout"):
                     parts.append(f"STDOUT: {r['stdout'][:500]}")
                 if r.get("stderr"):
                     parts.append(f"STDERR: {r['stderr'][:500]}")
+        for s in result.get("searches", []):
+            if "search" in s:
+                parts.append(f"SEARCH \"{s['search']}\": {len(s['hits'])} files")
+                for hit in s["hits"]:
+                    for snip in hit["snippets"]:
+                        parts.append(f"  {hit['path']}:{snip['line']}  {snip['text']}")
+            else:
+                parts.append(f"SYMBOLS \"{s['symbols']}\": {len(s['hits'])} matches")
+                for hit in s["hits"]:
+                    parts.append(f"  {hit['path']}:{hit['line']}  {hit['kind']} {hit['name']}")
         return "\n".join(parts)
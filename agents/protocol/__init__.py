@@ -0,0 +1,3 @@
+from .extract import DECISIONS, JSONObjectScanner, extract_control, object_spans, scan_objects, validate_control
+from .decision import ControlDecision
+from .repair import repair_control, repair_json, is_truncated
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from .extract import DECISIONS, command_error
+
+
+class ControlDecision:
+    """
+    A normalized control-protocol object.
+
+    `from_dict` fills defaults (empty reason/commands/hint), drops commands and
+    commit/pr blocks that do not fit the schema, and reports what it changed,
+    so the executor only ever sees well-formed decisions. Keys outside the
+    schema are kept in `extra` and survive `to_dict()`.
+    """
+
+    __slots__ = ("decision", "reason", "commands", "commit", "pr", "next_hint", "plan", "extra")
+
+    def __init__(self, decision: str, reason: str = "", commands: Optional[List[Dict[str, Any]]] = None,
+                 commit: Optional[Dict[str, Any]] = None, pr: Optional[Dict[str, Any]] = None,
+                 next_hint: str = "", plan: Optional[List[Any]] = None, extra: Optional[Dict[str, Any]] = None):
+        self.decision = decision
+        self.reason = reason
+        self.commands = commands if commands is not None else []
+        self.commit = commit
+        self.pr = pr
+        self.next_hint = next_hint
+        self.plan = plan
+        self.extra = extra or {}
+
+    @classmethod
+    def from_dict(cls, data: Any) -> Tuple[Optional["ControlDecision"], List[str]]:
+        """(decision, fixes applied); (None, [why]) when there is no usable decision."""
+        if not isinstance(data, dict):
+            return None, ["not an object"]
+        decision = data.get("decision")
+        if isinstance(decision, str) and decision.strip().upper() in DECISIONS:
+            decision = decision.strip().upper()
+        if decision not in DECISIONS:
+            return None, [f"unknown decision {decision!r}"]
+
+        fixes: List[str] = []
+        commands = data.get("commands")
+        if commands is None:
+            commands = []
+        elif isinstance(commands, dict):
+            commands = [commands]
+            fixes.append("commands wrapped in a list")
+        elif not isinstance(commands, list):
+            fixes.append("commands dropped (not a list)")
+            commands = []
+        kept = []
+        for i, cmd in enumerate(commands):
+            error = command_error(cmd)
+            if error:
+                fixes.append(f"commands[{i}] dropped:{error}")
+            else:
+                kept.append(cmd)
+
+        commit = data.get("commit")
+        if commit is not None and not (isinstance(commit, dict) and isinstance(commit.get("message"), str)):
+            fixes.append("commit dropped (needs a message)")
+            commit = None
+        if commit is not None and not isinstance(commit.get("files", []), list):
+            commit = {**commit, "files": []}
+            fixes.append("commit.files reset (not a list)")
+        pr = data.get("pr")
+        if pr is not None and not (isinstance(pr, dict) and isinstance(pr.get("title"), str)):
+            fixes.append("pr dropped (needs a title)")
+            pr = None
+
+        reason = data.get("reason")
+        plan = data.get("plan")
+        known = set(cls.__slots__)
+        return cls(
+            decision=decision,
+            reason=reason if isinstance(reason, str) else ("" if reason is None else str(reason)),
+            commands=kept,
+            commit=commit,
+            pr=pr,
+            next_hint=data.get("next_hint") if isinstance(data.get("next_hint"), str) else "",
+            plan=plan if isinstance(plan, list) else None,
+            extra={k: v for k, v in data.items() if k not in known},
+        ), fixes
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"decision": self.decision, "reason": self.reason, "commands": self.commands}
+        if self.commit is not None:
+            out["commit"] = self.commit
+        if self.pr is not None:
+            out["pr"] = self.pr
+        if self.next_hint:
+            out["next_hint"] = self.next_hint
+        if self.plan is not None:
+            out["plan"] = self.plan
+        out.update(self.extra)
+        return out
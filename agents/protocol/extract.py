@@ -0,0 +1,198 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+DECISIONS = frozenset({"PLAN", "EDIT", "EXECUTE", "TEST", "MIGRATE", "DOCS", "PR", "STOP", "RETRY"})
+
+_COMMAND_KEYS = ("run", "write", "search", "symbols")
+
+_SPECIAL = re.compile(r'[{}"\\]')  # the only characters the scanner acts on
+_WHITESPACE = " \t\r\n"
+
+
+def object_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    (start, end) of every balanced, outermost {...} in `text`, in one pass.
+
+    Braces inside JSON strings (with escapes) are ignored. Outside an object
+    a "{" only opens one when it is followed by a key or "}", so braces in
+    prose or code ("import { x }") do not start string tracking. An opening
+    brace that never closes (a truncated object) does not hide complete
+    objects after it: every object that closes is recorded and the spans it
+    encloses are dropped, so the result is the maximal closed objects. The scan
+    jumps between brace/quote/backslash characters (one regex pass) and each
+    span is pushed and popped at most once.
+    """
+    return scan_objects(text)[0]
+
+
+def scan_objects(text: str) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """object_spans() plus the starts of objects still open at the end (truncated output)."""
+    spans: List[Tuple[int, int]] = []
+    opens: List[int] = []
+    in_string = False
+    escaped_at = -1  # index of the character a backslash escapes
+    for m in _SPECIAL.finditer(text):
+        i, ch = m.start(), m.group()
+        if in_string:
+            if i == escaped_at:
+                continue
+            if ch == "\\":
+                escaped_at = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == "{":
+            if opens or _starts_object(text, i):
+                opens.append(i)
+        elif ch == "}":
+            if not opens:
+                continue
+            start = opens.pop()
+            while spans and spans[-1][0] > start:
+                spans.pop()  # nested inside this one
+            spans.append((start, i + 1))
+        elif ch == '"' and opens:
+            in_string = True
+    return spans, opens
+
+
+def _starts_object(text: str, i: int) -> bool:
+    j = i + 1
+    while j < len(text) and text[j] in _WHITESPACE:
+        j += 1
+    return j < len(text) and text[j] in '"}'
+
+
+class JSONObjectScanner:
+    """
+    Incremental scan_objects() for streamed responses.
+
+    Feed it chunks as they arrive; each call returns the raw text of every
+    outermost object that closed in that chunk. The rules are those of
+    scan_objects: outside an object a "{" only opens one when the next
+    non-space character is '"' or "}" (decided once that character arrives,
+    possibly in a later chunk), and quotes, escapes and braces are only
+    tracked inside an object.
+    """
+
+    def __init__(self):
+        self._buf: List[str] = []  # text of the object being read, from its "{"
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._pending = False  # a top-level "{" waiting for its next non-space character
+
+    def feed(self, chunk: str) -> List[str]:
+        found = []
+        for ch in chunk:
+            if self._pending:
+                if ch in _WHITESPACE:
+                    self._buf.append(ch)
+                    continue
+                self._pending = False
+                if ch in '"}':
+                    self._depth = 1
+                else:
+                    self._buf = []
+            if self._depth == 0:
+                if ch == "{":
+                    self._pending = True
+                    self._buf = [ch]
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    found.append("".join(self._buf))
+                    self._buf = []
+        return found
+
+    def reset(self):
+        self.__init__()
+
+
+def validate_control(data: Any) -> List[str]:
+    """Schema problems with a control object; [] when it is well-formed."""
+    if not isinstance(data, dict):
+        return ["not an object"]
+    errors = []
+    if data.get("decision") not in DECISIONS:
+        errors.append(f"decision must be one of {'|'.join(sorted(DECISIONS))}")
+    if "reason" in data and not isinstance(data["reason"], str):
+        errors.append("reason must be a string")
+
+    commands = data.get("commands", [])
+    if not isinstance(commands, list):
+        errors.append("commands must be a list")
+        commands = []
+    for i, cmd in enumerate(commands):
+        error = command_error(cmd)
+        if error:
+            errors.append(f"commands[{i}]{error}")
+
+    commit = data.get("commit")
+    if commit is not None:
+        if not isinstance(commit, dict) or not isinstance(commit.get("message"), str):
+            errors.append("commit needs a message")
+        elif not isinstance(commit.get("files", []), list):
+            errors.append("commit.files must be a list")
+    pr = data.get("pr")
+    if pr is not None and (not isinstance(pr, dict) or not isinstance(pr.get("title"), str)):
+        errors.append("pr needs a title")
+    return errors
+
+
+def command_error(cmd: Any) -> Optional[str]:
+    """What is wrong with one entry of "commands" (suffix of a message), or None."""
+    kinds = [k for k in _COMMAND_KEYS if isinstance(cmd, dict) and k in cmd]
+    if len(kinds) != 1:
+        return f" needs exactly one of {', '.join(_COMMAND_KEYS)}"
+    kind = kinds[0]
+    if kind == "write":
+        write = cmd["write"]
+        if not isinstance(write, dict) or not isinstance(write.get("path"), str):
+            return ".write needs a path"
+        if not any(k in write for k in ("content", "patch", "edits")):
+            return ".write needs content, patch or edits"
+    elif not isinstance(cmd[kind], str):
+        return f".{kind} must be a string"
+    return None
+
+
+def extract_control(text: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    The control object in a model response and its schema problems.
+
+    Candidates are tried from the end of the response, where the protocol puts
+    the control JSON, so examples quoted earlier in the prose lose to it. The
+    last object that passes `validate_control` wins; failing that, the last one
+    with a known decision is returned with its errors. (None, []) when the
+    response holds no object with a decision.
+    """
+    fallback: Optional[Tuple[Dict[str, Any], List[str]]] = None
+    for start, end in reversed(object_spans(text)):
+        raw = text[start:end]
+        if '"decision"' not in raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        errors = validate_control(data)
+        if not errors:
+            return data, []
+        if fallback is None and isinstance(data, dict) and data.get("decision") in DECISIONS:
+            fallback = (data, errors)
+    return fallback if fallback is not None else (None, [])
@@ -0,0 +1,144 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from .decision import ControlDecision
+from .extract import scan_objects
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(fragment: str) -> Tuple[Optional[Any], List[str]]:
+    """
+    Parse an almost-valid JSON object, fixing what models typically get wrong.
+
+    - `\\n`/`\\t` escapes written between tokens (JSON double-escaped in
+      structure) become whitespace; raw newlines inside strings are escaped.
+    - Trailing commas before "}"/"]" are removed.
+    - If the text ends early (max_tokens), the member or element that was being
+      written when it stopped is dropped rather than closed, so a cut-off
+      string such as a half-written file never survives; then every open
+      bracket is closed.
+
+    Returns (value, notes) or (None, notes) if it still does not parse.
+    """
+    out: List[str] = []
+    stack: List[str] = []  # expected closers
+    safe: List[int] = []  # per open bracket: len(out) after its opener or its last complete member
+    notes: List[str] = []
+    in_string = escape = False
+    i, n = 0, len(fragment)
+    while i < n:
+        ch = fragment[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+                _note(notes, "escaped raw newlines in strings")
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+            safe.append(len(out))
+        elif ch in "}]":
+            if not stack:
+                break
+            if _drop_trailing_comma(out):
+                _note(notes, "removed trailing commas")
+            if ch != stack[-1]:
+                _note(notes, "fixed mismatched brackets")
+            out.append(stack.pop())
+            safe.pop()
+            if not stack:
+                break  # the object is complete
+        elif ch == ",":
+            if safe:
+                safe[-1] = len(out)
+            out.append(ch)
+        elif ch == "\\" and i + 1 < n and fragment[i + 1] in "nrt":
+            out.append(" ")
+            _note(notes, "unescaped structural \\n")
+            i += 2
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if not stack:
+        try:
+            return json.loads("".join(out)), notes
+        except json.JSONDecodeError:
+            return None, notes
+
+    _note(notes, "truncated output closed")
+    if in_string:
+        del out[safe[-1]:]  # the member being written was cut off
+        _note(notes, "dropped the cut-off value")
+    # Close everything; if the tail still does not parse, drop the last
+    # member at the innermost level that has one and try again.
+    for level in range(len(stack), -1, -1):
+        candidate = list(out)
+        _drop_trailing_comma(candidate)
+        text = "".join(candidate) + "".join(reversed(stack))
+        try:
+            return json.loads(text), notes
+        except json.JSONDecodeError:
+            if level == 0:
+                break
+            del out[safe[level - 1]:]
+            del stack[level:]
+            del safe[level:]
+            _note(notes, "dropped the cut-off value")
+    return None, notes
+
+
+def repair_control(text: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Recover a control object from a response extract_control() rejected:
+    a closed object that is not valid JSON, or one left open by truncation.
+    Candidates are tried from the end. Returns (normalized dict, notes).
+    """
+    spans, opens = scan_objects(text)
+    candidates = [(start, end) for start, end in spans]
+    if opens:
+        candidates.append((opens[0], len(text)))
+    for start, end in sorted(candidates, reverse=True):
+        fragment = text[start:end]
+        if '"decision"' not in fragment:
+            continue
+        data, notes = repair_json(fragment)
+        decision, fixes = ControlDecision.from_dict(data)
+        if decision is not None:
+            return decision.to_dict(), notes + fixes
+    return None, []
+
+
+def is_truncated(text: str) -> bool:
+    """True when the response ends inside a control object (hit max_tokens)."""
+    _, opens = scan_objects(text)
+    return bool(opens) and '"decision"' in text[opens[0]:]
+
+
+def _drop_trailing_comma(out: List[str]) -> bool:
+    j = len(out) - 1
+    while j >= 0 and out[j] in (" ", "\t", "\r", "\n"):
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+        return True
+    return False
+
+
+def _note(notes: List[str], note: str):
+    if note not in notes:
+        notes.append(note)
@@ -0,0 +1,4 @@
+from .sink import RunLogSink, BlobStore
+from .reader import run_files, iter_records, iter_run, resolve_blobs
+from .analytics import RunAnalytics, summarize_run
+from .timing import Tracer
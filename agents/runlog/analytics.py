@@ -0,0 +1,261 @@
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from .reader import iter_run, run_files
+
+INDEX_NAME = ".analytics_index.json"
+INDEX_VERSION = 5
+
+# Columns of the per-run table/CSV, in order.
+RUN_COLUMNS = [
+    "run_id", "started", "success", "turns", "retries", "fallback_plans", "repairs", "continuations", "escalations", "stuck",
+    "errors", "edits", "executes", "plans", "stops", "p50_turn_s", "p95_turn_s", "duration_s",
+    "input_tokens", "output_tokens", "cache_read_tokens", "reason",
+]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return round(ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo), 3)
+
+
+def summarize_run(run_id: str, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """One pass over a run's records; nothing but counters is kept in memory."""
+    decisions: Counter = Counter()
+    s: Dict[str, Any] = {
+        "run_id": run_id, "started": None, "success": None, "turns": 0, "retries": 0,
+        "fallback_plans": 0, "repairs": 0, "continuations": 0, "escalations": 0, "stuck": False, "errors": 0, "reason": None,
+        "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0,
+    }
+    turn_times: List[float] = []
+    timed_turns: List[float] = []  # `turn_timing` totals, preferred over turn_start gaps when present
+    time_split: Counter = Counter()
+    models: Dict[str, Dict[str, float]] = {}  # model -> calls, total_s
+    first_ts = last_ts = turn_ts = None
+    last_error = last_stop = None
+
+    for r in records:
+        kind = r.get("type")
+        ts = r.get("ts")
+        if ts is not None:
+            first_ts = ts if first_ts is None else first_ts
+            last_ts = ts
+        if kind == "start":
+            s["started"] = s["started"] or r.get("timestamp")
+        elif kind == "turn_start":
+            s["turns"] = max(s["turns"], r.get("turn") or 0)
+            if ts is not None and turn_ts is not None:
+                turn_times.append(ts - turn_ts)
+            turn_ts = ts
+        elif kind == "control_decision":
+            control = r.get("control") or {}
+            decision = control.get("decision") or "NONE"
+            decisions[decision] += 1
+            if decision == "RETRY":
+                s["retries"] += 1
+            if control.get("reason") == "Fallback - no valid JSON found":
+                s["fallback_plans"] += 1
+            if decision == "STOP":
+                last_stop = control.get("reason")
+        elif kind == "model_retry":  # retried within the turn (older logs: RETRY decisions above)
+            s["retries"] += 1
+        elif kind == "protocol_repair":
+            s["repairs"] += 1
+        elif kind == "continuation":
+            s["continuations"] += 1
+        elif kind == "model_turn":
+            m = models.setdefault(str(r.get("model")), {"calls": 0, "total_s": 0.0})
+            m["calls"] += 1
+            m["total_s"] = round(m["total_s"] + (r.get("latency_s") or 0.0), 3)
+        elif kind == "model_escalation":
+            s["escalations"] += 1
+        elif kind == "turn_timing":
+            timed_turns.append(r.get("total_s") or 0.0)
+            time_split.update(r.get("spans_s") or {})
+            time_split["other"] += r.get("other_s") or 0.0
+        elif kind == "usage":
+            s["input_tokens"] += r.get("input_tokens") or 0
+            s["output_tokens"] += r.get("output_tokens") or 0
+            s["cache_read_tokens"] += r.get("cache_read_input_tokens") or 0
+        elif kind == "error":
+            s["errors"] += 1
+            last_error = r.get("error")
+        elif kind == "end":
+            s["success"] = r.get("success")
+            s["reason"] = r.get("reason")
+
+    s["reason"] = s["reason"] or last_error or last_stop
+    if isinstance(s["reason"], dict):  # an externalized blob reference
+        s["reason"] = "<blob>"
+    s["stuck"] = bool(s["reason"]) and "stuck" in str(s["reason"]).lower()
+    s["decisions"] = dict(decisions)
+    s["edits"] = decisions["EDIT"] + decisions["MIGRATE"]
+    s["executes"] = decisions["EXECUTE"] + decisions["TEST"]
+    s["plans"] = decisions["PLAN"]
+    s["stops"] = decisions["STOP"]
+    turn_times = timed_turns or turn_times
+    s["time_split"] = {k: round(v, 3) for k, v in time_split.most_common()}
+    s["models"] = models
+    s["turn_times"] = [round(t, 3) for t in turn_times]
+    s["p50_turn_s"] = percentile(turn_times, 50)
+    s["p95_turn_s"] = percentile(turn_times, 95)
+    s["duration_s"] = round(last_ts - first_ts, 3) if first_ts is not None and last_ts != first_ts else None
+    return s
+
+
+class RunAnalytics:
+    """
+    Per-run and cross-run metrics over every run log in `runs_dir`.
+
+    Logs are streamed record by record (see runlog.reader). Per-run summaries
+    are cached in `<runs_dir>/.analytics_index.json` keyed by the size and
+    mtime of each run's files, so repeated queries only read new or grown logs.
+    """
+
+    def __init__(self, runs_dir: str = "runs"):
+        self.runs_dir = Path(runs_dir)
+        self.index_path = self.runs_dir / INDEX_NAME
+        self.refreshed = 0  # runs (re)read by the last summaries() call
+
+    def summaries(self, run_filter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        index = self._load_index()
+        fresh: Dict[str, Any] = {}
+        self.refreshed = 0
+        for run_id, files in run_files(str(self.runs_dir)).items():
+            if run_filter and run_filter not in run_id:
+                continue
+            sig = [[f.name, st.st_size, st.st_mtime_ns] for f in files for st in [f.stat()]]
+            cached = index.get(run_id)
+            if cached and cached["sig"] == sig:
+                summary = cached["summary"]
+            else:
+                summary = summarize_run(run_id, iter_run(files))
+                self.refreshed += 1
+            fresh[run_id] = {"sig": sig, "summary": summary}
+            yield summary
+        if self.refreshed or set(fresh) != set(index):
+            if run_filter:
+                index.update(fresh)
+                fresh = index
+            self._save_index(fresh)
+
+    @staticmethod
+    def aggregate(summaries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        decisions: Counter = Counter()
+        reasons: Counter = Counter()
+        turn_times: List[float] = []
+        time_split: Counter = Counter()
+        models: Dict[str, Counter] = {}
+        totals = Counter()
+        for s in summaries:
+            totals["runs"] += 1
+            totals["succeeded"] += 1 if s["success"] else 0
+            totals["with_outcome"] += 0 if s["success"] is None else 1
+            for key in ("turns", "retries", "fallback_plans", "repairs", "continuations", "escalations", "errors",
+                        "input_tokens", "output_tokens",
+                        "cache_read_tokens"):
+                totals[key] += s[key] or 0
+            totals["stuck"] += 1 if s["stuck"] else 0
+            decisions.update(s["decisions"])
+            turn_times.extend(s["turn_times"])
+            time_split.update(s.get("time_split") or {})
+            for model, m in (s.get("models") or {}).items():
+                models.setdefault(model, Counter()).update(m)
+            if s["reason"] and not s["success"]:
+                reasons[str(s["reason"])[:80]] += 1
+        return {
+            **totals,
+            "decisions": dict(decisions.most_common()),
+            "turn_p50_s": percentile(turn_times, 50),
+            "turn_p95_s": percentile(turn_times, 95),
+            "turn_p99_s": percentile(turn_times, 99),
+            "time_split": {k: round(v, 3) for k, v in time_split.most_common()},
+            "models": {k: {"calls": v["calls"], "total_s": round(v["total_s"], 3)} for k, v in models.items()},
+            "failure_reasons": reasons.most_common(10),
+        }
+
+    # -------------------- Output --------------------
+
+    @staticmethod
+    def write_table(summaries: List[Dict[str, Any]], aggregate: Dict[str, Any], out: TextIO = sys.stdout):
+        columns = [c for c in RUN_COLUMNS if c not in ("started", "reason")] + ["reason"]
+        rows = [[_cell(s.get(c), 40 if c == "reason" else 20) for c in columns] for s in summaries]
+        widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+        out.write("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip() + "\n")
+        for r in rows:
+            out.write("  ".join(v.ljust(w) for v, w in zip(r, widths)).rstrip() + "\n")
+
+        a = aggregate
+        out.write("\n")
+        out.write(f"runs: {a.get('runs', 0)}  succeeded: {a.get('succeeded', 0)}/{a.get('with_outcome', 0)} "
+                  f"with an outcome  stuck: {a.get('stuck', 0)}\n")
+        out.write(f"turns: {a.get('turns', 0)}  retries: {a.get('retries', 0)}  "
+                  f"fallback PLANs: {a.get('fallback_plans', 0)}  errors: {a.get('errors', 0)}\n")
+        out.write(f"control JSON repaired in place: {a.get('repairs', 0)}  "
+                  f"truncated replies continued: {a.get('continuations', 0)}\n")
+        out.write(f"turn latency p50/p95/p99 (s): {a['turn_p50_s']} / {a['turn_p95_s']} / {a['turn_p99_s']}\n")
+        out.write(f"tokens in/out/cache-read: {a.get('input_tokens', 0)} / {a.get('output_tokens', 0)} / "
+                  f"{a.get('cache_read_tokens', 0)}\n")
+        if a.get("time_split"):
+            total = sum(a["time_split"].values()) or 1.0
+            out.write("time split: " + ", ".join(f"{k} {v:.1f}s ({v / total:.0%})"
+                                                  for k, v in a["time_split"].items()) + "\n")
+        if a.get("models"):
+            out.write("model calls: " + ", ".join(f"{k} {v['calls']} (mean {v['total_s'] / (v['calls'] or 1):.1f}s)"
+                                                   for k, v in a["models"].items())
+                      + f"  escalated to the strong model: {a.get('escalations', 0)}\n")
+        out.write("decisions: " + ", ".join(f"{k} {v}" for k, v in a["decisions"].items()) + "\n")
+        if a["failure_reasons"]:
+            out.write("top failure reasons:\n")
+            for reason, n in a["failure_reasons"]:
+                out.write(f"  {n:4d}  {reason}\n")
+
+    @staticmethod
+    def write_csv(summaries: List[Dict[str, Any]], out: TextIO = sys.stdout):
+        writer = csv.writer(out)
+        writer.writerow(RUN_COLUMNS)
+        for s in summaries:
+            writer.writerow(["" if s.get(c) is None else s.get(c) for c in RUN_COLUMNS])
+
+    @staticmethod
+    def write_parquet(summaries: List[Dict[str, Any]], path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output needs the 'pyarrow' package (or use --format csv)")
+        table = pa.Table.from_pylist([{c: s.get(c) for c in RUN_COLUMNS} for s in summaries])
+        pq.write_table(table, path)
+
+    # -------------------- Index --------------------
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data.get("runs", {}) if data.get("version") == INDEX_VERSION else {}
+
+    def _save_index(self, runs: Dict[str, Any]):
+        tmp = self.index_path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "runs": runs}), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+
+def _cell(value: Any, width: int) -> str:
+    if value is None:
+        return "-"
+    text = str(value).replace("\n", " ")
+    return text if len(text) <= width else text[:width - 1] + "…"
@@ -0,0 +1,79 @@
+import gzip
+import io
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .sink import BlobStore, msgpack, orjson, zstandard
+
+_LOG_RE = re.compile(r"^(?P<run>.+?)(?:\.(?P<seg>\d+))?\.(?P<ext>jsonl|msgpack)(?P<comp>\.gz|\.zst)?$")
+
+
+def run_files(runs_dir: str) -> Dict[str, List[Path]]:
+    """
+    Map run_id -> its log files in write order: rotated segments, then the
+    compressed archive, then a still-open segment. Batch logs are skipped.
+    """
+    found: Dict[str, List[tuple]] = defaultdict(list)
+    for path in Path(runs_dir).iterdir():
+        m = _LOG_RE.match(path.name)
+        if not m or m.group("run").startswith("batch_"):
+            continue
+        if m.group("seg"):
+            order = (0, int(m.group("seg")))
+        elif m.group("comp"):
+            order = (1, 0)
+        else:
+            order = (2, 0)
+        found[m.group("run")].append((order, path))
+    return {run: [p for _, p in sorted(files)] for run, files in sorted(found.items())}
+
+
+def _open(path: Path):
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rb")  # reads concatenated members
+    if path.name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path.name} needs the 'zstandard' package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream the records of one log file; unparseable lines are skipped."""
+    path = Path(path)
+    with _open(path) as raw:
+        if ".msgpack" in path.name:
+            if msgpack is None:
+                raise RuntimeError(f"{path.name} needs the 'msgpack' package")
+            yield from msgpack.Unpacker(raw, raw=False)
+            return
+        for line in raw:
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line) if orjson is not None else json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+
+def iter_run(files: List[Path]) -> Iterator[Dict[str, Any]]:
+    for path in files:
+        yield from iter_records(path)
+
+
+def resolve_blobs(value: Any, blobs: BlobStore) -> Any:
+    """Replace {"$blob": ...} references with the stored text."""
+    if isinstance(value, dict):
+        if "$blob" in value and len(value) <= 2:
+            text: Optional[str] = blobs.get(value["$blob"])
+            return text if text is not None else value
+        return {k: resolve_blobs(v, blobs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_blobs(v, blobs) for v in value]
+    return value
@@ -0,0 +1,187 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _dumps_json(record: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+class BlobStore:
+    """
+    Content-addressed store for large log values under `<runs_dir>/blobs/`.
+
+    A value is saved once per distinct content (gzip-compressed, named by its
+    SHA-256), so the same error or tool output repeated across turns and runs
+    costs one file.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with gzip.open(tmp, "wb", compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            with gzip.open(self._path(digest), "rb") as f:
+                return f.read().decode("utf-8")
+        except OSError:
+            return None
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.gz"
+
+
+class RunLogSink:
+    """
+    Buffered writer for one run's event log.
+
+    - The file stays open with a large buffer; `flush()` is called at turn
+      boundaries and `close()` at the end of the run (and at interpreter exit).
+    - Records are JSON lines (orjson when installed) or, with
+      serializer="msgpack", a msgpack stream. Each gets a `ts` timestamp.
+    - String values longer than `blob_threshold` are moved to the BlobStore and
+      replaced by {"$blob": sha256, "len": n}.
+    - When the open segment passes `max_bytes`, and when the run is closed, the
+      segment is compressed (gzip, or zstd when installed and requested) and
+      appended to `<run_id>.<ext>.gz|.zst`. Compressed members concatenate, so
+      each run remains one readable file. With compress="none", full segments
+      are renamed to `<run_id>.<n>.<ext>` instead.
+    """
+
+    def __init__(self, runs_dir: str, run_id: str, serializer: str = "json", compress: str = "gzip",
+                 max_bytes: int = 8 * 1024 * 1024, blob_threshold: int = 1024,
+                 buffer_size: int = 256 * 1024):
+        self.runs_dir = Path(runs_dir)
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id
+        self.serializer = "msgpack" if serializer == "msgpack" and msgpack is not None else "json"
+        if compress == "zstd" and zstandard is None:
+            compress = "gzip"
+        self.compress = compress  # "gzip" | "zstd" | "none"
+        self.max_bytes = max_bytes
+        self.blob_threshold = blob_threshold
+        self.buffer_size = buffer_size
+        self.blobs = BlobStore(self.runs_dir / "blobs")
+
+        ext = "msgpack" if self.serializer == "msgpack" else "jsonl"
+        self.path = self.runs_dir / f"{run_id}.{ext}"
+        self._ext = ext
+        self._segments = len(list(self.runs_dir.glob(f"{run_id}.*[0-9].{ext}")))
+        self._written = self.path.stat().st_size if self.path.exists() else 0
+        self._packer = msgpack.Packer() if self.serializer == "msgpack" else None
+        self._lock = threading.Lock()
+        self._fh = open(self.path, "ab", buffering=self.buffer_size)
+        atexit.register(self.close)
+
+    def write(self, record: Dict[str, Any]):
+        record = {"ts": round(time.time(), 3), **record} if "ts" not in record else record
+        record = self._externalize(record)
+        data = self._packer.pack(record) if self._packer else _dumps_json(record)
+        with self._lock:
+            if self._fh is None:  # closed; late events still land on disk
+                self._fh = open(self.path, "ab", buffering=self.buffer_size)
+                atexit.register(self.close)
+            self._fh.write(data)
+            self._written += len(data)
+            if self._written >= self.max_bytes:
+                self._rotate()
+
+    def flush(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+
+    def close(self):
+        """Flush and compress the run's log. Safe to call more than once."""
+        with self._lock:
+            if self._fh is None:
+                return
+            self._fh.close()
+            self._fh = None
+            if not self._written:
+                self.path.unlink(missing_ok=True)
+            elif self.compress != "none":
+                self._archive()
+                self._written = 0
+        atexit.unregister(self.close)
+
+    @property
+    def archive_path(self) -> Path:
+        suffix = ".zst" if self.compress == "zstd" else ".gz"
+        return self.runs_dir / f"{self.run_id}.{self._ext}{suffix}"
+
+    @property
+    def current_path(self) -> Path:
+        """Where the run's log is now: the open segment, or the archive once closed."""
+        if self._fh is None and self.compress != "none" and self.archive_path.exists():
+            return self.archive_path
+        return self.path
+
+    # -------------------- Internals --------------------
+
+    def _externalize(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) > self.blob_threshold:
+                return {"$blob": self.blobs.put(value), "len": len(value)}
+            return value
+        if isinstance(value, dict):
+            return {k: self._externalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._externalize(v) for v in value]
+        return value
+
+    def _rotate(self):
+        self._fh.close()
+        if self.compress == "none":
+            self._segments += 1
+            os.replace(self.path, self.runs_dir / f"{self.run_id}.{self._segments}.{self._ext}")
+        else:
+            self._archive()
+        self._written = 0
+        self._fh = open(self.path, "ab", buffering=self.buffer_size)
+
+    def _archive(self):
+        """Append the open segment to the run's compressed archive and drop it."""
+        with open(self.path, "rb") as src:
+            if self.compress == "zstd":
+                with open(self.archive_path, "ab") as dst:
+                    zstandard.ZstdCompressor(level=6).copy_stream(src, dst)
+            else:
+                with gzip.open(self.archive_path, "ab", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst)
+        self.path.unlink()
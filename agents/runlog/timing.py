@@ -0,0 +1,179 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("runlog_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update({k: v for k, v in attrs.items() if v is not None})
+
+    @property
+    def duration_s(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+class Tracer:
+    """
+    Lightweight spans for one run.
+
+    `with tracer.span("model.generate", model=...) as sp:` times a block
+    (sync or async; the current span follows asyncio tasks and to_thread via
+    contextvars) and writes a `span` record to the run log. Per turn, the time
+    in each span name is totalled and `end_turn()` writes one `turn_timing`
+    record with the split (model, parse, edits, commands, git, ...) and the
+    turn's token usage.
+
+    With `otlp_endpoint` (default: $OTEL_EXPORTER_OTLP_ENDPOINT) finished spans
+    are also sent, in batches on `flush()`, to an OpenTelemetry collector over
+    OTLP/HTTP JSON. Export failures never affect the run.
+    """
+
+    def __init__(self, log, run_id: str, otlp_endpoint: Optional[str] = None, service_name: str = "claude-agent"):
+        self.log = log
+        self.run_id = run_id
+        self.trace_id = secrets.token_hex(16)
+        self.otlp_endpoint = otlp_endpoint or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+        self.service_name = service_name
+        self._pending: List[Span] = []
+        self._lock = threading.Lock()
+        self._turn: Optional[int] = None
+        self._turn_start: Optional[float] = None
+        self._turn_totals: Dict[str, float] = defaultdict(float)
+        self._turn_tokens: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        parent = _current_span.get()
+        sp = Span(name, parent.span_id if parent else None, {k: v for k, v in attrs.items() if v is not None})
+        token = _current_span.set(sp)
+        try:
+            yield sp
+        except BaseException as e:
+            sp.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            sp.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(sp)
+
+    def add_tokens(self, usage: Dict[str, Any]):
+        for key in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+            if isinstance(usage.get(key), int):
+                self._turn_tokens[key] += usage[key]
+
+    def begin_turn(self, turn: int):
+        self.end_turn()
+        self._turn = turn
+        self._turn_start = time.perf_counter()
+
+    def end_turn(self):
+        """Emit the finished turn's `turn_timing` record (no-op outside a turn)."""
+        if self._turn is None:
+            return
+        total = time.perf_counter() - self._turn_start
+        spans = {name: round(seconds, 4) for name, seconds in self._turn_totals.items()}
+        accounted = sum(self._turn_totals.values())
+        self.log({
+            "type": "turn_timing",
+            "turn": self._turn,
+            "total_s": round(total, 4),
+            "spans_s": spans,
+            "other_s": round(max(total - accounted, 0.0), 4),
+            **self._turn_tokens,
+        })
+        self._turn = self._turn_start = None
+        self._turn_totals.clear()
+        self._turn_tokens.clear()
+
+    def flush(self):
+        if not self.otlp_endpoint:
+            return
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._export(batch)
+
+    # -------------------- Internals --------------------
+
+    def _finish(self, sp: Span):
+        record = {
+            "type": "span",
+            "name": sp.name,
+            "turn": self._turn,
+            "span_id": sp.span_id,
+            "parent_id": sp.parent_id,
+            "duration_s": round(sp.duration_s, 4),
+            **({"attrs": sp.attrs} if sp.attrs else {}),
+            **({"error": sp.error} if sp.error else {}),
+        }
+        self.log(record)
+        if self._turn is not None and sp.parent_id is None:  # nested spans are already inside their parent
+            self._turn_totals[sp.name] += sp.duration_s
+        if self.otlp_endpoint:
+            with self._lock:
+                self._pending.append(sp)
+
+    def _export(self, spans: List[Span]):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attrs({"service.name": self.service_name, "agent.run_id": self.run_id})},
+            "scopeSpans": [{
+                "scope": {"name": "agents.runlog"},
+                "spans": [{
+                    "traceId": self.trace_id,
+                    "spanId": sp.span_id,
+                    **({"parentSpanId": sp.parent_id} if sp.parent_id else {}),
+                    "name": sp.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(sp.start_ns),
+                    "endTimeUnixNano": str(sp.end_ns),
+                    "attributes": _otlp_attrs(sp.attrs),
+                    "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+                } for sp in spans],
+            }],
+        }]}
+        request = urllib.request.Request(
+            self.otlp_endpoint.rstrip("/") + "/v1/traces",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=2).close()
+        except Exception as e:
+            self.log({"type": "otlp_export_failed", "spans": len(spans), "error": str(e)[:200]})
+            self.otlp_endpoint = None  # the collector is down; stop trying for this run
+
+
+def _otlp_attrs(attrs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            v = {"boolValue": value}
+        elif isinstance(value, int):
+            v = {"intValue": str(value)}
+        elif isinstance(value, float):
+            v = {"doubleValue": value}
+        else:
+            v = {"stringValue": str(value)}
+        out.append({"key": key, "value": v})
+    return out
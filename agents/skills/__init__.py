@@ -1,4 +1,8 @@
 from .repo_io import RepoInterface
+from .repo_index import RepoIndex
+from .search import SearchIndex
+from .transaction import WriteBatch
 from .executor import Executor
 from .supabase import SupabaseHelper
 from .gitops import GitOps
+from .workspace import WorkspaceManager
@@ -1,12 +1,15 @@
+import asyncio
 import subprocess
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 from pathlib import Path
 import time
 
 class Executor:
-    def __init__(self, timeout: int = 300):
+    def __init__(self, timeout: int = 300, working_dir: str = None, extra_env: Dict[str, str] = None):
         self.timeout = timeout
+        self.working_dir = working_dir
+        self.extra_env = extra_env or {}
         self.allowed_commands = {
             "npm": ["install", "run", "test", "build", "start", "lint", "typecheck"],
             "yarn": ["install", "run", "test", "build", "start", "lint", "typecheck"],
@@ -25,24 +28,10 @@ class Executor:
         }
     
     def run_command(self, command: str, working_dir: str = None) -> Dict[str, Any]:
-        print(f"🐛 EXECUTOR DEBUG: run_command called with: '{command}'")
-        cmd_parts = command.strip().split()
-        if not cmd_parts:
-            print(f"🐛 EXECUTOR DEBUG: Empty command")
-            return self._error_result("Empty command")
-        
-        cmd_name = cmd_parts[0]
-        cmd_args = cmd_parts[1:]
-        print(f"🐛 EXECUTOR DEBUG: cmd_name='{cmd_name}', cmd_args={cmd_args}")
-        
-        is_allowed = self._is_command_allowed(cmd_name, cmd_args)
-        print(f"🐛 EXECUTOR DEBUG: _is_command_allowed returned: {is_allowed}")
-        
-        if not is_allowed:
-            print(f"🐛 EXECUTOR DEBUG: Command not allowed: '{command}'")
-            return self._error_result(f"Command '{command}' not allowed")
-        
-        work_dir = Path(working_dir).resolve() if working_dir else Path.cwd()
+        try:
+            cmd_parts, work_dir = self._prepare(command, working_dir)
+        except ValueError as e:
+            return self._error_result(str(e))
         
         print(f"🔧 Executing: {command}")
         
@@ -58,35 +47,99 @@ class Executor:
                 env=self._get_safe_env()
             )
             
-            execution_time = time.time() - start_time
-            
-            stdout = result.stdout
-            stderr = result.stderr
-            
-            # Truncate if too long
-            if len(stdout) > 10000:
-                stdout = stdout[:10000] + "\n[... truncated ...]"
-            if len(stderr) > 10000:
-                stderr = stderr[:10000] + "\n[... truncated ...]"
-            
-            success_indicator = "✅" if result.returncode == 0 else "❌"
-            print(f"{success_indicator} Command completed in {execution_time:.2f}s")
-            
-            return {
-                "command": command,
-                "returncode": result.returncode,
-                "stdout": stdout,
-                "stderr": stderr,
-                "execution_time": execution_time,
-                "working_dir": str(work_dir),
-                "success": result.returncode == 0
-            }
+            return self._build_result(command, result.returncode, result.stdout, result.stderr,
+                                      time.time() - start_time, work_dir)
             
         except subprocess.TimeoutExpired:
             return self._error_result(f"Command timed out after {self.timeout}s")
         except Exception as e:
             return self._error_result(f"Execution error: {str(e)}")
     
+    async def arun_command(self, command: str, working_dir: str = None) -> Dict[str, Any]:
+        """Async run_command(): the subprocess is awaited instead of blocking the event loop."""
+        try:
+            cmd_parts, work_dir = self._prepare(command, working_dir)
+        except ValueError as e:
+            return self._error_result(str(e))
+        
+        print(f"🔧 Executing: {command}")
+        
+        try:
+            start_time = time.time()
+            proc = await asyncio.create_subprocess_exec(
+                *cmd_parts,
+                cwd=work_dir,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=self._get_safe_env()
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                return self._error_result(f"Command timed out after {self.timeout}s")
+            
+            return self._build_result(command, proc.returncode,
+                                      stdout.decode("utf-8", errors="replace"),
+                                      stderr.decode("utf-8", errors="replace"),
+                                      time.time() - start_time, work_dir)
+        except Exception as e:
+            return self._error_result(f"Execution error: {str(e)}")
+    
+    def _prepare(self, command: str, working_dir: str = None) -> Tuple[List[str], Path]:
+        print(f"🐛 EXECUTOR DEBUG: run_command called with: '{command}'")
+        cmd_parts = command.strip().split()
+        if not cmd_parts:
+            print(f"🐛 EXECUTOR DEBUG: Empty command")
+            raise ValueError("Empty command")
+        
+        cmd_name = cmd_parts[0]
+        cmd_args = cmd_parts[1:]
+        print(f"🐛 EXECUTOR DEBUG: cmd_name='{cmd_name}', cmd_args={cmd_args}")
+        
+        is_allowed = self._is_command_allowed(cmd_name, cmd_args)
+        print(f"🐛 EXECUTOR DEBUG: _is_command_allowed returned: {is_allowed}")
+        
+        if not is_allowed:
+            print(f"🐛 EXECUTOR DEBUG: Command not allowed: '{command}'")
+            raise ValueError(f"Command '{command}' not allowed")
+        
+        working_dir = working_dir or self.working_dir
+        work_dir = Path(working_dir).resolve() if working_dir else Path.cwd()
+        return cmd_parts, work_dir
+    
+    def _build_result(self, command: str, returncode: int, stdout: str, stderr: str,
+                      execution_time: float, work_dir: Path) -> Dict[str, Any]:
+        # Truncate if too long
+        if len(stdout) > 10000:
+            stdout = stdout[:10000] + "\n[... truncated ...]"
+        if len(stderr) > 10000:
+            stderr = stderr[:10000] + "\n[... truncated ...]"
+        
+        success_indicator = "✅" if returncode == 0 else "❌"
+        print(f"{success_indicator} Command completed in {execution_time:.2f}s")
+        
+        return {
+            "command": command,
+            "returncode": returncode,
+            "stdout": stdout,
+            "stderr": stderr,
+            "execution_time": execution_time,
+            "working_dir": str(work_dir),
+            "success": returncode == 0
+        }
+    
+    async def arun_commands(self, commands: List[str], working_dir: str = None, max_workers: int = 4) -> List[Dict[str, Any]]:
+        """Run independent commands concurrently: at most `max_workers` subprocesses in flight, results in input order."""
+        semaphore = asyncio.Semaphore(max(max_workers, 1))
+        
+        async def run(command: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.arun_command(command, working_dir)
+        
+        return list(await asyncio.gather(*(run(c) for c in commands)))
+    
     def _is_command_allowed(self, cmd_name: str, cmd_args: List[str]) -> bool:
         if cmd_name not in self.allowed_commands:
             return False
@@ -135,6 +188,7 @@ class Executor:
     
     def _get_safe_env(self) -> Dict[str, str]:
         env = os.environ.copy()
+        env.update(self.extra_env)
         if 'PATH' not in env:
             env['PATH'] = '/usr/local/bin:/usr/bin:/bin'
         return env
@@ -146,7 +200,7 @@ class Executor:
             "stdout": "",
             "stderr": error_message,
             "execution_time": 0,
-            "working_dir": str(Path.cwd()),
+            "working_dir": str(Path(self.working_dir).resolve() if self.working_dir else Path.cwd()),
             "success": False,
             "error": error_message
         }
@@ -1,3 +1,4 @@
+import asyncio
 import subprocess
 import re
 from pathlib import Path
@@ -95,6 +96,12 @@ class GitOps:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    async def acommit_changes(self, message: str, files: List[str] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.commit_changes, message, files)
+    
+    async def acreate_pr(self, title: str, body: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.create_pr, title, body)
+    
     def _clean_branch_name(self, name: str) -> str:
         clean = re.sub(r'[^\w\-/]', '-', name.lower())
         clean = re.sub(r'-+', '-', clean).strip('-')
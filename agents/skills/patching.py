@@ -0,0 +1,232 @@
+import difflib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_BLOCK_RE = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+class PatchError(ValueError):
+    """A patch that could not be applied; the message says which hunk and why."""
+
+
+def apply_patch(original: str, patch: str, fuzz: float = 0.8) -> Tuple[str, Dict[str, Any]]:
+    """
+    Apply `patch` to `original` and return (new_text, stats).
+
+    Accepts either a unified diff (`@@ -a,b +c,d @@` hunks; file headers are
+    ignored) or one or more SEARCH/REPLACE blocks:
+
+        <<<<<<< SEARCH
+        old lines
+        =======
+        new lines
+        >>>>>>> REPLACE
+
+    Raises PatchError when the text is neither, or a hunk cannot be placed.
+    """
+    if _BLOCK_RE.search(patch):
+        blocks = [{"search": s, "replace": r} for s, r in _BLOCK_RE.findall(patch)]
+        return apply_search_replace(original, blocks, fuzz)
+    if any(_HUNK_RE.match(line) for line in patch.splitlines()):
+        return apply_unified_diff(original, patch, fuzz)
+    raise PatchError("Patch is neither a unified diff (@@ hunks) nor SEARCH/REPLACE blocks")
+
+
+# -------------------- Unified diff --------------------
+
+def apply_unified_diff(original: str, diff: str, fuzz: float = 0.8) -> Tuple[str, Dict[str, Any]]:
+    lines, trailing_newline = _split(original)
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise PatchError("Unified diff contains no hunks")
+
+    stats = {"method": "unified_diff", "hunks": len(hunks), "exact": 0, "offset": 0, "fuzzy": 0}
+    drift = 0  # how far earlier hunks moved the text
+    for n, hunk in enumerate(hunks, start=1):
+        if hunk["old_count"] == 0:  # "@@ -N,0" inserts after line N
+            expected = hunk["start"] + drift
+        else:
+            expected = max(hunk["start"] - 1 + drift, 0)
+        if not hunk["old"]:  # pure insertion
+            at = max(min(expected, len(lines)), 0)
+            how = "exact"
+        else:
+            at, how = _locate(lines, hunk["old"], expected, fuzz, declared=hunk["old_count"])
+            if at is None:
+                counts = ("" if len(hunk["old"]) == hunk["old_count"] else
+                          f" (header declares {hunk['old_count']} old lines, hunk has {len(hunk['old'])})")
+                raise PatchError(f"Hunk {n} (@@ -{hunk['start']}) does not match the file{counts}: "
+                                 f"{_closest_hint(lines, hunk['old'])}")
+        stats[how] += 1
+        lines[at:at + len(hunk["old"])] = _splice(lines[at:at + len(hunk["old"])], hunk["ops"])
+        drift += len(hunk["new"]) - len(hunk["old"]) + (at - expected)
+        if hunk["no_newline"] is not None:
+            trailing_newline = not hunk["no_newline"]
+    return _join(lines, trailing_newline), stats
+
+
+def _parse_hunks(diff: str) -> List[Dict[str, Any]]:
+    """
+    Hunks with their old/new lines. The line counts in each `@@` header say
+    where the hunk ends, so a removed line that itself starts with "-- " (a
+    SQL comment: "--- drop old index") is not mistaken for a file header.
+    Prefixed lines past the declared counts are kept (models miscount), but
+    the hunk is then only applied where it matches exactly (see _locate).
+    """
+    hunks: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    old_left = new_left = 0
+    last_sign = None
+    for line in diff.splitlines():
+        m = _HUNK_RE.match(line)
+        if m:
+            old_count = int(m.group(2)) if m.group(2) is not None else 1
+            new_count = int(m.group(4)) if m.group(4) is not None else 1
+            current = {"start": int(m.group(1)), "old": [], "new": [], "ops": [], "no_newline": None,
+                       "old_count": old_count, "new_count": new_count}
+            old_left, new_left = old_count, new_count
+            hunks.append(current)
+            continue
+        if current is None:
+            continue
+        closed = old_left <= 0 and new_left <= 0
+        if closed and (not line or line.startswith(("--- ", "+++ ", "diff --git", "index "))):
+            continue
+        if line.startswith("\\"):  # "\ No newline at end of file" applies to the previous line
+            if last_sign in ("+", " "):
+                current["no_newline"] = True
+            elif current["no_newline"] is None:  # only the old file lacked it
+                current["no_newline"] = False
+            continue
+        sign, text = (line[0], line[1:]) if line else (" ", "")
+        if sign == " ":
+            current["old"].append(text)
+            current["new"].append(text)
+        elif sign == "-":
+            current["old"].append(text)
+        elif sign == "+":
+            current["new"].append(text)
+        else:  # models often drop the leading space on context lines
+            current["old"].append(line)
+            current["new"].append(line)
+            sign, text = " ", line
+        current["ops"].append((sign, text))
+        old_left -= sign in (" ", "-")
+        new_left -= sign in (" ", "+")
+        last_sign = sign
+    return hunks
+
+
+# -------------------- Search/replace --------------------
+
+def apply_search_replace(original: str, blocks: List[Dict[str, str]], fuzz: float = 0.8) -> Tuple[str, Dict[str, Any]]:
+    lines, trailing_newline = _split(original)
+    stats = {"method": "search_replace", "hunks": len(blocks), "exact": 0, "offset": 0, "fuzzy": 0}
+    for n, block in enumerate(blocks, start=1):
+        search = _split(block.get("search", ""))[0]
+        replace = _split(block.get("replace", ""))[0]
+        if not search:
+            raise PatchError(f"Edit {n} has an empty search text")
+        at, how = _locate(lines, search, 0, fuzz, unique=True)
+        if how == "ambiguous":
+            raise PatchError(f"Edit {n} search text matches more than once; "
+                             f"include more surrounding lines so it is unique")
+        if at is None:
+            raise PatchError(f"Edit {n} search text not found: {_closest_hint(lines, search)}")
+        stats["exact" if how in ("exact", "offset") else how] += 1
+        lines[at:at + len(search)] = _splice(lines[at:at + len(search)], _line_ops(search, replace))
+    return _join(lines, trailing_newline), stats
+
+
+# -------------------- Matching --------------------
+
+def _locate(lines: List[str], old: List[str], expected: int, fuzz: float,
+            declared: Optional[int] = None, unique: bool = False) -> Tuple[Optional[int], str]:
+    """
+    Find where `old` sits in `lines`, preferring the position nearest `expected`:
+    exact, then ignoring whitespace, then the most similar window (ratio >= fuzz).
+    When the hunk header `declared` a different old-line count than was parsed,
+    the hunk is suspect and only an exact match is accepted. With `unique`,
+    several exact (or whitespace-equal) matches return (None, "ambiguous").
+    """
+    size = len(old)
+    if size > len(lines):
+        return None, ""
+    candidates = sorted(range(len(lines) - size + 1), key=lambda i: abs(i - expected))
+
+    exact = [i for i in candidates if lines[i:i + size] == old]
+    if unique and len(exact) > 1:
+        return None, "ambiguous"
+    if exact:
+        return exact[0], "exact" if exact[0] == expected else "offset"
+    if declared is not None and declared != size:
+        return None, ""
+
+    squash = [" ".join(s.split()) for s in old]
+    loose = [i for i in candidates if [" ".join(s.split()) for s in lines[i:i + size]] == squash]
+    if unique and len(loose) > 1:
+        return None, "ambiguous"
+    if loose:
+        return loose[0], "fuzzy"
+
+    target = "\n".join(squash)
+    best, best_ratio = None, fuzz
+    for i in candidates:
+        window = "\n".join(" ".join(s.split()) for s in lines[i:i + size])
+        matcher = difflib.SequenceMatcher(None, window, target, autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    return (best, "fuzzy") if best is not None else (None, "")
+
+
+def _line_ops(old: List[str], new: List[str]) -> List[Tuple[str, str]]:
+    """Unified-diff style (sign, line) ops turning `old` into `new`."""
+    ops: List[Tuple[str, str]] = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops += [(" ", s) for s in old[i1:i2]]
+            continue
+        ops += [("-", s) for s in old[i1:i2]]
+        ops += [("+", s) for s in new[j1:j2]]
+    return ops
+
+
+def _splice(window: List[str], ops: List[Tuple[str, str]]) -> List[str]:
+    """
+    Apply `ops` to the matched `window`. Context lines keep the file's text, so
+    a loose match never rewrites lines the patch did not mean to change.
+    """
+    out: List[str] = []
+    i = 0
+    for sign, text in ops:
+        if sign == "+":
+            out.append(text)
+            continue
+        if sign == " ":
+            out.append(window[i])
+        i += 1
+    return out
+
+
+def _closest_hint(lines: List[str], old: List[str]) -> str:
+    first = next((s for s in old if s.strip()), "")
+    close = difflib.get_close_matches(first, lines, n=1, cutoff=0.5)
+    if not close:
+        return f"no line resembles {first.strip()[:80]!r}"
+    return f"nearest to {first.strip()[:80]!r} is line {lines.index(close[0]) + 1}: {close[0].strip()[:80]!r}"
+
+
+def _split(text: str) -> Tuple[List[str], bool]:
+    return text.splitlines(), text.endswith("\n")
+
+
+def _join(lines: List[str], trailing_newline: bool) -> str:
+    text = "\n".join(lines)
+    return text + "\n" if trailing_newline and lines else text
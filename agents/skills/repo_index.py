@@ -0,0 +1,186 @@
+import json
+import os
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+
+class RepoIndex:
+    """
+    Persistent, incrementally refreshed index of the files in a repository.
+
+    Stored in `<root>/.agent_cache/repo_index.json`. For a git checkout the
+    committed files and their sizes come from `git ls-tree -r -l HEAD` (no stat
+    calls at all) and are only re-read when HEAD moves; on every refresh
+    `git status` (which rides on git's own index stat cache) names the handful
+    of modified/untracked files, and only those are stat'ed into an overlay.
+    Outside git it falls back to a walk keyed by mtime+size.
+
+    Each entry has a `sig` (blob id for clean files, "mtime:size" otherwise) so
+    consumers such as the search index can tell which files changed.
+    """
+
+    VERSION = 1
+    SKIP_DIRS = {"node_modules", "__pycache__", ".git", "dist", "build", ".next", ".agent_cache", ".agent_worktrees"}
+
+    def __init__(self, root_path: str = ".", cache_dir: str = ".agent_cache"):
+        self.root_path = Path(root_path).resolve()
+        self.cache_path = self.root_path / cache_dir / "repo_index.json"
+        self.head: Optional[str] = None
+        self.head_files: Dict[str, Dict[str, Any]] = {}        # committed files at HEAD
+        self.overlay: Dict[str, Optional[Dict[str, Any]]] = {}  # dirty files; None = deleted
+        self.files: Dict[str, Dict[str, Any]] = {}             # merged view
+        self.changed: Set[str] = set()  # paths added/modified by the last refresh
+        self.removed: Set[str] = set()  # paths dropped by the last refresh
+        self._loaded = False
+
+    # -------------------- Queries --------------------
+
+    def list_files(self, prefix: str = "") -> List[str]:
+        self._ensure_loaded()
+        prefix = prefix.strip("/")
+        if not prefix:
+            return sorted(self.files)
+        return sorted(p for p in self.files if p == prefix or p.startswith(prefix + "/"))
+
+    def size(self, path: str) -> Optional[int]:
+        self._ensure_loaded()
+        entry = self.files.get(path)
+        return entry["size"] if entry else None
+
+    def signature(self, path: str) -> Optional[str]:
+        self._ensure_loaded()
+        entry = self.files.get(path)
+        return entry["sig"] if entry else None
+
+    # -------------------- Maintenance --------------------
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring the index up to date; returns counts of changed/removed files."""
+        self._ensure_loaded()
+        before = {p: e["sig"] for p, e in self.files.items()}
+
+        head = self._git(["rev-parse", "HEAD"])
+        if head is None:
+            self.head, self.head_files = None, {}
+            self.overlay = {p: e for p, e in self._walk("").items()}
+        else:
+            head = head.strip()
+            if head != self.head:
+                self._load_head_tree(head)
+            self.overlay = self._dirty_files()
+        self._merge()
+
+        self.changed = {p for p, e in self.files.items() if before.get(p) != e["sig"]}
+        self.removed = set(before) - set(self.files)
+        if self.changed or self.removed:
+            self._save()
+        return {"files": len(self.files), "changed": len(self.changed), "removed": len(self.removed)}
+
+    def touch(self, path: str):
+        """Record a write made through RepoInterface without waiting for the next refresh."""
+        self._ensure_loaded()
+        self.overlay[path] = self._stat(path)
+        self._merge()
+
+    # -------------------- Internals --------------------
+
+    def _load_head_tree(self, head: str):
+        out = self._git(["ls-tree", "-r", "-l", "-z", "HEAD"]) or ""
+        files = {}
+        for record in out.split("\0"):
+            if "\t" not in record:
+                continue
+            meta, path = record.split("\t", 1)
+            parts = meta.split()
+            if len(parts) < 4 or parts[1] != "blob":
+                continue
+            files[path] = {"size": int(parts[3]) if parts[3].isdigit() else 0, "sig": parts[2]}
+        self.head_files = files
+        self.head = head
+
+    def _dirty_files(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        out = self._git(["status", "--porcelain=v1", "-z", "--untracked-files=normal"]) or ""
+        overlay: Dict[str, Optional[Dict[str, Any]]] = {}
+        records = out.split("\0")
+        i = 0
+        while i < len(records):
+            record = records[i]
+            i += 1
+            if len(record) < 4:
+                continue
+            status, path = record[:2], record[3:]
+            if "R" in status or "C" in status:
+                i += 1  # the next record is the rename/copy source
+            if self._skipped(path):
+                continue
+            if path.endswith("/"):
+                overlay.update(self._walk(path.rstrip("/")))  # untracked directory
+            else:
+                overlay[path] = self._stat(path)
+        return overlay
+
+    def _walk(self, rel_dir: str) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.root_path / rel_dir):
+            dirnames[:] = [d for d in dirnames if d not in self.SKIP_DIRS]
+            for name in filenames:
+                rel = (Path(dirpath) / name).relative_to(self.root_path).as_posix()
+                entry = self._stat(rel)
+                if entry:
+                    found[rel] = entry
+        return found
+
+    def _merge(self):
+        files = dict(self.head_files)
+        for path, entry in self.overlay.items():
+            if entry is None:
+                files.pop(path, None)
+            else:
+                files[path] = entry
+        self.files = files
+
+    def _stat(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            st = (self.root_path / path).stat()
+        except OSError:
+            return None
+        return {"size": st.st_size, "sig": f"{st.st_mtime_ns}:{st.st_size}"}
+
+    def _skipped(self, path: str) -> bool:
+        return any(part in self.SKIP_DIRS for part in Path(path).parts)
+
+    def _git(self, args: List[str]) -> Optional[str]:
+        try:
+            result = subprocess.run(["git"] + args, capture_output=True, text=True, cwd=self.root_path)
+        except OSError:
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            if data.get("version") == self.VERSION:
+                self.head = data.get("head")
+                self.head_files = data.get("head_files", {})
+                self.overlay = data.get("overlay", {})
+                self._merge()
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({
+                "version": self.VERSION,
+                "head": self.head,
+                "head_files": self.head_files,
+                "overlay": self.overlay,
+            }), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
@@ -1,41 +1,42 @@
+import asyncio
 import os
 import re
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
+from .repo_index import RepoIndex
+from .patching import PatchError, apply_patch, apply_search_replace
+from .transaction import WriteBatch, atomic_write, line_delta
+from .tree import summarize_tree
+
 class RepoInterface:
     def __init__(self, root_path: str = "."):
         self.root_path = Path(root_path).resolve()
+        self._index: Optional[RepoIndex] = None
+        self._batch: Optional[WriteBatch] = None
     
-    def get_repo_structure(self, max_depth: int = 3) -> str:
-        lines = []
-        
-        def add_tree_line(path: Path, level: int):
-            if level > max_depth:
-                return
-            
-            name = path.name
-            if name.startswith('.') and name not in ['.gitignore', '.env.example']:
-                return
-            
-            skip_dirs = {'node_modules', '__pycache__', '.git', 'dist', 'build', '.next'}
-            if path.is_dir() and name in skip_dirs:
-                return
-            
-            indent = "  " * level
-            if path.is_dir():
-                lines.append(f"{indent}{name}/")
-                try:
-                    children = sorted(path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower()))
-                    for child in children:
-                        add_tree_line(child, level + 1)
-                except PermissionError:
-                    pass
-            else:
-                lines.append(f"{indent}{name}")
-        
-        add_tree_line(self.root_path, 0)
-        return "\n".join(lines[:100])
+    def get_repo_structure(self, max_depth: int = 4, max_lines: int = 100) -> str:
+        self.index.refresh()  # one `git status`; unchanged files are never stat'ed
+        files = {}
+        for rel in self.index.list_files():
+            parts = rel.split('/')
+            if any(p.startswith('.') and p not in ['.gitignore', '.env.example'] for p in parts):
+                continue
+            files[rel] = self.index.size(rel) or 0
+        return summarize_tree(files, self.root_path.name, max_lines=max_lines, max_depth=max_depth)
+    
+    def list_files(self, prefix: str = "") -> List[str]:
+        return self.index.list_files(prefix)
+    
+    def file_size(self, file_path: str) -> Optional[int]:
+        return self.index.size(file_path)
+    
+    @property
+    def index(self) -> RepoIndex:
+        if self._index is None:
+            self._index = RepoIndex(str(self.root_path))
+            self._index.refresh()
+        return self._index
     
     def read_file(self, file_path: str) -> Optional[str]:
         try:
@@ -43,6 +44,11 @@ class RepoInterface:
             if not self._is_safe_path(full_path):
                 raise ValueError(f"Unsafe file path: {file_path}")
             
+            if self._batch is not None:
+                staged = self._batch.staged.get(self._relative(full_path))
+                if staged is not None:
+                    return staged
+            
             if not full_path.exists():
                 return None
             
@@ -58,43 +64,93 @@ class RepoInterface:
         if not self._is_safe_path(full_path):
             raise ValueError(f"Unsafe file path: {file_path}")
         
-        full_path.parent.mkdir(parents=True, exist_ok=True)
+        rel_path = self._relative(full_path)
+        if self._batch is not None:
+            return {**self._batch.stage(rel_path, content), "path": str(file_path)}
         
         existed_before = full_path.exists()
-        old_content = ""
-        if existed_before:
-            old_content = self.read_file(file_path) or ""
-        
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        lines_added = len(content.split('\n'))
-        lines_removed = len(old_content.split('\n')) if existed_before else 0
+        delta = line_delta(full_path, content)
+        atomic_write(full_path, content)
+        if self._index is not None:
+            self._index.touch(rel_path)
         
         return {
             "action": "updated" if existed_before else "created",
-            "lines_added": lines_added,
-            "lines_removed": lines_removed,
+            **delta,
             "path": str(file_path)
         }
     
+    # -------------------- Write batches --------------------
+    
+    def begin_batch(self, journal_dir: str) -> WriteBatch:
+        """
+        Start staging writes: until commit_batch()/rollback_batch(), write_file()
+        and the patch helpers stage into a WriteBatch and read_file() sees the
+        staged versions.
+        """
+        if self._batch is not None:
+            raise ValueError("A write batch is already open")
+        self._batch = WriteBatch(self.root_path, Path(journal_dir))
+        return self._batch
+    
+    def commit_batch(self) -> List[str]:
+        batch, self._batch = self._batch, None
+        if batch is None:
+            return []
+        written = batch.commit()
+        if self._index is not None:
+            for rel_path in written:
+                self._index.touch(rel_path)
+        return written
+    
+    def rollback_batch(self):
+        batch, self._batch = self._batch, None
+        if batch is not None:
+            batch.rollback()
+    
+    async def aread_file(self, file_path: str) -> Optional[str]:
+        return await asyncio.to_thread(self.read_file, file_path)
+    
+    async def awrite_file(self, file_path: str, content: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.write_file, file_path, content)
+    
     def apply_patch(self, file_path: str, patch_content: str) -> Dict[str, Any]:
+        """
+        Apply a unified diff or SEARCH/REPLACE blocks to an existing file.
+        Raises PatchError (a ValueError) if the patch does not fit the file.
+        """
         full_path = self._resolve_path(file_path)
         if not self._is_safe_path(full_path):
             raise ValueError(f"Unsafe file path: {file_path}")
+        current_content = self.read_file(file_path)
+        if current_content is None:
+            raise PatchError(f"Cannot patch {file_path}: file does not exist (send full content instead)")
         
-        current_content = ""
-        if full_path.exists():
-            current_content = self.read_file(file_path) or ""
-        
-        # Simple patch application - treat as full file content for now
-        self.write_file(file_path, patch_content)
+        new_content, stats = apply_patch(current_content, patch_content)
+        write_result = self.write_file(file_path, new_content)
         return {
-            "method": "full_replacement",
-            "changed_lines": len(patch_content.split('\n')),
-            "diff_summary": f"Replaced file with {len(patch_content)} characters"
+            **stats,
+            "action": "patched",
+            "path": write_result["path"],
+            "diff_summary": f"{stats['hunks']} hunk(s) applied ({stats['fuzzy']} fuzzy)"
         }
     
+    def apply_edits(self, file_path: str, edits: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Apply a list of {"search": ..., "replace": ...} edits to an existing file."""
+        full_path = self._resolve_path(file_path)
+        if not self._is_safe_path(full_path):
+            raise ValueError(f"Unsafe file path: {file_path}")
+        current_content = self.read_file(file_path)
+        if current_content is None:
+            raise PatchError(f"Cannot edit {file_path}: file does not exist (send full content instead)")
+        
+        new_content, stats = apply_search_replace(current_content, edits)
+        write_result = self.write_file(file_path, new_content)
+        return {**stats, "action": "patched", "path": write_result["path"]}
+    
+    def _relative(self, full_path: Path) -> str:
+        return full_path.resolve().relative_to(self.root_path).as_posix()
+    
     def _resolve_path(self, file_path: str) -> Path:
         if os.path.isabs(file_path):
             return Path(file_path)
@@ -0,0 +1,283 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .repo_index import RepoIndex
+
+_IDENT_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+_SUBWORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+_TS_SYMBOLS = [
+    (re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)"), "function"),
+    (re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)"), "class"),
+    (re.compile(r"^\s*(?:export\s+)?interface\s+([A-Za-z_$][\w$]*)"), "interface"),
+    (re.compile(r"^\s*(?:export\s+)?type\s+([A-Za-z_$][\w$]*)\s*(?:<[^=]*>)?\s*="), "type"),
+    (re.compile(r"^\s*(?:export\s+)?(?:const\s+)?enum\s+([A-Za-z_$][\w$]*)"), "enum"),
+    (re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s*)?(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*(?::[^=]+)?=>"), "function"),
+    (re.compile(r"^\s*export\s+(?:const|let|var)\s+([A-Za-z_$][\w$]*)"), "const"),
+]
+_PY_SYMBOLS = [
+    (re.compile(r"^\s*(?:async\s+)?def\s+([A-Za-z_]\w*)"), "function"),
+    (re.compile(r"^\s*class\s+([A-Za-z_]\w*)"), "class"),
+]
+_SQL_SYMBOLS = [
+    (re.compile(r"^\s*create\s+(?:or\s+replace\s+)?(?:unique\s+)?(table|view|materialized\s+view|function|policy|trigger|index|type)\s+"
+                r"(?:if\s+not\s+exists\s+)?((?:\"?\w+\"?\.)?\"?\w+\"?)", re.IGNORECASE), None),
+]
+_SYMBOL_RULES = {
+    ".ts": _TS_SYMBOLS, ".tsx": _TS_SYMBOLS, ".js": _TS_SYMBOLS, ".jsx": _TS_SYMBOLS, ".mjs": _TS_SYMBOLS,
+    ".py": _PY_SYMBOLS,
+    ".sql": _SQL_SYMBOLS,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased identifiers plus their camelCase/snake_case sub-words."""
+    tokens = []
+    for ident in _IDENT_RE.findall(text):
+        low = ident.lower()
+        tokens.append(low)
+        subwords = _SUBWORD_RE.findall(ident)
+        if len(subwords) > 1:
+            tokens.extend(w.lower() for w in subwords if w.lower() != low)
+    return tokens
+
+
+def extract_symbols(path: str, text: str) -> List[Tuple[str, str, int]]:
+    """(name, kind, line) for the top-level declarations we know how to spot."""
+    rules = _SYMBOL_RULES.get(Path(path).suffix.lower())
+    if not rules:
+        return []
+    symbols = []
+    for lineno, line in enumerate(text.splitlines(), start=1):
+        for pattern, kind in rules:
+            m = pattern.match(line)
+            if not m:
+                continue
+            if kind is None:  # SQL: the object type is captured too
+                symbols.append((m.group(2).replace('"', ''), " ".join(m.group(1).lower().split()), lineno))
+            else:
+                symbols.append((m.group(1), kind, lineno))
+            break
+    return symbols
+
+
+class SearchIndex:
+    """
+    Local full-text and symbol index over the files tracked by a RepoIndex.
+
+    Per file it keeps the line numbers of every token and the declared symbols
+    (TS/TSX/JS, Python and SQL). It is persisted next to the repo index in
+    `.agent_cache/search_index.json` and refreshed incrementally: only files
+    whose RepoIndex signature changed are re-read. Queries are answered from
+    memory with BM25 ranking, and disk is touched only to cut snippets for the
+    top hits.
+    """
+
+    VERSION = 1
+    TEXT_SUFFIXES = {".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".py", ".sql", ".json", ".md",
+                     ".css", ".scss", ".html", ".toml", ".yaml", ".yml", ".sh", ".txt", ".env.example"}
+    SKIP_PREFIXES = ("runs/",)
+    MAX_FILE_BYTES = 256 * 1024
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+    def __init__(self, repo_index: RepoIndex, cache_dir: str = ".agent_cache"):
+        self.repo_index = repo_index
+        self.root_path = repo_index.root_path
+        self.cache_path = self.root_path / cache_dir / "search_index.json"
+        self.files: Dict[str, Dict[str, Any]] = {}  # path -> {sig, terms: {term: [lines]}, symbols}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # term -> {path: tf}
+        self._lengths: Dict[str, int] = {}  # path -> token count, for BM25 length normalisation
+        self._total_length = 0
+        self._path_terms: Dict[str, Set[str]] = {}
+        self._loaded = False
+
+    # -------------------- Queries --------------------
+
+    def search(self, query: str, path_prefix: str = "", limit: int = 10,
+               snippets_per_file: int = 3) -> List[Dict[str, Any]]:
+        """Rank files by BM25 over the query's tokens; return the best-matching lines of each."""
+        self.refresh()
+        terms = list(dict.fromkeys(tokenize(query)))
+        # A literal (case-insensitive) phrase match beats scattered tokens.
+        phrase = query.strip().lower()
+        hits = []
+        for path, score in self.rank(terms, path_prefix=path_prefix, limit=limit * 3):
+            lines = self.matching_lines(path, terms)
+            snippets = self._snippets(path, lines, terms, phrase, snippets_per_file)
+            if any(s["exact"] for s in snippets):
+                score *= 2
+            hits.append({"path": path, "score": round(score, 3),
+                         "snippets": [{"line": s["line"], "text": s["text"]} for s in snippets]})
+        hits.sort(key=lambda h: -h["score"])
+        return hits[:limit]
+
+    def rank(self, terms: List[str], path_prefix: str = "", limit: int = 10,
+             path_boost: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Okapi BM25 over already-tokenized `terms` (term frequency = matching
+        lines). With `path_boost`, a term that also appears in a file's path adds
+        that fraction of the term's idf, so "budgets page" finds pages/budgets.tsx.
+        Call refresh() first.
+        """
+        n_docs = max(len(self.files), 1)
+        avg_len = (self._total_length / n_docs) or 1.0
+        scores: Counter = Counter()
+        for term in dict.fromkeys(terms):
+            postings = self._postings.get(term, {})
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for path, tf in postings.items():
+                if path_prefix and not path.startswith(path_prefix):
+                    continue
+                norm = tf + self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * self._lengths[path] / avg_len)
+                scores[path] += idf * tf * (self.BM25_K1 + 1) / norm
+            if path_boost:
+                for path, path_terms in self._path_terms.items():
+                    if term in path_terms and not (path_prefix and not path.startswith(path_prefix)):
+                        scores[path] += path_boost * idf
+        return scores.most_common(limit)
+
+    def matching_lines(self, path: str, terms: List[str]) -> Dict[int, Set[str]]:
+        """Line number -> which of `terms` occur on it."""
+        by_line: Dict[int, Set[str]] = defaultdict(set)
+        entry = self.files.get(path)
+        if entry:
+            for term in terms:
+                for line in entry["terms"].get(term, []):
+                    by_line[line].add(term)
+        return by_line
+
+    def symbols(self, name: str, kind: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Declarations whose name equals, starts with, or contains `name` (in that order)."""
+        self.refresh()
+        needle = name.strip().lower()
+        found = []
+        for path, entry in self.files.items():
+            for sym_name, sym_kind, line in entry["symbols"]:
+                if kind and sym_kind != kind:
+                    continue
+                low = sym_name.lower().rsplit(".", 1)[-1]  # match SQL names without their schema
+                if low == needle:
+                    rank = 0
+                elif low.startswith(needle):
+                    rank = 1
+                elif needle in low:
+                    rank = 2
+                else:
+                    continue
+                found.append((rank, len(sym_name), path, line, sym_name, sym_kind))
+        found.sort()
+        return [{"name": n, "kind": k, "path": p, "line": l} for _, _, p, l, n, k in found[:limit]]
+
+    # -------------------- Maintenance --------------------
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-index files whose signature changed since the last refresh."""
+        self._ensure_loaded()
+        wanted = {p: self.repo_index.signature(p) for p in self.repo_index.list_files() if self._indexable(p)}
+        removed = [p for p in self.files if p not in wanted]
+        stale = [p for p, sig in wanted.items() if self.files.get(p, {}).get("sig") != sig]
+        for path in removed:
+            self._drop(path)
+        for path in stale:
+            self._drop(path)
+            self._add(path, wanted[path])
+        if removed or stale:
+            self._save()
+        return {"files": len(self.files), "updated": len(stale), "removed": len(removed)}
+
+    # -------------------- Internals --------------------
+
+    def _indexable(self, path: str) -> bool:
+        if path.startswith(self.SKIP_PREFIXES):
+            return False
+        if not any(path.endswith(s) for s in self.TEXT_SUFFIXES):
+            return False
+        size = self.repo_index.size(path)
+        return size is not None and size <= self.MAX_FILE_BYTES
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            return (self.root_path / path).read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _add(self, path: str, sig: Optional[str]):
+        text = self._read(path)
+        if text is None:
+            return
+        terms: Dict[str, List[int]] = defaultdict(list)
+        for lineno, line in enumerate(text.splitlines(), start=1):
+            for term in set(tokenize(line)):
+                terms[term].append(lineno)
+        self.files[path] = {"sig": sig, "terms": dict(terms), "symbols": extract_symbols(path, text)}
+        self._post(path)
+
+    def _post(self, path: str):
+        length = 0
+        for term, lines in self.files[path]["terms"].items():
+            self._postings[term][path] = len(lines)
+            length += len(lines)
+        self._lengths[path] = length
+        self._path_terms[path] = set(tokenize(path))
+        self._total_length += length
+
+    def _drop(self, path: str):
+        entry = self.files.pop(path, None)
+        if not entry:
+            return
+        self._total_length -= self._lengths.pop(path, 0)
+        self._path_terms.pop(path, None)
+        for term in entry["terms"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(path, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _snippets(self, path: str, by_line: Dict[int, Set[str]], terms: List[str], phrase: str,
+                  limit: int) -> List[Dict[str, Any]]:
+        text = self._read(path)
+        if text is None:
+            return []
+        lines = text.splitlines()
+        picked = []
+        for lineno in by_line:
+            if lineno > len(lines):
+                continue
+            content = lines[lineno - 1]
+            exact = phrase in content.lower()
+            picked.append((-(exact * len(terms) + len(by_line[lineno])), lineno, content, exact))
+        picked.sort()
+        return [{"line": n, "text": c.strip()[:160], "exact": e} for _, n, c, e in picked[:limit]]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.VERSION:
+            return
+        for path, entry in data.get("files", {}).items():
+            entry["symbols"] = [tuple(s) for s in entry["symbols"]]
+            self.files[path] = entry
+            self._post(path)
+
+    def _save(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": self.VERSION, "files": self.files}), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
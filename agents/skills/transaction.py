@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def line_delta(old_path: Optional[Path], new_text: str, old_text: Optional[str] = None) -> Dict[str, int]:
+    """
+    Lines added/removed between a file and its replacement, counted as a
+    multiset difference of lines. The old side is streamed from disk (or taken
+    from `old_text` when it only exists in memory), so no full copy is read.
+    """
+    new_lines = Counter(new_text.splitlines())
+    removed = 0
+    if old_text is not None:
+        old_iter: Iterable[str] = old_text.splitlines()
+    elif old_path is not None and old_path.exists():
+        old_iter = _stream_lines(old_path)
+    else:
+        old_iter = ()
+    for line in old_iter:
+        if new_lines[line] > 0:
+            new_lines[line] -= 1
+        else:
+            removed += 1
+    return {"lines_added": sum(new_lines.values()), "lines_removed": removed}
+
+
+def _stream_lines(path: Path) -> Iterable[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                yield line.rstrip("\n").rstrip("\r")
+    except OSError:
+        return
+
+
+def atomic_write(path: Path, content: str):
+    """Write via a fsync'ed temp file in the same directory and rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _write_temp(path, content)
+    try:
+        _replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _fsync_dir(path.parent)
+
+
+def _write_temp(path: Path, content: str) -> Path:
+    tmp = path.with_name(f".{path.name}.agent-{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp
+
+
+def _replace(tmp: Path, path: Path):
+    if path.exists():
+        shutil.copymode(path, tmp)
+    os.replace(tmp, path)
+
+
+def _fsync_dir(directory: Path):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # exists but belongs to someone else
+        return True
+    return True
+
+
+class WriteBatch:
+    """
+    All-or-nothing set of file writes for one agent decision.
+
+    `stage()` writes each new version to a fsync'ed temp file next to its
+    target and records it in a journal (`<journal_dir>/journal.json`).
+    `commit()` saves the current versions as backups (hardlinks where
+    possible), marks the journal as committing, renames every temp file into
+    place and then deletes the journal. If the process dies in between,
+    `WriteBatch.recover_all(runs_dir)` on the next start restores the backups
+    (run ids change on every start, so it scans for journals of any run whose
+    process is gone), and a turn is either fully applied or not at all.
+    """
+
+    def __init__(self, root_path: Path, journal_dir: Path):
+        self.root_path = Path(root_path)
+        self.journal_dir = Path(journal_dir)
+        self.staged: Dict[str, str] = {}  # repo-relative path -> new content
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def stage(self, rel_path: str, content: str) -> Dict[str, Any]:
+        target = self.root_path / rel_path
+        previous = self._entries.get(rel_path)
+        if previous:
+            Path(previous["tmp"]).unlink(missing_ok=True)
+        existed = target.exists()
+        delta = line_delta(target, content, old_text=self.staged.get(rel_path))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _write_temp(target, content)
+
+        self.staged[rel_path] = content
+        self._entries[rel_path] = {"path": rel_path, "tmp": str(tmp), "existed": existed, "backup": None}
+        self._write_journal("staging")
+        return {
+            "action": "updated" if existed else "created",
+            **delta,
+            "path": rel_path,
+        }
+
+    def commit(self) -> List[str]:
+        """Atomically apply every staged write; returns the paths written."""
+        if not self._entries:
+            self._clear_journal()
+            return []
+        for i, entry in enumerate(self._entries.values()):
+            target = self.root_path / entry["path"]
+            if entry["existed"] and target.exists():
+                backup = self.journal_dir / f"backup-{i}"
+                backup.unlink(missing_ok=True)
+                try:
+                    os.link(target, backup)
+                except OSError:
+                    shutil.copy2(target, backup)
+                entry["backup"] = str(backup)
+        self._write_journal("committing")
+
+        try:
+            for entry in self._entries.values():
+                target = self.root_path / entry["path"]
+                _replace(Path(entry["tmp"]), target)
+            for parent in {(self.root_path / p).parent for p in self._entries}:
+                _fsync_dir(parent)
+        except BaseException:
+            self.rollback()
+            raise
+
+        written = list(self._entries)
+        self._clear_journal()
+        self._entries.clear()
+        self.staged.clear()
+        return written
+
+    def rollback(self):
+        """Discard staged writes and undo any that were already renamed into place."""
+        self._undo(self.root_path, list(self._entries.values()), self._journal_state())
+        self._clear_journal()
+        self._entries.clear()
+        self.staged.clear()
+
+    @classmethod
+    def recover(cls, journal_dir: Path) -> Optional[Dict[str, Any]]:
+        """Roll back a batch left behind by a crashed run; returns what was restored."""
+        journal = Path(journal_dir) / "journal.json"
+        try:
+            data = json.loads(journal.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        root = Path(data["root"])
+        if root.is_dir():  # a removed worktree has nothing left to restore
+            cls._undo(root, data["entries"], data["state"])
+        shutil.rmtree(journal_dir, ignore_errors=True)
+        return {"state": data["state"], "paths": [e["path"] for e in data["entries"]]}
+
+    @classmethod
+    def recover_all(cls, runs_dir: Path) -> List[Dict[str, Any]]:
+        """
+        Recover every `<run_id>.journal` under `runs_dir` whose writing process
+        has exited. Journals of live processes (other runs of a batch sharing
+        runs/) are left alone.
+        """
+        recovered = []
+        for journal_dir in sorted(Path(runs_dir).glob("*.journal")):
+            try:
+                data = json.loads((journal_dir / "journal.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(data.get("pid")):
+                continue
+            result = cls.recover(journal_dir)
+            if result:
+                recovered.append({"journal": journal_dir.name, **result})
+        return recovered
+
+    # -------------------- Internals --------------------
+
+    @staticmethod
+    def _undo(root: Path, entries: List[Dict[str, Any]], state: Optional[str]):
+        for entry in entries:
+            Path(entry["tmp"]).unlink(missing_ok=True)
+            if state != "committing":
+                continue  # nothing was renamed yet
+            target = root / entry["path"]
+            if entry.get("backup") and Path(entry["backup"]).exists():
+                os.replace(entry["backup"], target)
+            elif not entry["existed"]:
+                target.unlink(missing_ok=True)
+
+    def _journal_state(self) -> Optional[str]:
+        try:
+            return json.loads((self.journal_dir / "journal.json").read_text(encoding="utf-8"))["state"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_journal(self, state: str):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        data = {"root": str(self.root_path), "state": state, "pid": os.getpid(),
+                "entries": list(self._entries.values())}
+        journal = self.journal_dir / "journal.json"
+        tmp = self.journal_dir / "journal.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, journal)
+        _fsync_dir(self.journal_dir)
+
+    def _clear_journal(self):
+        shutil.rmtree(self.journal_dir, ignore_errors=True)
@@ -0,0 +1,123 @@
+from typing import Dict, List, Optional
+
+
+class _Dir:
+    __slots__ = ("name", "dirs", "files", "count", "size", "_need")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dirs: Dict[str, "_Dir"] = {}
+        self.files: Dict[str, int] = {}
+        self.count = 0
+        self.size = 0
+        self._need: Optional[int] = None
+
+    def need(self) -> int:
+        """Lines needed to show this directory fully expanded."""
+        if self._need is None:
+            self._need = 1 + len(self.files) + sum(d.need() for d in self.dirs.values())
+        return self._need
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def summarize_tree(files: Dict[str, int], root_name: str = ".", max_lines: int = 100,
+                   max_depth: int = 4) -> str:
+    """
+    Render `files` ({relative path: size}) as an indented tree of at most
+    `max_lines` lines.
+
+    Rather than cutting the listing off after the first N lines (which lets
+    alphabetically early directories crowd everything else out), the line
+    budget is split fairly across sibling subtrees: small subtrees are shown in
+    full, and whatever does not fit is collapsed into summary lines such as
+    `runs/ (79 files, 1.2 MB)` or `… 12 more files (340.0 KB)`. Directories
+    deeper than `max_depth` are always collapsed.
+    """
+    root = _Dir(root_name)
+    for path, size in files.items():
+        parts = path.split("/")
+        node = root
+        node.count += 1
+        node.size += size
+        for part in parts[:-1]:
+            node = node.dirs.setdefault(part, _Dir(part))
+            node.count += 1
+            node.size += size
+        node.files[parts[-1]] = size
+
+    lines: List[str] = []
+    _render(root, 0, max(max_lines, 1), max_depth, lines)
+    return "\n".join(lines)
+
+
+def _plural(n: int, noun: str) -> str:
+    return f"{n} {noun}" if n == 1 else f"{n} {noun}s"
+
+
+def _collapsed(node: _Dir) -> str:
+    return f"{node.name}/ ({_plural(node.count, 'file')}, {format_size(node.size)})"
+
+
+def _render(node: _Dir, level: int, budget: int, max_depth: int, lines: List[str]):
+    indent = "  " * level
+    # A partial listing needs room for the header, one entry and a summary line.
+    if budget < node.need() and budget < 3 or level >= max_depth and node.dirs:
+        lines.append(indent + _collapsed(node))
+        return
+    lines.append(f"{indent}{node.name}/")
+
+    child_indent = "  " * (level + 1)
+    dirs = sorted(node.dirs.values(), key=lambda d: d.name.lower())
+    files = sorted(node.files, key=str.lower)
+    available = budget - 1
+
+    # Too many subdirectories to give each even one line: list what fits.
+    reserve = 1 if files else 0
+    if len(dirs) + reserve > available:
+        shown = available - 1 - reserve
+        if shown < 1:
+            lines[-1] = indent + _collapsed(node)
+            return
+        for d in dirs[:shown]:
+            lines.append(child_indent + _collapsed(d))
+        hidden = dirs[shown:]
+        if files:
+            lines.append(f"{child_indent}… {_plural(len(files), 'file')} "
+                         f"({format_size(sum(node.files.values()))})")
+        noun = "directory" if len(hidden) == 1 else "directories"
+        lines.append(f"{child_indent}… {len(hidden)} more {noun} "
+                     f"({_plural(sum(d.count for d in hidden), 'file')}, {format_size(sum(d.size for d in hidden))})")
+        return
+
+    # Water-filling: the loose files count as one more claimant. Claimants that
+    # need less than an even share get all they need; the rest split what's left.
+    claims = [(d.need(), i) for i, d in enumerate(dirs)]
+    if files:
+        claims.append((len(files), len(dirs)))
+    allocation = [0] * len(claims)
+    remaining = available
+    for rank, (need, i) in enumerate(sorted(claims)):
+        share = remaining // (len(claims) - rank)
+        allocation[i] = max(min(need, share), 1)
+        remaining -= allocation[i]
+
+    for d, alloc in zip(dirs, allocation):
+        _render(d, level + 1, alloc, max_depth, lines)
+
+    if files:
+        alloc = allocation[len(dirs)]
+        if alloc >= len(files):
+            lines.extend(child_indent + f for f in files)
+        else:
+            shown = files[:alloc - 1]
+            lines.extend(child_indent + f for f in shown)
+            rest = files[alloc - 1:]
+            lines.append(f"{child_indent}… {_plural(len(rest), 'more file')} "
+                         f"({format_size(sum(node.files[f] for f in rest))})")
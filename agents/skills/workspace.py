@@ -0,0 +1,118 @@
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator
+
+# Marks a run directory whose worktree the user chose to keep; prune() leaves it alone
+KEEP_MARKER = ".keep"
+
+
+class WorkspaceManager:
+    """
+    Provisions one git worktree per run so concurrent runs never share a checkout.
+
+    Worktrees live under `<repo>/<base_dir>/<run_id>/<repo name>` (keeping the
+    repo name as the leaf lets the orchestrator's path normalization keep
+    working) on a branch `agent/<run_id>`, so commits survive removal.
+
+    Worktrees are cheap because dependencies are not reinstalled: the main
+    checkout's node_modules is hardlinked into each one (`cp -al`, falling back
+    to a symlink across filesystems), and every run shares one npm cache under
+    `.agent_cache/npm` through the environment returned with the workspace.
+    """
+
+    def __init__(self, repo_path: str = ".", base_dir: str = ".agent_worktrees",
+                 node_modules: str = "hardlink"):
+        self.repo_path = Path(repo_path).resolve()
+        self.base_dir = self.repo_path / base_dir
+        self.node_modules = node_modules  # "hardlink" | "symlink" | "none"
+        self.npm_cache = self.repo_path / ".agent_cache" / "npm"
+
+    def create(self, run_id: str, ref: str = "HEAD") -> Dict[str, Any]:
+        path = self.base_dir / run_id / self.repo_path.name
+        branch = f"agent/{run_id}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        result = subprocess.run(
+            ["git", "worktree", "add", "-b", branch, str(path), ref],
+            capture_output=True,
+            text=True,
+            cwd=self.repo_path
+        )
+        if result.returncode != 0:
+            return {"success": False, "error": result.stderr.strip()}
+
+        self.npm_cache.mkdir(parents=True, exist_ok=True)
+        return {
+            "success": True,
+            "path": str(path),
+            "branch": branch,
+            "node_modules": self._share_node_modules(path),
+            "env": {"npm_config_cache": str(self.npm_cache)},
+        }
+
+    def remove(self, path: str) -> Dict[str, Any]:
+        result = subprocess.run(
+            ["git", "worktree", "remove", "--force", path],
+            capture_output=True,
+            text=True,
+            cwd=self.repo_path
+        )
+        if result.returncode != 0 and Path(path).exists():
+            # e.g. a node_modules symlink git refuses to delete; clear it by hand
+            shutil.rmtree(path, ignore_errors=True)
+            subprocess.run(["git", "worktree", "prune"], capture_output=True, cwd=self.repo_path)
+        run_dir = Path(path).parent
+        if run_dir.parent == self.base_dir:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        return {"success": not Path(path).exists(), "error": result.stderr.strip()}
+
+    def keep(self, path: str):
+        """Mark the worktree at `path` as kept, so prune() never removes it."""
+        run_dir = Path(path).parent
+        if run_dir.parent == self.base_dir:
+            (run_dir / KEEP_MARKER).touch()
+
+    @contextmanager
+    def workspace(self, run_id: str, ref: str = "HEAD") -> Iterator[Dict[str, Any]]:
+        """Create a worktree for the duration of a `with` block and always remove it."""
+        ws = self.create(run_id, ref)
+        if not ws.get("success"):
+            raise RuntimeError(f"Worktree setup failed: {ws.get('error')}")
+        try:
+            yield ws
+        finally:
+            self.remove(ws["path"])
+
+    def prune(self, max_age_hours: float = 12) -> int:
+        """
+        Remove worktrees left behind by crashed runs (older than `max_age_hours`);
+        worktrees marked with keep() are left alone.
+        """
+        subprocess.run(["git", "worktree", "prune"], capture_output=True, cwd=self.repo_path)
+        if not self.base_dir.exists():
+            return 0
+        cutoff = time.time() - max_age_hours * 3600
+        removed = 0
+        for run_dir in self.base_dir.iterdir():
+            if not run_dir.is_dir() or run_dir.stat().st_mtime > cutoff or (run_dir / KEEP_MARKER).exists():
+                continue
+            for wt in run_dir.iterdir():
+                if wt.is_dir():
+                    self.remove(str(wt))
+                removed += 1
+        return removed
+
+    def _share_node_modules(self, path: Path) -> str:
+        source = self.repo_path / "node_modules"
+        target = path / "node_modules"
+        if self.node_modules == "none" or not source.is_dir() or target.exists():
+            return "none"
+        if self.node_modules == "hardlink":
+            result = subprocess.run(["cp", "-al", str(source), str(target)], capture_output=True)
+            if result.returncode == 0:
+                return "hardlink"
+            shutil.rmtree(target, ignore_errors=True)
+        target.symlink_to(source, target_is_directory=True)
+        return "symlink"
@@ -0,0 +1,65 @@
+from agents.context.budget import ContextBudget, estimate_tokens
+from agents.context.conversation import Conversation
+
+BIG = "word " * 400
+
+
+def _exchange(conv: Conversation, turn: int, kind: str = "edit", result: str = ""):
+    if result:
+        conv.add_user(result, kind="result")
+    conv.add_user(f"note {turn}")
+    conv.add_assistant(f"reply {turn} " + BIG, kind=kind, turn=turn, summary=f"[turn {turn}: {kind}]")
+
+
+def _result(turn: int) -> str:
+    return f"## Execution Results (turn {turn})\nstatus: ok\n" + BIG
+
+
+def _turns(conv: Conversation):
+    return [m["turn"] for m in conv.messages if m["role"] == "assistant"]
+
+
+def test_nothing_happens_under_budget():
+    conv = Conversation()
+    _exchange(conv, 1)
+    assert ContextBudget(max_tokens=100000).fit(conv) is None
+
+
+def test_results_are_trimmed_before_replies_are_summarized():
+    conv = Conversation()
+    for turn in range(1, 6):
+        _exchange(conv, turn, result=_result(turn))
+    budget = ContextBudget(max_tokens=estimate_tokens(BIG) * 9, keep_recent=2)
+    stats = budget.fit(conv)
+    assert stats["evicted"] == 0 and stats["after"] <= budget.max_tokens
+    old_user = conv.messages[0]["content"]
+    assert "[output trimmed to fit the context budget]" in old_user
+    assert "status: ok" in old_user  # header and status line survive
+    # the pinned recent exchanges are untouched
+    assert conv.messages[-2]["content"].count("word") == 400 and BIG in conv.messages[-1]["content"]
+
+
+def test_replies_are_replaced_by_their_summary_next():
+    conv = Conversation()
+    for turn in range(1, 6):
+        _exchange(conv, turn)
+    budget = ContextBudget(max_tokens=estimate_tokens(BIG) * 3, keep_recent=2)
+    stats = budget.fit(conv)
+    assert stats["evicted"] == 0
+    assert conv.messages[1]["content"] == "[turn 1: edit]"
+    assert BIG in conv.messages[-1]["content"] and BIG in conv.messages[-3]["content"]
+
+
+def test_oldest_exchanges_are_evicted_last_but_the_plan_is_pinned():
+    conv = Conversation()
+    _exchange(conv, 1, kind="plan")
+    for turn in range(2, 8):
+        conv.add_user(BIG)
+        _exchange(conv, turn)
+    budget = ContextBudget(max_tokens=estimate_tokens(BIG) * 7, keep_recent=2)
+    stats = budget.fit(conv)
+    assert stats["evicted"] > 0 and stats["after"] <= budget.max_tokens
+    turns = _turns(conv)
+    assert turns[0] == 1  # the latest PLAN exchange survives
+    assert turns[-2:] == [6, 7]  # so do the newest ones
+    assert turns == sorted(turns) and 2 not in turns  # evicted oldest first
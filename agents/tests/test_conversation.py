@@ -0,0 +1,27 @@
+from agents.adapters.claude import ClaudeWorker
+from agents.context.conversation import Conversation
+
+
+def test_history_is_sent_byte_identically_on_later_turns():
+    conv = Conversation()
+    conv.add_user("result 1", kind="result")
+    first = conv.outgoing("turn 1 prompt")
+    conv.add_assistant("reply 1", kind="edit", turn=1)
+    conv.add_user("hint 2")
+    second = conv.outgoing("turn 2 prompt")
+    assert second[:-1] == first[:-1] + [conv.messages[0], conv.messages[1]]
+    assert [m["content"] for m in second] == ["turn 1 prompt", "reply 1", "turn 2 prompt"]
+    assert conv.messages[0]["parts"] == [("result", "result 1")]
+
+
+def test_only_the_context_body_is_stored_in_the_history(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    worker = ClaudeWorker()
+    conv = Conversation()
+    conv.add_user("## Execution Results\nok")
+    messages = worker._build_messages(conv, 3)
+    conv.add_assistant("reply", turn=3)
+    assert messages[-1]["content"] == "# Turn 3\n\n## Current Context\n## Execution Results\nok"
+    assert conv.messages[0]["content"] == messages[-1]["content"]
+    assert "Instructions" not in conv.messages[0]["content"]
+    assert "determine your next action" in worker.system_prompt
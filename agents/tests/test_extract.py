@@ -0,0 +1,79 @@
+import json
+import random
+
+import pytest
+
+from agents.protocol.extract import (JSONObjectScanner, command_error, extract_control, object_spans, scan_objects,
+                                     validate_control)
+
+CONTROL = '{"decision": "EDIT", "reason": "fix", "commands": [{"write": {"path": "a.ts", "content": "x = \\"}\\";"}}]}'
+
+TEXTS = [
+    "Plan first.\n" + CONTROL,
+    "Use `{` to open a block, then:\n" + CONTROL,
+    'function f() { return "}"; }\n' + CONTROL,
+    "import { X } from 'y';\n```json\n" + CONTROL + "\n```\ntrailing prose",
+    'Example: {"decision": "PLAN"} but really ' + CONTROL,
+    '{ "a": {"b": "{"}, "c": "\\\\"}' + " and {} " + CONTROL,
+]
+
+
+def _streamed(text, sizes):
+    scanner, found, i = JSONObjectScanner(), [], 0
+    while i < len(text):
+        n = sizes.pop(0) if sizes else 7
+        found.extend(scanner.feed(text[i:i + n]))
+        i += n
+    return found
+
+
+def test_prose_and_code_braces_do_not_open_objects():
+    text = 'function f() { return "}"; }\n' + CONTROL
+    assert [text[s:e] for s, e in object_spans(text)] == [CONTROL]
+
+
+def test_truncated_object_is_reported_open_without_hiding_earlier_ones():
+    text = '{"decision": "PLAN"} then {"decision": "EDIT", "commands": [{"write": {"path": "a", "content": "cut'
+    spans, opens = scan_objects(text)
+    assert [text[s:e] for s, e in spans] == ['{"decision": "PLAN"}']
+    assert opens and text[opens[0]:].startswith('{"decision": "EDIT"')
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_stream_scanner_matches_scan_objects(text):
+    expected = [text[s:e] for s, e in object_spans(text)]
+    assert JSONObjectScanner().feed(text) == expected
+    assert _streamed(text, [1] * len(text)) == expected
+    rng = random.Random(len(text))
+    for _ in range(20):
+        assert _streamed(text, [rng.randint(1, 12) for _ in range(len(text))]) == expected
+
+
+def test_stream_scanner_finds_the_control_object_after_a_prose_brace():
+    found = _streamed("Use `{` to open a block.\n" + CONTROL, [])
+    assert [json.loads(raw)["decision"] for raw in found] == ["EDIT"]
+
+
+def test_stream_scanner_decides_a_brace_split_from_its_key():
+    scanner = JSONObjectScanner()
+    assert scanner.feed("x {") == []
+    assert scanner.feed('  \n"decision": "STOP"}') == ['{  \n"decision": "STOP"}']
+
+
+def test_extract_control_prefers_the_last_valid_object():
+    data, errors = extract_control('Example {"decision": "PLAN"}\n' + CONTROL)
+    assert data["decision"] == "EDIT" and errors == []
+
+
+def test_extract_control_returns_schema_errors_when_nothing_is_valid():
+    data, errors = extract_control('{"decision": "EDIT", "commands": [{"run": 3}]}')
+    assert data["decision"] == "EDIT"
+    assert errors == ["commands[0].run must be a string"]
+    assert extract_control("no json here") == (None, [])
+
+
+def test_validate_control_and_command_error():
+    assert validate_control(json.loads(CONTROL)) == []
+    assert validate_control({"decision": "NOPE"})[0].startswith("decision must be one of")
+    assert command_error({"write": {"path": "a"}}) == ".write needs content, patch or edits"
+    assert command_error({"run": "ls", "search": "x"}).startswith(" needs exactly one of")
@@ -0,0 +1,125 @@
+import pytest
+
+from agents.skills.patching import PatchError, apply_patch, apply_search_replace, apply_unified_diff
+
+MIGRATION = """\
+create table items (id bigint primary key, name text);
+-- drop old index
+drop index if exists items_name_idx;
+create index items_name_idx on items (name);
+alter table items enable row level security;
+"""
+
+
+def test_removing_a_sql_comment_line_is_not_read_as_a_file_header():
+    diff = """\
+--- a/supabase/migrations/001_items.sql
++++ b/supabase/migrations/001_items.sql
+@@ -1,4 +1,3 @@
+ create table items (id bigint primary key, name text);
+--- drop old index
+ drop index if exists items_name_idx;
+ create index items_name_idx on items (name);
+"""
+    text, stats = apply_unified_diff(MIGRATION, diff)
+    assert text == MIGRATION.replace("-- drop old index\n", "")
+    assert stats["exact"] == 1
+
+
+def test_sql_comment_removal_in_a_larger_hunk_is_not_misplaced():
+    original = "".join(f"select {i};\n" for i in range(20)) + MIGRATION + "".join(f"select {i};\n" for i in range(20, 40))
+    diff = """\
+@@ -20,6 +20,5 @@
+ select 19;
+ create table items (id bigint primary key, name text);
+--- drop old index
+ drop index if exists items_name_idx;
+ create index items_name_idx on items (name);
+ alter table items enable row level security;
+"""
+    text, _ = apply_unified_diff(original, diff)
+    assert text == original.replace("-- drop old index\n", "")
+
+
+def test_file_headers_between_hunks_are_skipped():
+    original = "a\nb\nc\n"
+    diff = "--- a/f\n+++ b/f\n@@ -1,2 +1,2 @@\n a\n-b\n+B\n"
+    assert apply_unified_diff(original, diff)[0] == "a\nB\nc\n"
+
+
+def test_hunk_found_at_an_offset():
+    original = "x\ny\na\nb\nc\n"
+    text, stats = apply_unified_diff(original, "@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n")
+    assert text == "x\ny\na\nB\nc\n"
+    assert stats["offset"] == 1
+
+
+def test_whitespace_drift_is_matched_fuzzily():
+    original = "def f():\n    return  1\n"
+    text, stats = apply_unified_diff(original, "@@ -1,2 +1,2 @@\n def f():\n-    return 1\n+    return 2\n")
+    assert text == "def f():\n    return 2\n"
+    assert stats["fuzzy"] == 1
+
+
+def test_miscounted_hunk_only_applies_where_it_matches_exactly():
+    original = "alpha\nbeta\ngamma\n"
+    with pytest.raises(PatchError, match="header declares 1 old lines"):
+        apply_unified_diff(original, "@@ -1,1 +1,1 @@\n alpha\n-betta\n+BETA\n")
+    assert apply_unified_diff(original, "@@ -1,1 +1,1 @@\n alpha\n-beta\n+BETA\n")[0] == "alpha\nBETA\ngamma\n"
+
+
+def test_no_newline_marker():
+    text, _ = apply_unified_diff("a\n", "@@ -1 +1 @@\n-a\n+b\n\\ No newline at end of file\n")
+    assert text == "b"
+
+
+def test_search_replace_blocks():
+    patch = "<<<<<<< SEARCH\nb\n=======\nB\n>>>>>>> REPLACE\n"
+    assert apply_patch("a\nb\nc\n", patch)[0] == "a\nB\nc\n"
+    with pytest.raises(PatchError, match="not found"):
+        apply_search_replace("a\n", [{"search": "zzz", "replace": "y"}])
+
+
+def test_neither_format_is_rejected():
+    with pytest.raises(PatchError):
+        apply_patch("a\n", "just prose")
+
+
+def test_zero_context_insertions_from_diff_u0_land_after_the_named_line():
+    # `diff -U0 a.txt b.txt`; "@@ -N,0" means "insert after line N"
+    diff = """\
+--- a.txt\t2026-10-17 07:43:15.609702254 +0000
++++ b.txt\t2026-10-17 07:43:15.609702254 +0000
+@@ -0,0 +1 @@
++zero
+@@ -2,0 +4 @@
++TWO-B
+@@ -4,0 +7 @@
++five
+"""
+    text, stats = apply_unified_diff("one\ntwo\nthree\nfour\n", diff)
+    assert text == "zero\none\ntwo\nTWO-B\nthree\nfour\nfive\n"
+    assert stats["exact"] == 3
+
+
+def test_fuzzy_match_keeps_the_files_context_lines():
+    original = "def g():\n    x = compute(a, b, c)\n    return 1\n"
+    stale = "@@ -1,3 +1,3 @@\n def g():\n     x = compute(a, b)\n-    return 1\n+    return 2\n"
+    text, stats = apply_unified_diff(original, stale)
+    assert text == "def g():\n    x = compute(a, b, c)\n    return 2\n"
+    assert stats["fuzzy"] == 1
+
+
+def test_fuzzy_search_replace_keeps_unchanged_lines_from_the_file():
+    original = "def g():\n    x = compute(a, b, c)\n    return 1\n"
+    block = {"search": "def g():\n    x = compute(a, b)\n    return 1\n",
+             "replace": "def g():\n    x = compute(a, b)\n    return 2\n"}
+    assert apply_search_replace(original, [block])[0] == "def g():\n    x = compute(a, b, c)\n    return 2\n"
+
+
+def test_ambiguous_search_text_is_rejected():
+    original = "x = 1\nprint(x)\nx = 1\n"
+    with pytest.raises(PatchError, match="more than once"):
+        apply_search_replace(original, [{"search": "x = 1", "replace": "x = 2"}])
+    text, _ = apply_search_replace(original, [{"search": "print(x)\nx = 1", "replace": "print(x)\nx = 2"}])
+    assert text == "x = 1\nprint(x)\nx = 2\n"
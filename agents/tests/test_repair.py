@@ -0,0 +1,51 @@
+from agents.protocol.decision import ControlDecision
+from agents.protocol.repair import is_truncated, repair_control, repair_json
+
+
+def test_repair_json_removes_trailing_commas():
+    assert repair_json('{"a": 1, "b": [1, 2,],}') == ({"a": 1, "b": [1, 2]}, ["removed trailing commas"])
+
+
+def test_repair_json_fixes_escaped_structure_and_raw_newlines():
+    data, notes = repair_json('{"decision": "PLAN",\\n"reason": "line\nbreak"}')
+    assert data == {"decision": "PLAN", "reason": "line\nbreak"}
+    assert notes == ["unescaped structural \\n", "escaped raw newlines in strings"]
+
+
+def test_repair_json_drops_the_cut_off_value_instead_of_closing_it():
+    data, notes = repair_json('{"decision": "EDIT", "commands": [{"run": "ls"}, {"write": {"path": "a", "content": "half')
+    assert data == {"decision": "EDIT", "commands": [{"run": "ls"}, {"write": {"path": "a"}}]}
+    assert "dropped the cut-off value" in notes
+
+
+def test_repair_json_gives_up_on_garbage():
+    assert repair_json('{"a": nope}')[0] is None
+
+
+def test_repair_control_normalizes_and_drops_the_incomplete_write():
+    control, notes = repair_control('Sure.\n{"decision": "edit", "commands": [{"run": "ls"}, '
+                                    '{"write": {"path": "a", "content": "half')
+    assert control == {"decision": "EDIT", "reason": "", "commands": [{"run": "ls"}]}
+    assert "commands[1] dropped:.write needs content, patch or edits" in notes
+    assert repair_control("no control object") == (None, [])
+
+
+def test_is_truncated():
+    assert is_truncated('text {"decision": "PLAN", "plan": ["a')
+    assert not is_truncated('{"decision": "PLAN"}')
+    assert not is_truncated('prose with { "unrelated": "open')
+
+
+def test_control_decision_from_dict_fills_defaults_and_reports_fixes():
+    decision, fixes = ControlDecision.from_dict({
+        "decision": " stop ", "reason": 3, "commands": {"run": "ls"},
+        "commit": {"message": "m", "files": "a.txt"}, "pr": {"body": "no title"}, "extra_key": 1,
+    })
+    assert decision.to_dict() == {"decision": "STOP", "reason": "3", "commands": [{"run": "ls"}],
+                                  "commit": {"message": "m", "files": []}, "extra_key": 1}
+    assert fixes == ["commands wrapped in a list", "commit.files reset (not a list)", "pr dropped (needs a title)"]
+
+
+def test_control_decision_rejects_unknown_decisions():
+    assert ControlDecision.from_dict({"decision": "DANCE"}) == (None, ["unknown decision 'DANCE'"])
+    assert ControlDecision.from_dict(["not", "a", "dict"]) == (None, ["not an object"])
@@ -0,0 +1,55 @@
+import pytest
+
+from agents.adapters.retry import APIError, RetryPolicy, classify_exception, classify_response, parse_retry_after
+
+
+def test_classify_response():
+    overloaded = classify_response(529, '{"type": "error", "error": {"type": "overloaded_error", "message": "busy"}}')
+    assert (overloaded.kind, overloaded.retryable) == ("overloaded", True)
+    billing = classify_response(400, '{"error": {"message": "Your credit balance is too low"}}')
+    assert (billing.kind, billing.retryable) == ("billing", False)
+    limited = classify_response(429, "{}", {"retry-after": "7"})
+    assert (limited.kind, limited.retryable, limited.retry_after) == ("rate_limit", True, 7.0)
+
+
+def test_parse_retry_after_sources():
+    assert parse_retry_after({"Retry-After-Ms": "1500"}) == 1.5
+    assert parse_retry_after({}, '{"retryDelay": "12s"}') == 12.0
+    assert parse_retry_after({}) is None
+
+
+def test_classify_exception_marks_network_errors_retryable():
+    class ReadTimeout(Exception):
+        pass
+    assert classify_exception(ReadTimeout("slow")).kind == "timeout"
+    assert classify_exception(ValueError("bug")).retryable is False
+
+
+def test_run_retries_then_reports_how_many_attempts_were_made():
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise APIError("503", status=503, kind="server", retryable=True)
+
+    with pytest.raises(APIError) as info:
+        RetryPolicy(max_attempts=3, base_delay=0.001).run(call)
+    assert len(calls) == 3 and info.value.attempts == 3
+
+
+def test_run_does_not_retry_fatal_errors():
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise APIError("401", status=401, kind="auth")
+
+    with pytest.raises(APIError) as info:
+        RetryPolicy(max_attempts=3, base_delay=0.001).run(call)
+    assert len(calls) == 1 and info.value.attempts == 1
+
+
+def test_delay_honours_retry_after_and_caps_backoff():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    assert policy.delay(1, APIError("x", retry_after=9.0)) == 9.0
+    assert all(0 <= policy.delay(10) <= 4.0 for _ in range(50))
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from agents.adapters.router import RouterWorker
+from agents.context.conversation import Conversation
+
+
+class FakeWorker:
+    """Builds its own prompt format from the context, like ClaudeWorker/GeminiWorker."""
+
+    def __init__(self, model, reply, delay=0.0):
+        self.model = model
+        self.reply = reply
+        self.delay = delay
+        self.transport = None
+        self.last_usage = {}
+        self.last_stop_reason = None
+        self.last_error = None
+        self.calls = 0
+
+    def generate(self, context, turn, prefix=""):
+        self.calls += 1
+        context.outgoing(f"[{self.model}] {context.pending_text()}")
+        self.last_usage, self.last_stop_reason = {}, None
+        time.sleep(self.delay)
+        self.last_usage = {"output_tokens": len(self.reply)}
+        self.last_stop_reason = f"{self.model}_done"
+        return self.reply
+
+
+def test_hedged_turn_commits_the_answering_providers_prompt():
+    # The primary answers after the hedge was sent; the hedge built its prompt last
+    primary, hedge = FakeWorker("primary", "P", delay=0.2), FakeWorker("hedge", "HH", delay=0.6)
+    router = RouterWorker([primary, hedge], hedge_after=0.05)
+    conv = Conversation()
+    conv.add_user("do it")
+    assert router.generate(conv, 1) == "P"
+    assert router.last_route == {"provider": "fake:primary", "failovers": [], "hedged": True}
+    conv.add_assistant("P", turn=1)
+    assert conv.messages[0]["content"] == "[primary] do it"
+    assert (router.last_usage, router.last_stop_reason) == ({"output_tokens": 1}, "primary_done")
+    router.close()
+
+
+def test_a_worker_runs_one_call_at_a_time():
+    worker = FakeWorker("only", "X", delay=0.2)
+    router = RouterWorker([worker])
+    threads = [threading.Thread(target=router.generate, args=(Conversation(), 1)) for _ in range(2)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - start >= 0.4
+    assert router.stats()["fake:only"]["calls"] == 2
+    router.close()
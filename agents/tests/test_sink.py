@@ -0,0 +1,11 @@
+from agents.runlog import RunLogSink, iter_records
+
+
+def test_current_path_follows_the_log_into_its_archive(tmp_path):
+    sink = RunLogSink(str(tmp_path), "r1", compress="gzip")
+    sink.write({"type": "start"})
+    assert sink.current_path == tmp_path / "r1.jsonl"
+    sink.close()
+    assert sink.current_path == tmp_path / "r1.jsonl.gz"
+    assert not (tmp_path / "r1.jsonl").exists()
+    assert [r["type"] for r in iter_records(sink.current_path)] == ["start"]
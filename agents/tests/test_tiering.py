@@ -0,0 +1,27 @@
+from agents.adapters.tiering import ModelPolicy
+from agents.orchestrator import AgentOrchestrator
+
+
+def test_escalate_only_fast_code_decisions():
+    policy = ModelPolicy("strong", "fast")
+    assert policy.escalate("fast", "EDIT")
+    assert not policy.escalate("strong", "EDIT")
+    assert not policy.escalate("fast", "PLAN")
+    assert not policy.escalate("fast", None)
+    assert not ModelPolicy("strong").escalate("fast", "EDIT")
+
+
+def test_truncated_fast_edit_is_escalated_before_recovery():
+    # A fast EDIT cut off mid-write must be recognised without continuing or repairing it
+    cut_off = '{"decision": "EDIT", "commands": [{"write": {"path": "a.py", "content": "def f():\\n    ret'
+    assert AgentOrchestrator._peek_decision(cut_off) == "EDIT"
+    assert ModelPolicy("strong", "fast").escalate("fast", AgentOrchestrator._peek_decision(cut_off))
+
+
+def test_advance_predicts_next_tier():
+    policy = ModelPolicy("strong", "fast")
+    assert policy.worker() == "fast"
+    assert policy.advance({"decision": "PLAN"}) == "strong"
+    assert policy.advance({"decision": "RETRY"}) == "strong"
+    assert policy.advance({"decision": "EDIT"}) == "fast"
+    assert policy.advance({"decision": "TEST"}, failed=True) == "strong"
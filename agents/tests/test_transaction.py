@@ -0,0 +1,121 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from agents.skills.transaction import WriteBatch, line_delta
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _make_repo(tmp_path: Path) -> Path:
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "a.txt").write_text("a v1\n")
+    (root / "b.txt").write_text("b v1\n")
+    return root
+
+
+def test_commit_applies_every_write_and_clears_the_journal(tmp_path):
+    root = _make_repo(tmp_path)
+    batch = WriteBatch(root, tmp_path / "runs" / "r1.journal")
+    assert batch.stage("a.txt", "a v2\n")["action"] == "updated"
+    assert batch.stage("new/c.txt", "c\n")["action"] == "created"
+    assert sorted(batch.commit()) == ["a.txt", "new/c.txt"]
+    assert (root / "a.txt").read_text() == "a v2\n"
+    assert (root / "new" / "c.txt").read_text() == "c\n"
+    assert not (tmp_path / "runs" / "r1.journal").exists()
+
+
+def test_rollback_discards_staged_writes(tmp_path):
+    root = _make_repo(tmp_path)
+    batch = WriteBatch(root, tmp_path / "runs" / "r1.journal")
+    batch.stage("a.txt", "a v2\n")
+    batch.rollback()
+    assert (root / "a.txt").read_text() == "a v1\n"
+    assert sorted(p.name for p in root.iterdir()) == ["a.txt", "b.txt"]
+
+
+def test_crash_during_commit_is_rolled_back_on_the_next_start(tmp_path):
+    root = _make_repo(tmp_path)
+    runs = tmp_path / "runs"
+    # A separate process stages two writes and dies after renaming the first into place
+    script = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {str(REPO_ROOT)!r})
+        from agents.skills import transaction
+        real_replace, calls = transaction._replace, []
+        def crashing_replace(tmp, path):
+            calls.append(path)
+            if len(calls) == 2:
+                os._exit(1)
+            real_replace(tmp, path)
+        transaction._replace = crashing_replace
+        batch = transaction.WriteBatch({str(root)!r}, {str(runs / "20250101_000000.journal")!r})
+        batch.stage("a.txt", "a v2\\n")
+        batch.stage("b.txt", "b v2\\n")
+        batch.stage("c.txt", "new\\n")
+        batch.commit()
+    """)
+    assert subprocess.run([sys.executable, "-c", script]).returncode == 1
+    assert (root / "a.txt").read_text() == "a v2\n"  # half-applied
+    journal = json.loads((runs / "20250101_000000.journal" / "journal.json").read_text())
+    assert journal["state"] == "committing"
+
+    recovered = WriteBatch.recover_all(runs)
+
+    assert recovered == [{"journal": "20250101_000000.journal", "state": "committing",
+                          "paths": ["a.txt", "b.txt", "c.txt"]}]
+    assert (root / "a.txt").read_text() == "a v1\n"
+    assert (root / "b.txt").read_text() == "b v1\n"
+    assert not (root / "c.txt").exists()
+    assert sorted(p.name for p in root.iterdir()) == ["a.txt", "b.txt"]  # no temp files left
+    assert not (runs / "20250101_000000.journal").exists()
+
+
+def test_journal_of_a_live_process_is_left_alone(tmp_path):
+    root = _make_repo(tmp_path)
+    runs = tmp_path / "runs"
+    batch = WriteBatch(root, runs / "live.journal")
+    batch.stage("a.txt", "a v2\n")  # journal written by this (running) process
+    assert WriteBatch.recover_all(runs) == []
+    assert (runs / "live.journal" / "journal.json").exists()
+    assert batch.commit() == ["a.txt"]
+
+
+def test_line_delta_counts_changed_lines():
+    assert line_delta(None, "a\nb\nc\n", old_text="a\nx\n") == {"lines_added": 2, "lines_removed": 1}
+
+
+def test_cancelled_edit_turn_does_not_leave_the_batch_open(tmp_path, monkeypatch):
+    import asyncio
+
+    from agents.orchestrator import AgentOrchestrator
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    root = _make_repo(tmp_path)
+    orchestrator = AgentOrchestrator("cancel", root=str(root), runs_dir=str(tmp_path / "runs"))
+    staged = asyncio.Event()
+
+    async def stage_then_hang(commands, results):
+        orchestrator.repo.write_file("a.txt", "a v2\n")
+        staged.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(orchestrator, "_stage_writes", stage_then_hang)
+
+    async def cancel_mid_turn():
+        turn = asyncio.ensure_future(orchestrator._handle_edit_commands([{"write": {"path": "a.txt"}}]))
+        await staged.wait()
+        turn.cancel()
+        try:
+            await turn
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_mid_turn())
+    assert (root / "a.txt").read_text() == "a v1\n"
+    orchestrator.repo.begin_batch(str(tmp_path / "runs" / "next.journal"))  # not "already open"
+    orchestrator.repo.rollback_batch()
+    orchestrator.log_sink.close()
@@ -0,0 +1,43 @@
+from agents.skills.tree import format_size, summarize_tree
+
+
+def _repo():
+    files = {"README.md": 10, "src/a.ts": 100, "src/b.ts": 100}
+    files.update({f"runs/r{i}.jsonl": 1000 for i in range(80)})
+    files.update({f"zz/f{i}.ts": 10 for i in range(3)})
+    return files
+
+
+def test_line_budget_is_shared_so_a_big_directory_cannot_crowd_out_the_rest():
+    lines = summarize_tree(_repo(), "repo", max_lines=12).splitlines()
+    assert len(lines) <= 12
+    assert lines[0] == "repo/"
+    # small siblings are listed in full, the 80-file directory is cut down
+    assert "  src/" in lines and "    a.ts" in lines and "    b.ts" in lines
+    assert "  README.md" in lines
+    assert "    … 78 more files (76.2 KB)" in lines
+    assert any(line.startswith("  zz/") for line in lines)
+
+
+def test_everything_is_shown_when_it_fits():
+    files = {"a.txt": 1, "src/b.ts": 2}
+    assert summarize_tree(files, "r", max_lines=10) == "r/\n  src/\n    b.ts\n  a.txt"
+
+
+def test_directories_below_max_depth_are_collapsed():
+    tree = summarize_tree({"a/b/c/d/e/f.txt": 1, "x.txt": 2}, "r", max_depth=3)
+    assert tree.splitlines() == ["r/", "  a/", "    b/", "      c/ (1 file, 1 B)", "  x.txt"]
+
+
+def test_too_many_directories_are_summarized():
+    lines = summarize_tree({f"d{i:02d}/x": 1 for i in range(20)}, "r", max_lines=6).splitlines()
+    assert len(lines) == 6
+    assert lines[-1] == "  … 16 more directories (16 files, 16 B)"
+
+
+def test_tiny_budget_collapses_the_root():
+    assert summarize_tree(_repo(), "repo", max_lines=2) == "repo/ (86 files, 78.4 KB)"
+
+
+def test_format_size():
+    assert [format_size(n) for n in (500, 2048, 5 * 1024 * 1024)] == ["500 B", "2.0 KB", "5.0 MB"]
@@ -0,0 +1,29 @@
+import os
+import subprocess
+
+from agents.skills.workspace import WorkspaceManager
+
+
+def _git_repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for args in (["init", "-q"], ["-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "init"]):
+        subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+    return repo
+
+
+def _age(path, hours):
+    old = os.path.getmtime(path) - hours * 3600
+    os.utime(path, (old, old))
+
+
+def test_prune_removes_stale_worktrees_but_not_kept_ones(tmp_path):
+    manager = WorkspaceManager(str(_git_repo(tmp_path)), node_modules="none")
+    stale, kept = manager.create("stale"), manager.create("kept")
+    manager.keep(kept["path"])
+    for ws in (stale, kept):
+        _age(os.path.dirname(ws["path"]), 24)
+
+    assert manager.prune() == 1
+    assert not os.path.exists(stale["path"])
+    assert os.path.isdir(kept["path"])
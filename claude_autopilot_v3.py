@@ -1,23 +1,38 @@
 #!/usr/bin/env python3
 """
-Claude Autopilot v3 - Fixed success detection for turn limits
+Claude Autopilot v3 - Fixed success detection for turn limits.
+Iterations run the orchestrator in-process and read its structured results.
 """
 
-import subprocess
 import time
 import random
 import sys
 import argparse
-import os
+from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "agents"))
+
+from agents.orchestrator import AgentOrchestrator
 
 class ClaudeAutopilotV3:
-    def __init__(self, max_iters=15, max_minutes=10, verbose=True):
+    def __init__(self, max_iters=15, max_minutes=10, verbose=True, repo_root=REPO_ROOT, env=None):
+        self.repo_root = Path(repo_root).resolve()
+        self.env = env  # extra environment for commands, e.g. the worktree's shared npm cache
         self.max_iters = max_iters
         self.max_minutes = max_minutes
         self.verbose = verbose
         self.iteration_count = 0
         self.start_time = time.time()
         
+        # Shared across iterations: one worker (and its pooled HTTP transport)
+        # and one repo interface, created by the first orchestrator
+        self.worker = None
+        self.fast_worker = None  # planning-tier worker, reused with `worker` so tiering survives iterations
+        self.repo = None
+        
         self.follow_up_templates = [
             "Continue with the previous work. {context} Build upon what was implemented and add more improvements.",
             "Expand on the recent changes. {context} Polish and enhance the current implementation.",
@@ -64,45 +79,50 @@ class ClaudeAutopilotV3:
         template = random.choice(self.follow_up_templates)
         return template.format(context=context)
         
-    def _run_claude_command(self, task: str, max_turns: int = 20) -> tuple[bool, str]:
+    def _summarize(self, result: dict) -> str:
+        """Text view of a structured run result, for stop-trigger and context matching."""
+        parts = [result.get("reason", "")]
+        parts += result.get("commits", [])
+        parts += result.get("files_changed", [])
+        if result.get("pr_url"):
+            parts.append("pull request created")
+        return " ".join(p for p in parts if p)
+        
+    def _run_iteration(self, task: str, max_turns: int = 20) -> tuple[bool, dict]:
+        """Run one orchestrator pass in-process, reusing the worker, HTTP pool and repo interface."""
         try:
-            os.chdir("/workspaces/Expense-Tracker")
-            
-            cmd = ["/workspaces/Expense-Tracker/claude_fixed", "--max-turns", str(max_turns), task]
+            run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_ap{self.iteration_count}"
             self._log(f"Running: claude --max-turns {max_turns} \"{task[:50]}...\"")
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=400,
-                                  env={**os.environ, "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY")})
-            
-            output = result.stdout + result.stderr
+            orchestrator = AgentOrchestrator(
+                run_id=run_id,
+                max_turns=max_turns,
+                max_minutes=max(self.max_minutes - (time.time() - self.start_time) / 60, 1),
+                root=str(self.repo_root),
+                runs_dir=str(REPO_ROOT / "runs"),
+                env=self.env,
+                worker=self.worker,
+                fast_worker=self.fast_worker,
+                repo=self.repo
+            )
+            self.worker, self.repo = orchestrator.claude_worker, orchestrator.repo
+            self.fast_worker = orchestrator.model_policy.fast
+            result = orchestrator.execute_task(task)
             
-            # Better success detection
-            progress_indicators = [
-                "File written", "✅", "Command completed", "🔧 Executing", 
-                "📝 Writing to", "Updated", "feat(", "fix(", "chore(",
-                "Commit:", "Changes committed"
-            ]
-            made_progress = any(indicator in output for indicator in progress_indicators)
+            # Success if the run succeeded OR if it hit max turns but made progress
+            success = result.get("success") or (
+                result.get("reason", "").startswith("Max turns") and result.get("progress_made"))
             
-            # Success if return code 0 OR if max turns but progress was made
-            success = (result.returncode == 0 or 
-                      ("Max turns" in output and made_progress))
-            
-            if success and "Max turns" in output:
+            if success and not result.get("success"):
                 self._log("✅ Claude used all turns but made progress - continuing", force=True)
             elif not success:
-                self._log(f"❌ Claude command failed with return code: {result.returncode}")
-                if "Max turns" not in output:  # Only debug real failures
-                    self._log(f"Error output: {output[-500:]}", force=True)
+                self._log(f"❌ Claude run failed: {result.get('reason')}", force=True)
             
-            return success, output
+            return success, result
             
-        except subprocess.TimeoutExpired:
-            self._log("Claude command timed out", force=True)
-            return False, "Command timed out"
         except Exception as e:
             self._log(f"Error: {e}", force=True)
-            return False, str(e)
+            return False, {"success": False, "reason": str(e)}
             
     def run(self, initial_task: str) -> bool:
         self._log(f"Starting Claude Autopilot v3", force=True)
@@ -116,20 +136,19 @@ class ClaudeAutopilotV3:
                    (time.time() - self.start_time) < 60 * self.max_minutes):
                 
                 self.iteration_count += 1
-                success, output = self._run_claude_command(current_task)
+                success, result = self._run_iteration(current_task)
                 
                 if not success:
                     self._log("Stopping due to command failure", force=True)
                     break
                     
                 # Show progress summary
-                lines = output.strip().split('\n')
-                progress_lines = [l for l in lines if any(ind in l for ind in ["✅", "📝", "🔧", "feat(", "fix("])]
-                if progress_lines:
-                    self._log(f"Progress summary:")
-                    for line in progress_lines[-3:]:  # Show last 3 progress items
-                        self._log(f"  {line.strip()}")
+                if result.get("files_changed") or result.get("commits"):
+                    self._log(f"Progress summary ({result.get('turns')} turns):")
+                    for item in (result.get("commits") or result.get("files_changed"))[-3:]:
+                        self._log(f"  {item}")
                 
+                output = self._summarize(result)
                 if self._should_stop(output):
                     self._log("Task completed successfully!", force=True)
                     break
@@ -153,16 +172,33 @@ def main():
     parser.add_argument("--max-iters", "-i", type=int, default=3, help="Max iterations")
     parser.add_argument("--max-minutes", "-m", type=int, default=10, help="Max minutes")
     parser.add_argument("--quiet", "-q", action="store_true", help="Quiet mode")
+    parser.add_argument("--workspace", "-w", action="store_true", help="Run all iterations in a throwaway git worktree")
     
     args = parser.parse_args()
     
+    repo_root, workspaces, workspace = REPO_ROOT, None, {}
+    if args.workspace:
+        from agents.skills.workspace import WorkspaceManager
+        workspaces = WorkspaceManager(str(REPO_ROOT))
+        workspace = workspaces.create(f"autopilot_{int(time.time())}")
+        if not workspace.get("success"):
+            print(f"Worktree setup failed: {workspace.get('error')}")
+            sys.exit(1)
+        repo_root = workspace["path"]
+    
     autopilot = ClaudeAutopilotV3(
         max_iters=args.max_iters,
         max_minutes=args.max_minutes, 
-        verbose=not args.quiet
+        verbose=not args.quiet,
+        repo_root=repo_root,
+        env=workspace.get("env")
     )
     
-    success = autopilot.run(args.task)
+    try:
+        success = autopilot.run(args.task)
+    finally:
+        if workspace.get("success"):
+            workspaces.remove(workspace["path"])
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":